@@ -6,6 +6,7 @@
 项目：Auto12306 智能抢票系统
 开源协议：MIT License
 """
+import os
 import re
 import time
 import random
@@ -15,11 +16,15 @@ import json
 import hmac
 import hashlib
 import base64
-from datetime import datetime
+import functools
+import logging.handlers
+from datetime import datetime, timedelta
 
 # 配置日志记录
-# 创建文件处理器，记录所有级别的日志
-file_handler = logging.FileHandler('12306_booking.log', encoding='utf-8')
+# 创建文件处理器，记录所有级别的日志（按大小轮转，避免长时间运行后日志文件无限增长）
+# delay=True：第一条日志写入时才打开文件，导入模块不产生文件操作
+file_handler = logging.handlers.RotatingFileHandler('12306_booking.log', maxBytes=10 * 1024 * 1024,
+                                                    backupCount=3, encoding='utf-8', delay=True)
 file_handler.setLevel(logging.DEBUG)
 file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', '%Y-%m-%d %H:%M:%S'))
 
@@ -95,41 +100,38 @@ def set_dingtalk_token(token, secret=None):
         logger.info(f'已设置钉钉机器人token: {token[:20]}...')
 
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.edge.options import Options
-from selenium.webdriver.edge.service import Service
 from selenium.webdriver.support.ui import Select
 
-
-def parse_hhmm_to_minutes(hhmm):
-    """将 HH:MM 格式转换为分钟数"""
-    try:
-        h, m = map(int, hhmm.split(':'))
-        return h*60 + m
-    except Exception:
-        return None
-
-
-def time_in_range(t, start, end):
-    """判断时间是否在范围内"""
-    tm = parse_hhmm_to_minutes(t)
-    sm = parse_hhmm_to_minutes(start)
-    em = parse_hhmm_to_minutes(end)
-    if None in (tm, sm, em):
-        return False
-    return sm <= tm <= em
+from history_store import open_history, route_key
+from coordination import open_coordination, STAND_DOWN_POLL
+from selector_registry import SELECTORS
+from row_diff import describe_events
+from session_trace import NULL_RECORDER, ReplayFinished, open_recorder
+from strategies import (SEAT_COLUMNS, SEAT_ALIASES, parse_hhmm_to_minutes, time_in_range, parse_table_row,
+                        TimeRangeStrategy, TrainNumberStrategy, create_strategy)
+from task_plan import compile_task, ConfigError
+from driver_watchdog import open_watchdog
+from session_keeper import SessionKeeper, open_session_keeper, login_account
+from resource_monitor import open_resource_monitor
+from left_ticket import open_capture, http_session_from_driver
+from resource_blocker import open_blocker
+from sale_burst import open_sale_burst
+from rate_limiter import RATE_LIMITER, PRIORITY_SALE, PRIORITY_MONITOR, RateLimited, open_rate_limiter
+from metrics import METRICS
+from profiler import open_profiler
+from error_policy import ErrorTracker, open_error_tracker
+from order_http import OrderFallback, OrderRejected, OrderResult, open_order_pipeline, wait_for_order
+from order_tracker import describe_result, open_order_tracker
+from config_reload import ROUTE_KEYS, open_config_reloader
+from checkpoint import open_checkpoint
+from driver_backends import export_session, launch_browser
 
 
 def extract_depart_time_from_row(row):
     """从表格行中提取出发时间"""
     try:
-        cand = row.find_elements(
-            By.XPATH,
-            ".//td[position()=2 or contains(@class,'cdz') or contains(@class,'cds')]//*[self::strong or self::span or self::div or self::em]"
-        )
+        cand = SELECTORS.find_all(row, 'row_depart_cell')
         for c in cand:
             t = (c.text or '').strip()
             if re.fullmatch(r'([01]\d|2[0-3]):([0-5]\d)', t):
@@ -151,7 +153,7 @@ def extract_depart_time_from_row(row):
 def extract_train_number_from_row(row):
     """从表格行中提取车次号"""
     try:
-        cand = row.find_elements(By.XPATH, ".//td[1]//*[self::strong or self::span or self::a or self::div]")
+        cand = SELECTORS.find_all(row, 'row_train_cell')
         for c in cand:
             t = (c.text or '').strip().upper()
             if re.fullmatch(r'[GDKCTZXYFS]\d{1,5}', t):
@@ -165,14 +167,40 @@ def extract_train_number_from_row(row):
     return None
 
 
+# 一次 JS 调用读取整张表格，避免逐个元素往返 WebDriver
+_READ_TABLE_JS = """
+var rows = document.querySelectorAll('#queryLeftTable > tr');
+var out = [];
+for (var i = 0; i < rows.length; i++) {
+    var r = rows[i];
+    if ((r.className || '').indexOf('ticket-hd') >= 0 || r.style.display === 'none') continue;
+    var cells = [];
+    for (var j = 0; j < r.cells.length; j++) cells.push((r.cells[j].innerText || '').trim());
+    var book = false;
+    var links = r.querySelectorAll('a');
+    for (var k = 0; k < links.length; k++) {
+        if ((links[k].textContent || '').indexOf('预订') >= 0) { book = true; break; }
+    }
+    out.push({index: i, id: r.id || '', cells: cells, bookable: book});
+}
+return out;
+"""
+
+
+def read_table_snapshot(driver, recorder=NULL_RECORDER):
+    """读取查询结果表格的结构化快照（车次、出发时间、各席别状态、是否可预订）"""
+    raw_rows = driver.execute_script(_READ_TABLE_JS) or []
+    recorder.snapshot(raw_rows)
+    return [parse_table_row(r) for r in raw_rows]
+
+
 def click_book_in_row(row, driver):
     """点击表格行中的预订按钮"""
     try:
-        btns = row.find_elements(By.XPATH, ".//a[contains(text(),'预订')]")
-        if not btns:
+        btn = SELECTORS.find(row, 'row_book_button', optional=True)
+        if btn is None:
             logger.info('未找到预订按钮，该车次可能暂无票')
             return False
-        btn = btns[0]
         driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'center'});", btn)
         time.sleep(0.2)
         try:
@@ -190,8 +218,7 @@ def click_book_in_row(row, driver):
 
 def _find_rows(driver):
     """获取查询结果表格的所有有效数据行"""
-    xpath = "//*[@id='queryLeftTable']/tr[not(contains(@class,'ticket-hd')) and not(contains(@style,'display: none'))]"
-    return driver.find_elements(By.XPATH, xpath)
+    return SELECTORS.find_all(driver, 'table_rows')
 
 
 def _find_row_by_train_number(driver, target):
@@ -200,7 +227,7 @@ def _find_row_by_train_number(driver, target):
     if not target:
         return None
     try:
-        nodes = driver.find_elements(By.XPATH, f"//*[@id='queryLeftTable']//a[normalize-space(text())='{target}']/ancestor::tr[1]")
+        nodes = SELECTORS.find_all(driver, 'row_by_train', train=target)
         for n in nodes:
             if n.is_displayed():
                 return n
@@ -217,150 +244,503 @@ def _find_row_by_train_number(driver, target):
     return None
 
 
-def book_by_time_range(driver, start_hhmm, end_hhmm, max_attempts=30, refresh_interval=(3,6)):
-    """按时间范围抢票"""
-    for attempt in range(1, max_attempts+1):
-        try:
-            WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, 'queryLeftTable')))
-            rows = _find_rows(driver)
-            found_times = []
-            candidates = []
-            for r in rows:
-                dep = extract_depart_time_from_row(r)
-                if dep:
-                    found_times.append(dep)
-                if dep and time_in_range(dep, start_hhmm, end_hhmm):
-                    if r.find_elements(By.XPATH, ".//a[contains(text(),'预订')]"):
-                        candidates.append((dep, r))
-            if candidates:
-                candidates.sort(key=lambda x: parse_hhmm_to_minutes(x[0]))
-                dep, row = candidates[0]
-                logger.info(f'发现时间匹配的车次: {dep}，尝试预订...')
-                if click_book_in_row(row, driver):
-                    return f'成功尝试预订出发时间 {dep} 的车次'
-            else:
-                if attempt == 1 or attempt % 5 == 0:
-                    preview = ','.join(sorted(set(found_times))[:6]) if found_times else '无'
-                    logger.info(f'本次共扫描 {len(rows)} 行，解析到出发时刻: {preview}；未命中范围 {start_hhmm}-{end_hhmm}')
-        except Exception as e:
-            logger.error(f'第{attempt}次尝试失败: {e}', exc_info=True)
-        
-        if attempt < max_attempts:
+def _row_element(driver, row, timeout=0):
+    """根据快照中的行定位表格行元素，优先使用行 id
+
+    timeout 大于 0 时等待行渲染出来（网络截获模式下数据先于页面表格到达）
+    """
+    end = time.monotonic() + timeout
+    while True:
+        if row.get('id'):
             try:
-                refresh_btn = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.ID, 'query_ticket')))
-                refresh_btn.click()
-            except Exception as e:
-                logger.error(f'点击查询按钮刷新失败: {e}，尝试整页刷新')
-                driver.refresh()
-            wait_time = random.uniform(*refresh_interval)
-            logger.info(f'无匹配结果，等待{wait_time:.2f}s后重试...')
-            time.sleep(wait_time)
-    return '没抢到，可惜~'
+                return driver.find_element(By.ID, row['id'])
+            except Exception:
+                pass
+        el = _find_row_by_train_number(driver, row.get('train'))
+        if el is not None or time.monotonic() >= end:
+            return el
+        time.sleep(0.05)
 
 
-def book_by_train_number(driver, target_train_number, max_attempts=0, refresh_interval=(2,4), 
-                       params=None, start_time=None, monitor_count_ref=None, last_notification_time=None):
-    """按指定车次抢票"""
-    target = (target_train_number or '').strip().upper()
-    if not target:
-        return '未设置目标车次'
-    
-    # 初始化监控计数
+def _record_history(history, rows, route, travel_date):
+    """把本次刷新的余票状态写入历史记录（失败不影响抢票）"""
+    if history is None:
+        return
+    try:
+        history.record_snapshot(rows, route, travel_date)
+    except Exception as e:
+        logger.debug(f'记录余票历史失败: {e}')
+
+
+def _claim_and_click(row, driver, coordination, train):
+    """多节点协同时先取得租约再点击预订，点击失败则释放租约"""
+    if coordination is not None and not coordination.claim(train):
+        return False
+    ok = click_book_in_row(row, driver)
+    if coordination is not None:
+        if ok:
+            coordination.publish('booked', train=train)
+        else:
+            coordination.release()
+    return ok
+
+
+def _submit_over_http(order, driver, coordination, decision):
+    """HTTP 下单：返回 submitted（已提交）、rejected（被拒绝或其他节点在预订，继续监控）或 fallback（改走浏览器）
+
+    只有 submitted 时保留协同租约，其余结果返回前都已释放
+    """
+    if order is None or not order.can_submit(decision):
+        return 'fallback'
+    train = decision.train or decision.depart
+    if coordination is not None and not coordination.claim(train):
+        return 'rejected'
+    try:
+        result = order.submit(driver, decision)
+    except OrderRejected as e:
+        logger.warning(f'⚠ 下单被拒绝: {e}，继续监控')
+        if coordination is not None:
+            coordination.release()
+        return 'rejected'
+    except OrderFallback as e:
+        # 释放租约：页面上找不到该行时其他节点不必等到租约过期，点击预订前由 _claim_and_click 重新取得
+        logger.warning(f'⚠ HTTP 下单失败（{e}），改走浏览器下单')
+        if coordination is not None:
+            coordination.release()
+        return 'fallback'
+    if result.status == 'failed':
+        logger.warning(f'⚠ 排队失败: {result.message}，继续监控')
+        if coordination is not None:
+            coordination.release('failed', train=train)
+        return 'rejected'
+    if coordination is not None:
+        coordination.publish('booked', train=train)
+    return 'submitted'
+
+
+def _book_burst_winner(winner, driver, order, coordination, limiter, recorder=NULL_RECORDER):
+    """开售并发查询命中后立即预订：查询数据带有 secretStr 时直接 HTTP 下单，否则马上提交页面查询并点击命中的车次
+
+    返回 (决定, submitted / booked)；未能预订时返回 None，之后照常进入监控
+    """
+    decision = winner[1]
+    logger.info(f'⚡ 开售并发查询命中 {decision.train}（{decision.reason}），立即预订...')
+    if coordination is not None:
+        coordination.publish('seen', train=decision.train, depart=decision.depart)
+    outcome = _submit_over_http(order, driver, coordination, decision)
+    if outcome == 'submitted':
+        recorder.record('decision', train=decision.train, seat=decision.seat, reason=decision.reason,
+                        engine='http', source='sale_burst')
+        return decision, 'submitted'
+    if outcome != 'fallback':
+        return None
+    if not limiter.acquire(PRIORITY_SALE):
+        logger.warning('⚠ 请求限流：无法立即查询，改为进入监控')
+        return None
+    try:
+        SELECTORS.wait(driver, 'query_button', 3, clickable=True).click()
+        METRICS.inc('refreshes')
+    except Exception as e:
+        logger.error(f'提交查询失败: {e}，改为进入监控')
+        return None
+    row = _row_element(driver, decision.row, timeout=3)
+    if row is None:
+        logger.warning(f'页面上未找到车次 {decision.train}，改为进入监控')
+        return None
+    if not _claim_and_click(row, driver, coordination, decision.train or decision.depart):
+        return None
+    recorder.record('decision', train=decision.train, seat=decision.seat, reason=decision.reason,
+                    source='sale_burst')
+    return decision, 'booked'
+
+
+def _booked_elsewhere(coordination):
+    """其他节点已完成订单时返回其节点标识，本节点据此停止监控"""
+    if coordination is None:
+        return None
+    return coordination.booked_elsewhere()
+
+
+def _send_status_notification(params, target, start_time, monitor_count):
+    """每30分钟发送一次运行状态通知"""
+    current_time = datetime.now()
+    running_time = (current_time - start_time).total_seconds() / 60
+    content = f"## 抢票任务运行状态\n" \
+             f"> 已运行时间: {running_time:.1f}分钟\n" \
+             f"> 监控次数: {monitor_count}\n" \
+             f"> 目标车次: {target}\n" \
+             f"> 出发站: {params.get('from_station', '未知')}\n" \
+             f"> 到达站: {params.get('to_station', '未知')}\n" \
+             f"> 日期: {params.get('travel_date', '未知')}\n" \
+             f"> 席别: {params.get('seat_category', '未知')}\n" \
+             f"> 乘车人: {params.get('passenger_name', '未知')}\n" \
+             f"> 状态: 正常监控中\n" \
+             f"> 检查时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    send_dingtalk_notification('抢票任务运行状态', content, params.get('dingtalk_token') if params else None)
+
+
+# 第一次查询被限流拒绝时的重试间隔和最长等待（秒）
+FIRST_QUERY_RETRY = 0.1
+FIRST_QUERY_MAX_WAIT = 30
+
+
+def _acquire_first_query(limiter, priority, max_wait=FIRST_QUERY_MAX_WAIT):
+    """第一次查询必须发出：被限流拒绝时等待后重试，超过 max_wait 仍被拒绝时抛出 RateLimited"""
+    deadline = time.monotonic() + max_wait
+    warned = False
+    while not limiter.acquire(priority):
+        if time.monotonic() >= deadline:
+            raise RateLimited(f'第一次查询等待令牌超过 {max_wait} 秒')
+        if not warned:
+            logger.warning('⚠ 请求限流：等待令牌后再提交第一次查询')
+            warned = True
+        time.sleep(FIRST_QUERY_RETRY)
+
+
+def _refresh_query(driver, blocker=None, priority=PRIORITY_MONITOR, limiter=None):
+    """点击查询按钮刷新结果，失败时整页刷新；先从 limiter（默认为共享限流器）取令牌，被拒绝时本轮不刷新"""
+    if not (limiter or RATE_LIMITER).acquire(priority):
+        logger.warning('⚠ 请求限流：本轮跳过刷新')
+        return
+    try:
+        refresh_btn = SELECTORS.wait(driver, 'query_button', 5, clickable=True)
+        refresh_btn.click()
+    except Exception as e:
+        logger.error(f'点击查询按钮刷新失败: {e}，尝试整页刷新')
+        driver.refresh()
+        if blocker is not None:
+            blocker.page_loaded()
+    METRICS.inc('refreshes')
+    if blocker is not None:
+        blocker.refreshed()
+
+
+def _rebind_driver(driver, capture=None, blocker=None):
+    """浏览器更换后（看门狗重启、回收标签页或浏览器）让网络截获和资源拦截跟随新的实例或标签页"""
+    if capture is not None:
+        capture.attach(driver)
+    if blocker is not None:
+        blocker.apply(driver)
+
+
+def _login_account(driver, params):
+    """限流使用的账号标识：登录的 12306 用户名，读取不到时用登录令牌（tk Cookie）区分不同的登录会话"""
+    try:
+        http = http_session_from_driver(driver)
+    except Exception as e:
+        logger.debug(f'读取浏览器 Cookie 失败: {e}')
+        return ''
+    try:
+        account = login_account(http)
+        if account:
+            return account
+        token = http.cookies.get('tk', domain='kyfw.12306.cn') or http.cookies.get('tk') or ''
+        return f'tk:{token[:12]}' if token else ''
+    except Exception as e:
+        logger.debug(f'读取登录令牌失败: {e}')
+        return ''
+    finally:
+        http.close()
+
+
+def _cycle_settings(params):
+    """监控循环使用的线路、日期、钉钉 token 和开售优先级截止时间"""
+    # 开售后两分钟内的刷新按开售优先级取令牌，优先于其他任务的日常监控
+    sale_start = params.get('booking_start_time')
+    sale_until = datetime.strptime(sale_start, '%Y-%m-%d %H:%M:%S') + timedelta(minutes=2) if sale_start else None
+    return route_key(params), params.get('travel_date', ''), params.get('dingtalk_token'), sale_until
+
+
+def run_strategy(driver, strategy, max_attempts=0, refresh_interval=(2,4), params=None,
+                 history=None, coordination=None, on_change=None, recorder=NULL_RECORDER,
+                 start_time=None, monitor_count_ref=None, last_notification_time=None,
+                 notify_errors=False, log_every=1, watchdog=None, session=None, monitor=None,
+                 capture=None, blocker=None, profiler=None, errors=None, order=None, reloader=None,
+                 checkpoint=None, limiter=None):
+    """策略执行器：负责刷新、读取快照和点击，选车决定交给 strategy
+
+    返回 (决定, 结束原因)。预订成功时决定为 book，其余情况为 None
+    max_attempts 为 0 表示无限监控；给定 start_time 时每30分钟发送一次状态通知
+    给定 watchdog 时浏览器卡死/崩溃会自动重启，之后的操作使用 watchdog.driver
+    给定 session 时登录失效会暂停监控，等待重新登录后继续
+    给定 monitor 时定期采样内存，超过阈值时回收标签页或浏览器
+    给定 capture 时优先使用截获的查询接口响应，截获不到再读取页面表格；浏览器更换后截获跟随新的实例
+    给定 blocker 时浏览器更换（重启、回收标签页）后重新启用资源拦截
+    给定 profiler 时只在每轮的工作部分做性能分析，不含刷新间隔的等待
+    errors 为异常处理器（分类退避、熔断、汇总通知），未给定时按默认参数创建，notify_errors 决定是否发送通知
+    给定 order（HTTP 下单流程）且查询数据带有 secretStr 时直接通过接口下单，结束原因为 submitted；
+    接口返回意外响应时改为点击预订按钮
+    给定 reloader（配置热更新）时每轮开始前检查新配置：切换策略和刷新间隔，线路或日期变化时重新填写查询条件，
+    尝试次数、通知时间和异常状态保持不变
+    给定 checkpoint（监控断点）时按其间隔写入监控次数、通知时间和上次看到的余票，恢复时以上次的余票作为比对基线
+    limiter 为本任务的限流器（绑定账号和出口 IP），未给定时使用共享限流器
+    """
+    params = params or {}
+    # 循环内不再读取 params：线路、日期、钉钉 token 在开始时（以及配置切换时）取一次
+    route, travel_date, token, sale_until = _cycle_settings(params)
+    state = strategy.new_state()
+    if on_change is not None:
+        state.differ.add_listener(on_change)
+    seen = checkpoint.take_seen() if checkpoint is not None else None
+    if seen:
+        # 从断点恢复：停止期间的放票会作为余票变化报告出来
+        state.differ.seed(seen)
     if monitor_count_ref is None:
         monitor_count_ref = {'count': 0}
-    
-    # 初始化最后通知时间
     if last_notification_time is None:
         last_notification_time = datetime.now()
+    if errors is None:
+        errors = ErrorTracker(notify=(lambda title, content: send_dingtalk_notification(title, content, token))
+                              if notify_errors else None)
     
-    # 如果max_attempts为0，则无限监控
     attempt = 0
+    backoff = 0.0
+    standing_down = None
     while True:
         attempt += 1
         monitor_count_ref['count'] += 1
         if max_attempts > 0 and attempt > max_attempts:
-            break
+            return None, 'max_attempts'
+        other = _booked_elsewhere(coordination)
+        if other:
+            return None, f'booked_by:{other}'
+        busy = coordination.standing_down() if coordination is not None else None
+        if busy:
+            # 其他节点发现有票、正在预订：暂缓刷新，不计入尝试次数，对方放弃或下单失败后恢复
+            if busy != standing_down:
+                logger.info(f'节点 {busy} 发现余票正在预订，本节点暂缓刷新')
+            standing_down = busy
+            attempt -= 1
+            monitor_count_ref['count'] -= 1
+            time.sleep(STAND_DOWN_POLL)
+            continue
+        if standing_down:
+            logger.info(f'节点 {standing_down} 未完成预订，本节点恢复监控')
+            standing_down = None
+        if session is not None and session.expired:
+            logger.warning('⚠ 登录已失效，暂停监控，等待重新扫码登录...')
+            if blocker is not None:
+                # 登录页需要显示二维码图片，暂停拦截
+                blocker.clear(driver)
+            paused = session.wait_for_relogin(driver)
+            if blocker is not None:
+                blocker.apply(driver)
+            logger.info(f'✓ 已重新登录，暂停 {paused:.0f} 秒后继续监控')
+        errors.maybe_alert(strategy.describe())
+        pause = errors.breaker_wait()
+        if pause > 0:
+            # 熔断中：暂停到试探时间，不计入尝试次数
+            attempt -= 1
+            monitor_count_ref['count'] -= 1
+            time.sleep(pause)
+            continue
+        change = reloader.take() if reloader is not None else None
+        if change is not None:
+            # reloader 已原地更新 params，这里只需重新读取循环使用的值
+            route, travel_date, token, sale_until = _cycle_settings(params)
+            strategy = change.plan.create_strategy()
+            previous, state = state, strategy.new_state()
+            if on_change is not None:
+                state.differ.add_listener(on_change)
+            if not change.keys & ROUTE_KEYS:
+                # 线路和日期不变：沿用上一次的余票作为比对基线，切换策略不会把所有车次当作新出现
+                state.differ.seed(previous.differ.snapshot())
+                state.cycles = previous.cycles
+            refresh_interval = change.plan.refresh_interval
+            if change.plan.max_attempts is not None:
+                max_attempts = change.plan.max_attempts
+            logger.info(f'策略：{strategy.describe()}')
+            recorder.record('reload', keys=sorted(change.keys))
+            if change.keys & ROUTE_KEYS:
+                try:
+                    if _query_page_restorer(params, recorder)(driver):
+                        logger.info('✓ 已按新的线路/日期重新查询')
+                except Exception as e:
+                    logger.error(f'按新配置重新查询失败: {e}')
         
-        # 每30分钟发送一次状态通知
         current_time = datetime.now()
-        if start_time:
-            elapsed_minutes = (current_time - last_notification_time).total_seconds() / 60
-            if elapsed_minutes >= 30:
-                running_time = (current_time - start_time).total_seconds() / 60
-                content = f"## 抢票任务运行状态\n" \
-                         f"> 已运行时间: {running_time:.1f}分钟\n" \
-                         f"> 监控次数: {monitor_count_ref['count']}\n" \
-                         f"> 目标车次: {target}\n" \
-                         f"> 出发站: {params.get('from_station', '未知')}\n" \
-                         f"> 到达站: {params.get('to_station', '未知')}\n" \
-                         f"> 日期: {params.get('travel_date', '未知')}\n" \
-                         f"> 席别: {params.get('seat_category', '未知')}\n" \
-                         f"> 乘车人: {params.get('passenger_name', '未知')}\n" \
-                         f"> 状态: 正常监控中\n" \
-                         f"> 检查时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                send_dingtalk_notification('抢票任务运行状态', content, params.get('dingtalk_token') if params else None)
-                last_notification_time = current_time
+        if start_time and (current_time - last_notification_time).total_seconds() >= 30 * 60:
+            _send_status_notification(params, strategy.describe(), start_time, monitor_count_ref['count'])
+            last_notification_time = current_time
+            monitor_count_ref['notified_at'] = current_time
         
+        METRICS.inc('cycles')
+        if profiler is not None:
+            profiler.resume()
         try:
-            WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, 'queryLeftTable')))
-            row = _find_row_by_train_number(driver, target)
-            if row is not None:
-                logger.info(f'发现目标车次 {target}，检查是否有票...')
-                # 检查是否有预订按钮
-                booking_buttons = row.find_elements(By.XPATH, ".//a[contains(text(),'预订')]")
-                if booking_buttons:
-                    logger.info(f'发现目标车次 {target}，尝试预订...')
-                    if click_book_in_row(row, driver):
-                        # 发送成功通知
-                        content = f"## 抢票成功\n" \
-                                 f"> 车次: {target}\n" \
-                                 f"> 出发站: {params.get('from_station', '未知')}\n" \
-                                 f"> 到达站: {params.get('to_station', '未知')}\n" \
-                                 f"> 日期: {params.get('travel_date', '未知')}\n" \
-                                 f"> 席别: {params.get('seat_category', '未知')}\n" \
-                                 f"> 乘车人: {params.get('passenger_name', '未知')}\n" \
-                                 f"> 时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')}\n" \
-                                 f"> 操作: 已成功点击预订按钮\n"
-                        send_dingtalk_notification('抢票成功', content, params.get('dingtalk_token') if params else None)
-                        return f'成功尝试预订指定车次 {target}'
-                else:
-                    logger.info(f'目标车次 {target} 暂无票或不可预订，继续监控...')
+            read_started = time.perf_counter()
+            rows = capture.wait_rows(3) if capture is not None else None
+            if rows is not None:
+                recorder.snapshot_rows(rows)
             else:
-                logger.info(f'未找到目标车次 {target}，继续监控...')
-        except Exception as e:
-            logger.error(f'第{attempt}次尝试失败: {e}', exc_info=True)
-            # 发送失败通知
-            content = f"## 监控异常\n" \
-                     f"> 车次: {target}\n" \
-                     f"> 错误: {str(e)[:100]}\n" \
-                     f"> 时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            send_dingtalk_notification('监控异常', content, params.get('dingtalk_token') if params else None)
-        
-        try:
-            refresh_btn = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.ID, 'query_ticket')))
-            refresh_btn.click()
+                SELECTORS.wait(driver, 'query_table', 5)
+                rows = read_table_snapshot(driver, recorder)
+            decision = strategy.step(rows, state)
+            METRICS.observe('query_parse_ms', (time.perf_counter() - read_started) * 1000)
+            _record_history(history, rows, route, travel_date)
+            released = [e for e in state.events if e.kind in ('release', 'bookable')]
+            if released:
+                logger.info(f'余票变化: {describe_events(released[:10])}')
+            if decision.action == 'book':
+                logger.info(f'发现可预订车次 {decision.train}（{decision.reason}），尝试预订...')
+                if coordination is not None:
+                    coordination.publish('seen', train=decision.train, depart=decision.depart)
+                outcome = _submit_over_http(order, driver, coordination, decision)
+                if outcome == 'submitted':
+                    recorder.record('decision', train=decision.train, seat=decision.seat, reason=decision.reason,
+                                    engine='http')
+                    return decision, 'submitted'
+                row = None
+                if outcome == 'fallback':
+                    row = _row_element(driver, decision.row, timeout=3 if capture is not None else 0)
+                if row is not None and _claim_and_click(row, driver, coordination, decision.train or decision.depart):
+                    recorder.record('decision', train=decision.train, seat=decision.seat, reason=decision.reason)
+                    return decision, 'booked'
+            elif attempt == 1 or attempt % log_every == 0:
+                logger.info(decision.reason)
+            if not (max_attempts > 0 and attempt >= max_attempts):
+                sale = sale_until is not None and datetime.now() < sale_until
+                _refresh_query(driver, blocker, PRIORITY_SALE if sale else PRIORITY_MONITOR, limiter)
+            METRICS.set_gauge('last_success_at', time.time())
+            errors.on_success()
+            backoff = 0.0
+            if watchdog is not None:
+                watchdog.on_success()
+            if session is not None:
+                session.sync(driver)
+            if monitor is not None:
+                # 本轮没有余票变化视为空闲期，可提前回收
+                recycles = monitor.tab_recycles + monitor.browser_recycles
+                previous_driver, driver = driver, monitor.tick(driver, quiet=not state.events)
+                if driver is not previous_driver or monitor.tab_recycles + monitor.browser_recycles != recycles:
+                    _rebind_driver(driver, capture, blocker)
+        except ReplayFinished:
+            # 轨迹回放结束不是监控异常，交给 replay_trace 处理
+            raise
         except Exception as e:
-            logger.error(f'点击查询按钮刷新失败: {e}，尝试整页刷新')
-            driver.refresh()
-        wait_time = random.uniform(*refresh_interval)
-        logger.info(f'继续监控车次 {target}，等待{wait_time:.2f}s后重试...')
+            METRICS.inc('cycle_errors')
+            action = errors.on_error(e, attempt)
+            backoff = action.delay
+            if watchdog is not None and watchdog.on_error(e):
+                # 新浏览器已回到查询页面并完成一次查询，直接进入下一轮
+                driver = watchdog.driver
+                _rebind_driver(driver, capture, blocker)
+                continue
+            if action.refresh and not (max_attempts > 0 and attempt >= max_attempts):
+                try:
+                    _refresh_query(driver, blocker, limiter=limiter)
+                except Exception as refresh_error:
+                    logger.error(f'刷新查询结果失败: {refresh_error}')
+
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save(monitor_count=monitor_count_ref['count'], last_notification_at=last_notification_time,
+                            last_seen=state.differ.snapshot())
+        if max_attempts > 0 and attempt >= max_attempts:
+            continue
+        interval = refresh_interval
+        if history is not None and params:
+            # 根据历史放票时间调整刷新节奏
+            try:
+                interval = history.suggest_refresh_interval(route, refresh_interval, travel_date=travel_date)
+            except Exception as e:
+                logger.debug(f'计算刷新间隔失败: {e}')
+        # 失败后按错误类别退避，不少于正常刷新间隔
+        wait_time = max(random.uniform(*interval), backoff)
+        if profiler is not None:
+            profiler.pause()
+        logger.info(f'继续监控（{strategy.describe()}），等待{wait_time:.2f}s后重试...')
         time.sleep(wait_time)
+
+
+def book_by_time_range(driver, start_hhmm, end_hhmm, max_attempts=30, refresh_interval=(3,6),
+                       params=None, history=None, coordination=None, on_change=None,
+                       recorder=NULL_RECORDER, watchdog=None, session=None, monitor=None, capture=None,
+                       blocker=None, profiler=None, errors=None, order=None, reloader=None, checkpoint=None,
+                       limiter=None):
+    """按时间范围抢票"""
+    params = params or {}
+    strategy = TimeRangeStrategy(start_hhmm, end_hhmm, seat_category=params.get('seat_category'),
+                                 strict_seat=bool(params.get('strict_seat')))
+    decision, reason = run_strategy(driver, strategy, max_attempts=max_attempts, refresh_interval=refresh_interval,
+                                    params=params, history=history, coordination=coordination,
+                                    on_change=on_change, recorder=recorder, log_every=5, watchdog=watchdog,
+                                    session=session, monitor=monitor, capture=capture, blocker=blocker,
+                                    profiler=profiler, errors=errors, order=order, reloader=reloader,
+                                    checkpoint=checkpoint, limiter=limiter)
+    if decision is not None:
+        return f'成功尝试预订出发时间 {decision.depart} 的车次'
+    if reason.startswith('booked_by:'):
+        return f'节点 {reason[len("booked_by:"):]} 已完成预订，本节点停止抢票'
+    return '没抢到，可惜~'
+
+
+def book_by_train_number(driver, target_train_number, max_attempts=0, refresh_interval=(2,4), 
+                       params=None, start_time=None, monitor_count_ref=None, last_notification_time=None,
+                       history=None, coordination=None, on_change=None, recorder=NULL_RECORDER,
+                       watchdog=None, session=None, monitor=None, capture=None, blocker=None, profiler=None,
+                       errors=None, order=None, reloader=None, checkpoint=None, limiter=None):
+    """按指定车次抢票"""
+    target = (target_train_number or '').strip().upper()
+    if not target:
+        return '未设置目标车次'
+    params = params or {}
+    strategy = TrainNumberStrategy(target, seat_category=params.get('seat_category'),
+                                   strict_seat=bool(params.get('strict_seat')))
+    decision, reason = run_strategy(driver, strategy, max_attempts=max_attempts, refresh_interval=refresh_interval,
+                                    params=params, history=history, coordination=coordination,
+                                    on_change=on_change, recorder=recorder, start_time=start_time,
+                                    monitor_count_ref=monitor_count_ref,
+                                    last_notification_time=last_notification_time, notify_errors=True,
+                                    watchdog=watchdog, session=session, monitor=monitor, capture=capture,
+                                    blocker=blocker, profiler=profiler, errors=errors, order=order,
+                                    reloader=reloader, checkpoint=checkpoint, limiter=limiter)
+    if reloader is not None:
+        # 运行中可能切换过目标车次
+        target = params.get('target_train_number') or target
+    if decision is not None:
+        return f'成功尝试预订指定车次 {decision.train or target}'
+    if reason.startswith('booked_by:'):
+        return f'节点 {reason[len("booked_by:"):]} 已完成预订，本节点停止监控车次 {target}'
     # 如果设置了max_attempts且超过限制，才返回结束消息
     return f'监控结束，未抢到指定车次 {target}，可惜~'
 
 
+def _send_booked_notification(params, result_msg, outcome):
+    """确认下单结果（已生成订单或仍在排队）后发送通知"""
+    title = '抢票成功' if outcome.status == 'confirmed' else '订单排队中'
+    content = f"## {title}\n" \
+             f"> 结果: {result_msg}\n" \
+             f"> 订单: {describe_result(outcome)}\n" \
+             f"> 出发站: {params.get('from_station', '未知')}\n" \
+             f"> 到达站: {params.get('to_station', '未知')}\n" \
+             f"> 日期: {params.get('travel_date', '未知')}\n" \
+             f"> 席别: {params.get('seat_category', '未知')}\n" \
+             f"> 乘车人: {params.get('passenger_name', '未知')}\n" \
+             f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+    send_dingtalk_notification(title, content, params.get('dingtalk_token') if params else None)
+
+
+def _send_finished_notification(params, result_msg):
+    """没有抢到票或下单失败、任务结束时发送通知"""
+    content = f"## 抢票任务结束\n" \
+             f"> 结果: {result_msg}\n" \
+             f"> 出发站: {params['from_station']}\n" \
+             f"> 到达站: {params['to_station']}\n" \
+             f"> 日期: {params['travel_date']}\n" \
+             f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+    send_dingtalk_notification('抢票任务结束', content, params.get('dingtalk_token'))
+
+
 def select_seat_fast(driver, preferred_type="first"):
     """快速选座"""
     logger.info(f"快速选择座位，偏好: {preferred_type}")
     try:
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME, 'seat-sel-bd'))
-        )
+        SELECTORS.wait(driver, 'seat_panel', 10)
     except Exception as e:
         logger.error(f'座位选择对话框加载失败: {e}', exc_info=True)
         return False
     try:
-        seats = driver.find_elements(By.XPATH, "//div[@class='seat-sel-bd']//a[contains(@href, 'javascript:')]")
+        seats = SELECTORS.find_all(driver, 'seat_options')
         if not seats:
             logger.debug('未找到可选座位')
             return False
@@ -372,57 +752,78 @@ def select_seat_fast(driver, preferred_type="first"):
         return False
 
 
-def setup_browser_and_login():
-    """设置浏览器并完成登录（供预登录使用）"""
-    edge_options = Options()
-    edge_options.add_experimental_option('detach', True)
-    edge_options.add_argument('--disable-blink-features=AutomationControlled')
-    edge_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.3485.54')
-    edge_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    
-    # 添加网络相关的参数
-    edge_options.add_argument('--no-proxy-server')
-    edge_options.add_argument('--disable-extensions')
-    edge_options.add_argument('--disable-gpu')
-    edge_options.add_argument('--no-sandbox')
-    edge_options.add_argument('--disable-dev-shm-usage')
-    edge_options.add_argument('--ignore-certificate-errors')
-    edge_options.add_argument('--ignore-ssl-errors')
-    
+def create_browser(capture_network=False, params=None):
+    """按 browser 等参数创建浏览器实例（Windows 默认 Edge，见 driver_backends），失败返回None
+
+    capture_network 为真时开启性能日志，用于通过 CDP 网络事件截获查询响应
+    """
+    return launch_browser(params, capture_network=capture_network)
+
+
+HOME_PAGE_URL = 'https://www.12306.cn'
+USER_CENTER_URL = 'https://kyfw.12306.cn/otn/view/index.html'
+LOGIN_QR_PATH = 'login_qr.png'
+
+
+def _session_valid(driver):
+    """打开个人中心，用浏览器中的 Cookie 请求登录状态接口确认是否已登录"""
+    # get_cookies 只返回当前页面域名的 Cookie，先打开 12306 页面
+    driver.get(USER_CENTER_URL)
+    keeper = SessionKeeper()
     try:
-        # 使用Selenium 4.6+的内置驱动管理功能，直接初始化Edge浏览器
-        print('正在初始化Edge浏览器...')
-        driver = webdriver.Edge(options=edge_options)
-        print('成功初始化Edge浏览器')
+        keeper.sync(driver, force=True)
+        logged_in = keeper.check()
+    finally:
+        keeper.close()
+    if not logged_in:
+        logger.info('保存的登录 Cookie 已失效，改为扫码登录')
+    return bool(logged_in)
+
+
+def prelaunch_browser(params=None):
+    """提前启动浏览器并打开12306官网（GUI 在用户填写表单时后台调用），失败返回None"""
+    driver = create_browser(capture_network=bool((params or {}).get('network_capture')), params=params)
+    if driver is None:
+        return None
+    try:
+        driver.get(HOME_PAGE_URL)
+        driver.maximize_window()
     except Exception as e:
-        print(f'初始化浏览器时出错: {e}')
-        print('❌ 无法初始化浏览器')
-        print('提示：可能是Edge WebDriver未安装或版本不匹配')
-        print('请确保已安装与Edge浏览器版本匹配的WebDriver')
-        print('手动下载地址：https://developer.microsoft.com/en-us/microsoft-edge/tools/webdriver/')
+        logger.debug(f'预启动浏览器打开官网失败: {e}')
+    return driver
+
+
+def setup_browser_and_login(params=None, driver=None):
+    """设置浏览器并完成登录（供预登录使用）
+
+    driver 为已预启动的浏览器时直接使用，省去启动浏览器和打开官网的时间
+    """
+    started = time.monotonic()
+    params = params or {}
+    prelaunched = driver is not None
+    if driver is None:
+        driver = create_browser(capture_network=bool(params.get('network_capture')), params=params)
+    if driver is None:
         return None
     
     try:
-        driver.get('https://www.12306.cn')
-        driver.maximize_window()
-        logger.info('✓ 已打开12306官网')
+        if params.get('session_cookies') and os.path.exists(params['session_cookies']) and _session_valid(driver):
+            # 浏览器启动时已注入保存的登录 Cookie，且仍然有效，不需要扫码
+            logger.info(f'✓ 已使用保存的登录 Cookie 登录，耗时 {time.monotonic() - started:.1f} 秒')
+            return driver
         
-        time.sleep(2)
+        if not (prelaunched and driver.current_url.startswith(HOME_PAGE_URL)):
+            driver.get(HOME_PAGE_URL)
+            driver.maximize_window()
+            time.sleep(2)
+        logger.info('✓ 已打开12306官网')
         
         # 登录流程
         try:
             logger.info('正在查找登录按钮...')
-            try:
-                login_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, 'J-btn-login')))
-                login_button.click()
-                logger.info('✓ 已点击登录按钮')
-            except Exception as e:
-                logger.debug(f'登录按钮查找失败（ID方式）: {e}')
-                login_button = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.XPATH, "//a[contains(text(),'登录') or contains(@class,'login')]"))
-                )
-                login_button.click()
-                logger.info('✓ 已点击登录按钮')
+            login_button = SELECTORS.wait(driver, 'login_button', 15, clickable=True)
+            login_button.click()
+            logger.info('✓ 已点击登录按钮')
         except Exception as e:
             logger.warning(f'⚠ 点击登录按钮失败：{e}')
             logger.warning('提示：请手动点击页面上的"登录"按钮')
@@ -431,9 +832,7 @@ def setup_browser_and_login():
         try:
             logger.info('正在切换到扫码登录...')
             try:
-                scan_login_button = WebDriverWait(driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, "//a[text()='扫码登录' or contains(text(),'扫码')]"))
-                )
+                scan_login_button = SELECTORS.wait(driver, 'scan_login', 10, clickable=True, optional=True)
                 scan_login_button.click()
                 logger.info('✓ 已切换到扫码登录')
             except Exception as e:
@@ -444,6 +843,15 @@ def setup_browser_and_login():
             logger.warning('提示：请手动点击"扫码登录"按钮')
             time.sleep(2)
         
+        logger.info(f'✓ 登录页已就绪，耗时 {time.monotonic() - started:.1f} 秒'
+                    f"{'（使用预启动的浏览器）' if prelaunched else ''}")
+        if params.get('headless'):
+            # 无头模式没有窗口：把登录页截图保存下来，打开图片扫码
+            try:
+                driver.save_screenshot(LOGIN_QR_PATH)
+                logger.info(f'无头模式：登录二维码已保存到 {os.path.abspath(LOGIN_QR_PATH)}')
+            except Exception as e:
+                logger.warning(f'⚠ 保存登录二维码截图失败: {e}')
         logger.info('\n📱 请用手机12306 APP扫码登录...')
         logger.info('⏳ 等待扫码中...\n')
         
@@ -451,15 +859,9 @@ def setup_browser_and_login():
         login_success = False
         for i in range(60):
             try:
-                try:
-                    WebDriverWait(driver, 2).until(EC.presence_of_element_located((By.XPATH, "//a[text()='个人中心' or contains(text(),'个人')]")))
-                    login_success = True
-                    break
-                except Exception as e:
-                    logger.debug(f'个人中心元素查找失败: {e}')
-                    if driver.find_elements(By.XPATH, "//*[contains(@class,'user') or contains(@id,'user')]"):
-                        login_success = True
-                        break
+                SELECTORS.wait(driver, 'logged_in_marker', 2, optional=True)
+                login_success = True
+                break
             except Exception as e:
                 logger.debug(f'登录状态检查失败: {e}')
                 pass
@@ -475,6 +877,12 @@ def setup_browser_and_login():
             return None
         
         logger.info('✓ 登录成功！')
+        if params.get('session_cookies'):
+            # 保存登录 Cookie，下次（或复制到服务器上的无头模式）启动时直接使用
+            try:
+                export_session(driver, params['session_cookies'])
+            except Exception as e:
+                logger.warning(f'⚠ 保存登录 Cookie 失败: {e}')
         return driver
     
     except Exception as e:
@@ -487,8 +895,251 @@ def setup_browser_and_login():
         return None
 
 
-def run_booking_with_driver(driver, params):
-    """使用已登录的浏览器实例执行抢票（供GUI调用）"""
+def _fill_query_form(driver, params, recorder=NULL_RECORDER):
+    """在查询页面填写出发站、到达站、日期和票型，任一步失败返回False"""
+    # 填写出发站
+    try:
+        from_station_input = SELECTORS.wait(driver, 'from_station_input', 8, clickable=True)
+        from_station_input.click()
+        from_station_input.clear()
+        from_station_input.send_keys(params['from_station'])
+        logger.info(f"✓ 已输入出发地: {params['from_station']}")
+        first_option = SELECTORS.wait(driver, 'station_first_option', 6, clickable=True)
+        first_option.click()
+        recorder.mark('from_station')
+    except Exception as e:
+        logger.error(f'操作出发地输入框失败：{e}', exc_info=True)
+        return False
+    
+    # 填写到达站
+    try:
+        to_station_input = SELECTORS.wait(driver, 'to_station_input', 8, clickable=True)
+        to_station_input.click()
+        to_station_input.clear()
+        to_station_input.send_keys(params['to_station'])
+        logger.info(f"✓ 已输入目的地: {params['to_station']}")
+        first_option = SELECTORS.wait(driver, 'station_first_option', 6, clickable=True)
+        first_option.click()
+        recorder.mark('to_station')
+    except Exception as e:
+        logger.error(f'操作目的地输入框失败：{e}', exc_info=True)
+        return False
+    
+    # 填写出发日期
+    try:
+        date_input = SELECTORS.wait(driver, 'date_input', 10, clickable=True)
+        date_input.click()
+        date_input.clear()
+        date_input.send_keys(params['travel_date'])
+        logger.info(f"✓ 已输入出发时间: {params['travel_date']}")
+        try:
+            SELECTORS.find(driver, 'calendar', optional=True).click()
+        except Exception as e:
+            logger.debug(f'点击日历失败: {e}')
+            pass
+        recorder.mark('travel_date')
+    except Exception as e:
+        logger.error(f'时间输入框操作失败：{e}', exc_info=True)
+        return False
+    
+    # 选择票型
+    try:
+        if params['ticket_type'] == 'student':
+            SELECTORS.wait(driver, 'ticket_type_student', 8, clickable=True).click()
+            logger.info('✓ 已选择学生票')
+        else:
+            SELECTORS.wait(driver, 'ticket_type_adult', 8, clickable=True).click()
+            logger.info('✓ 已选择成人票')
+        recorder.mark('ticket_type')
+    except Exception as e:
+        logger.error(f'票种选择失败：{e}', exc_info=True)
+        return False
+    return True
+
+
+QUERY_PAGE_URL = 'https://kyfw.12306.cn/otn/leftTicket/init'
+
+
+def _query_page_restorer(params, recorder=NULL_RECORDER):
+    """浏览器重启后回到查询页面：重新填写查询条件并查询一次"""
+    def restore(driver):
+        driver.get(QUERY_PAGE_URL)
+        if not _fill_query_form(driver, params, recorder):
+            return False
+        SELECTORS.wait(driver, 'query_button', 8, clickable=True).click()
+        SELECTORS.wait(driver, 'query_table', 10)
+        recorder.mark('restore_query_page')
+        return True
+    return restore
+
+
+def _state_change_notifier(params):
+    """生成余票变化回调：目标车次（或任意车次）无→有时发送钉钉通知"""
+    def notify(events):
+        # 每次从 params 读取目标车次，运行中切换配置后立即按新车次过滤
+        target = params.get('target_train_number')
+        released = [e for e in events if e.kind == 'release' and (not target or e.train == target)]
+        if not released:
+            return
+        content = f"## 余票变化\n" \
+                 f"> {describe_events(released)}\n" \
+                 f"> 出发站: {params.get('from_station', '未知')}\n" \
+                 f"> 到达站: {params.get('to_station', '未知')}\n" \
+                 f"> 日期: {params.get('travel_date', '未知')}\n" \
+                 f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        send_dingtalk_notification('余票变化', content, params.get('dingtalk_token'))
+    return notify
+
+
+def _submit_order_in_browser(driver, params, plan, recorder, booked_at, tracker):
+    """在订单页面选择乘车人、票种和座位并最终确认，返回 tracker 跟踪到的下单结果（OrderResult）"""
+    # 选择乘车人
+    try:
+        passenger_names = plan.passenger_names
+        if passenger_names:
+            passenger_name = '、'.join(passenger_names)
+            logger.info(f'尝试选择乘车人：{passenger_name}')
+            # 尝试通过姓名查找乘车人（支持逗号分隔的多个乘车人）
+            passengers = SELECTORS.find_all(driver, 'passenger_items')
+            selected = 0
+            for name in passenger_names:
+                for passenger in passengers:
+                    if name in passenger.text:
+                        checkbox = SELECTORS.find(passenger, 'passenger_checkbox')
+                        if checkbox:
+                            checkbox.click()
+                            logger.info(f'✓ 已成功选择乘车人：{name}')
+                            selected += 1
+                            break
+            if not selected:
+                # 如果找不到指定姓名的乘车人，选择第一个乘车人
+                logger.warning(f'未找到姓名为 {passenger_name} 的乘车人，尝试选择第一个乘车人')
+                passenger_checkbox = SELECTORS.wait(driver, 'first_passenger', 5, clickable=True)
+                passenger_checkbox.click()
+                logger.info('✓ 已成功选择第一个乘车人')
+        else:
+            # 没有指定乘车人姓名，选择第一个乘车人
+            passenger_checkbox = SELECTORS.wait(driver, 'first_passenger', 5, clickable=True)
+            passenger_checkbox.click()
+            logger.info('✓ 已成功选择第一个乘车人')
+    except Exception as e:
+        logger.error(f'选择乘车人失败：{e}', exc_info=True)
+    recorder.mark('select_passenger')
+    
+    try:
+        SELECTORS.wait(driver, 'student_confirm', 1, clickable=True, optional=True).click()
+    except Exception as e:
+        logger.debug(f'点击确认按钮失败：{e}')
+    
+    # 订单页票种选择
+    try:
+        if params['ticket_type'] == 'adult':
+            ticket_type_select = SELECTORS.wait(driver, 'order_ticket_type', 1)
+            Select(ticket_type_select).select_by_value('1')
+            logger.info('✓ 订单页已选择票种：成人票')
+    except Exception as e:
+        logger.error(f'订单页选择票种失败：{e}', exc_info=True)
+    
+    # 提交订单
+    try:
+        SELECTORS.wait(driver, 'submit_order', 5, clickable=True).click()
+        METRICS.observe('click_submit_ms', (time.perf_counter() - booked_at) * 1000)
+        logger.info('✓ 已成功点击提交订单按钮')
+    except Exception as e:
+        logger.error(f'点击提交订单按钮失败：{e}', exc_info=True)
+    time.sleep(0.4)
+    recorder.mark('submit_order')
+    recorder.page('order_submitted', driver)
+    
+    # 学生票提示
+    if params['ticket_type'] == 'student':
+        try:
+            SELECTORS.wait(driver, 'student_warning_close', 6, clickable=True).click()
+        except Exception as e:
+            logger.error(f'点击确认按钮失败：{e}', exc_info=True)
+    
+    # 选座
+    select_seat_fast(driver, preferred_type=params.get('seat_position_preference','first'))
+    time.sleep(0.8)
+    recorder.mark('select_seat')
+    
+    # 最终确认，之后跟踪下单结果（令牌在页面跳转前读取）
+    token = tracker.read_token(driver)
+    try:
+        SELECTORS.wait(driver, 'final_confirm', 8, clickable=True).click()
+        logger.info('✓ 已提交最终确认，等待下单结果...')
+        recorder.mark('final_confirm')
+        recorder.page('final_confirmed', driver)
+    except Exception as e:
+        logger.error(f'点击确认按钮失败：{e}', exc_info=True)
+        return OrderResult('failed', None, None, f'点击最终确认失败: {str(e)[:60]}')
+    result = tracker.track(driver, token)
+    recorder.mark('order_outcome')
+    return result
+
+
+def _reload_listener(params, order=None, checkpoint=None, coordination=None):
+    """配置切换后更新不经过 params 读取的部分：钉钉机器人、HTTP 下单的乘车信息、监控断点的任务标识和协同租约键"""
+    def apply(plan):
+        if params.get('dingtalk_token'):
+            set_dingtalk_token(params['dingtalk_token'], params.get('dingtalk_secret'))
+        if order is not None:
+            order.retarget(plan)
+        if checkpoint is not None:
+            checkpoint.retarget(plan.task_id)
+        if coordination is not None:
+            coordination.retarget(params)
+    return apply
+
+
+# 从断点恢复时确认上次排队订单结果的最长等待（秒）
+PENDING_ORDER_WAIT = 30
+
+
+def _resolve_pending_order(driver, params, checkpoint, pending, tracker):
+    """断点中留有排队中的订单时先确认结果，返回 True 表示可以开始监控
+
+    用保存的订单页令牌查询排队结果：已生成订单时发送通知并结束任务，已失败时清除订单后继续监控；
+    没有令牌、查询失败或仍在排队时保留断点中的订单并停止，等待用户在 12306 未完成订单中确认
+    """
+    result = None
+    token = pending.get('token')
+    if token:
+        session = None
+        try:
+            session = http_session_from_driver(driver)
+            result = wait_for_order(session, token, tracker.base_url, timeout=PENDING_ORDER_WAIT,
+                                    request_timeout=tracker.request_timeout)
+        except Exception as e:
+            logger.warning(f'⚠ 查询上次订单的排队结果失败: {e}')
+        finally:
+            if session is not None:
+                session.close()
+    if result is not None and result.status == 'confirmed':
+        logger.info(f'🎉 上次排队的订单{describe_result(result)}，不再重复抢票；请在 12306 未完成订单中完成支付')
+        _send_booked_notification(params, '上次排队的订单已出结果', result)
+        checkpoint.clear()
+        return False
+    if result is not None and result.status == 'failed':
+        logger.info(f'上次排队的订单{describe_result(result)}，继续监控')
+        checkpoint.save(status='monitoring', order=None)
+        return True
+    message = pending.get('message', '') if result is None else describe_result(result)
+    logger.warning(f'⚠ 上次运行时的订单结果未知（{message}），暂不开始监控，避免重复下单；'
+                   f'请先在 12306 未完成订单中确认，确认没有订单后删除断点文件 {checkpoint.path} 再重新开始')
+    content = f"## 抢票任务暂停\n" \
+             f"> 原因: 上次的订单结果未知（{message}）\n" \
+             f"> 出发站: {params.get('from_station', '未知')}\n" \
+             f"> 到达站: {params.get('to_station', '未知')}\n" \
+             f"> 日期: {params.get('travel_date', '未知')}\n" \
+             f"> 处理: 在 12306 未完成订单中确认，没有订单时删除断点文件 {checkpoint.path} 后重新开始\n" \
+             f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+    send_dingtalk_notification('抢票任务暂停', content, params.get('dingtalk_token'))
+    return False
+
+
+def run_booking_with_driver(driver, params, reloader=None):
+    """使用已登录的浏览器实例执行抢票（供GUI调用）；reloader 为界面的配置热更新器，运行中可提交新配置"""
     if not driver:
         logger.error('❌ 浏览器实例无效')
         # 发送失败通知
@@ -498,6 +1149,18 @@ def run_booking_with_driver(driver, params):
         send_dingtalk_notification('抢票任务失败', content, params.get('dingtalk_token'))
         return
     
+    # 校验并编译任务配置，之后统一使用规范化后的参数
+    try:
+        plan = compile_task(params)
+    except ConfigError as e:
+        logger.error(f'❌ 抢票配置有误: {e}')
+        content = f"## 抢票任务失败\n" \
+                 f"> 失败原因: 配置有误 {e}\n" \
+                 f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        send_dingtalk_notification('抢票任务失败', content, params.get('dingtalk_token'))
+        return
+    params = plan.to_params()
+    
     # 设置钉钉机器人token和secret
     if params.get('dingtalk_token'):
         set_dingtalk_token(params['dingtalk_token'], params.get('dingtalk_secret'))
@@ -516,8 +1179,17 @@ def run_booking_with_driver(driver, params):
     logger.info(f"乘车人: {params.get('passenger_name', '未设置')}")
     logger.info('=' * 60)
     
+    # 监控断点（可选）：崩溃或重启后沿用上次的开始时间、监控次数和状态通知时间
+    checkpoint = open_checkpoint(params, plan)
+    resumed = checkpoint.resume() if checkpoint is not None else None
+    # 下单结果跟踪；上次的订单仍在排队时先确认结果，确认前不开始监控
+    tracker = open_order_tracker(params)
+    if resumed is not None and resumed.order:
+        if not _resolve_pending_order(driver, params, checkpoint, resumed.order, tracker):
+            return
+    
     # 发送开始抢票通知
-    start_time = datetime.now()
+    start_time = resumed.started_at if resumed is not None else datetime.now()
     if params.get('target_train_number'):
         content = f"## 抢票任务开始\n" \
                  f"> 出发站: {params['from_station']}\n" \
@@ -539,212 +1211,285 @@ def run_booking_with_driver(driver, params):
                  f"> 乘车人: {params.get('passenger_name', '未设置')}\n" \
                  f"> 时间范围: {tr['start']} - {tr['end']}\n" \
                  f"> 开始时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    if resumed is not None:
+        content += f"> 从断点恢复: 已监控 {resumed.monitor_count} 次，断点保存于 " \
+                   f"{resumed.saved_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
     send_dingtalk_notification('抢票任务开始', content, params.get('dingtalk_token'))
     
-    # 记录监控次数
-    monitor_count = 0
-    last_notification_time = start_time
+    # 记录监控次数和上次状态通知时间（多次进入监控时累计，从断点恢复时接着计）
+    monitor_ref = {'count': resumed.monitor_count if resumed is not None else 0,
+                   'notified_at': (resumed.last_notification_time if resumed is not None else None) or start_time}
+    if checkpoint is not None:
+        # 上次排队的订单已确认失败（否则不会走到这里），不再保留
+        checkpoint.save(started_at=start_time, monitor_count=monitor_ref['count'],
+                        last_notification_at=monitor_ref['notified_at'], status='monitoring', order=None)
+    
+    # 沿用上次保存的选择器统计（可选）
+    selector_stats = (params.get('selector_stats') or '').strip()
+    if selector_stats:
+        SELECTORS.load_stats(selector_stats)
+    
+    # 余票历史记录（可选）
+    history = open_history(params)
+    # 多节点协同（可选）
+    coordination = open_coordination(params)
+    # 会话录制（可选）
+    recorder = open_recorder(params)
+    # 浏览器看门狗：调用超时、卡死/崩溃后自动重启并回到查询页面
+    def notify(title, content):
+        send_dingtalk_notification(title, content, params.get('dingtalk_token'))
+    
+    factory = functools.partial(create_browser, capture_network=bool(params.get('network_capture')), params=params)
+    watchdog = open_watchdog(params, driver, factory, restore=_query_page_restorer(params, recorder),
+                             notify=notify)
+    # 登录会话保活：后台检查登录状态，失效时暂停监控并提醒重新登录
+    session = open_session_keeper(params, driver, notify=notify, restore=_query_page_restorer(params, recorder))
+    # 内存监控：采样进程内存，超过阈值时回收标签页/浏览器
+    monitor = open_resource_monitor(params, restore=_query_page_restorer(params, recorder), watchdog=watchdog)
+    blocker = None
+    # 请求限流：本任务的页面刷新和 HTTP 查询与进程内其他任务共用令牌桶，账号桶按登录账号区分
+    limiter = open_rate_limiter(params, account=_login_account(driver, params))
+    # 性能分析（可选）：整次运行，或只分析监控循环（传给策略执行器）
+    profiler = open_profiler(params, label=plan.task_id)
+    cycle_profiler = profiler if profiler is not None and profiler.scope == 'cycle' else None
+    # 监控异常处理：按类别退避、连续失败熔断、异常通知按时间段汇总
+    errors = open_error_tracker(params, notify=notify)
+    # HTTP 下单（可选）：查询数据带有 secretStr 时直接通过接口下单，不操作订单页面
+    order = open_order_pipeline(params, plan)
+    # 配置热更新（可选）：新配置校验通过后在两轮监控之间切换，不重新登录、不重置监控状态
+    reloader = open_config_reloader(params, plan, reloader)
+    if reloader is not None:
+        reloader.add_listener(_reload_listener(params, order, checkpoint, coordination))
     
     try:
         # 进入购票页面
         try:
-            ticket_link = WebDriverWait(driver, 8).until(EC.element_to_be_clickable((By.ID, 'link_for_ticket')))
+            ticket_link = SELECTORS.wait(driver, 'ticket_link', 8, clickable=True)
             ticket_link.click()
             time.sleep(0.2)
             if len(driver.window_handles) > 1:
                 driver.switch_to.window(driver.window_handles[-1])
             logger.info('✓ 已进入购票页面')
+            recorder.mark('open_ticket_page')
         except Exception as e:
             logger.error(f'进入购票页面失败：{e}', exc_info=True)
             return
         
-        # 填写出发站
-        try:
-            from_station_input = WebDriverWait(driver, 8).until(EC.element_to_be_clickable((By.ID, 'fromStationText')))
-            from_station_input.click()
-            from_station_input.clear()
-            from_station_input.send_keys(params['from_station'])
-            logger.info(f"✓ 已输入出发地: {params['from_station']}")
-            first_option = WebDriverWait(driver, 6).until(EC.element_to_be_clickable((By.CSS_SELECTOR, '#citem_0 > span:nth-child(1)')))
-            first_option.click()
-        except Exception as e:
-            logger.error(f'操作出发地输入框失败：{e}', exc_info=True)
-            return
-        
-        # 填写到达站
-        try:
-            to_station_input = WebDriverWait(driver, 8).until(EC.element_to_be_clickable((By.ID, 'toStationText')))
-            to_station_input.click()
-            to_station_input.clear()
-            to_station_input.send_keys(params['to_station'])
-            logger.info(f"✓ 已输入目的地: {params['to_station']}")
-            first_option = WebDriverWait(driver, 6).until(EC.element_to_be_clickable((By.CSS_SELECTOR, '#citem_0 > span:nth-child(1)')))
-            first_option.click()
-        except Exception as e:
-            logger.error(f'操作目的地输入框失败：{e}', exc_info=True)
-            return
+        # 资源拦截（可选）：以刚打开的查询页面作为基准统计可节省的请求
+        blocker = open_blocker(params, driver)
         
-        # 填写出发日期
-        try:
-            date_input = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, 'train_date')))
-            date_input.click()
-            date_input.clear()
-            date_input.send_keys(params['travel_date'])
-            logger.info(f"✓ 已输入出发时间: {params['travel_date']}")
-            try:
-                driver.find_element(By.CLASS_NAME, 'cal').click()
-            except Exception as e:
-                logger.debug(f'点击日历失败: {e}')
-                pass
-        except Exception as e:
-            logger.error(f'时间输入框操作失败：{e}', exc_info=True)
+        if not _fill_query_form(driver, params, recorder):
             return
         
-        # 选择票型
-        try:
-            if params['ticket_type'] == 'student':
-                WebDriverWait(driver, 8).until(EC.element_to_be_clickable((By.ID, 'sf2'))).click()
-                logger.info('✓ 已选择学生票')
-            else:
-                WebDriverWait(driver, 8).until(EC.element_to_be_clickable((By.ID, 'sf1'))).click()
-                logger.info('✓ 已选择成人票')
-        except Exception as e:
-            logger.error(f'票种选择失败：{e}', exc_info=True)
-            return
+        # 开售瞬间并发查询（可选）：开售前后按错开时间表从多个会话查询，第一个看到余票的查询命中后立即预订
+        burst = open_sale_burst(params, plan, driver, limiter)
+        burst_booking = None
         
         # 等待开售时间
         try:
-            bst = (params.get('booking_start_time') or '').strip()
-            if bst:
-                start_datetime = datetime.strptime(bst, '%Y-%m-%d %H:%M:%S')
+            start_datetime = plan.booking_start
+            if start_datetime:
                 now = datetime.now()
                 if now < start_datetime:
                     wait_seconds = (start_datetime - now).total_seconds()
                     logger.info(f'等待开售时间，还需 {wait_seconds:.1f} 秒...')
                     if wait_seconds > 10:
                         time.sleep(max(0, wait_seconds - 10))
-                    while datetime.now() < start_datetime:
+                    winner = burst.run(driver, start_datetime.timestamp()) if burst is not None else None
+                    if winner is not None:
+                        burst_booking = _book_burst_winner(winner, driver, order, coordination, limiter, recorder)
+                    if burst is not None:
+                        for line in burst.report():
+                            logger.info(line)
+                        recorder.mark('sale_burst')
+                    while burst_booking is None and datetime.now() < start_datetime:
                         time.sleep(0.05)
             logger.info('🚀 到达抢票时间，开始抢票！')
+            recorder.mark('wait_sale_time')
         except Exception as e:
             logger.error(f'时间处理出错: {e}', exc_info=True)
             return
         
-        # 第一次查询
-        try:
-            query_button = WebDriverWait(driver, 8).until(EC.element_to_be_clickable((By.ID, 'query_ticket')))
-            query_button.click()
-            logger.info('✓ 已提交查询，正在等待结果...')
-            time.sleep(0.2)
-        except Exception as e:
-            logger.error(f'查询失败：{e}', exc_info=True)
-            return
-        
-        # 执行抢票策略
-        ttn = (params.get('target_train_number') or '').strip().upper()
-        if ttn:
-            logger.info(f'策略：指定车次 [{ttn}]')
-            # 设置max_attempts=0，实现无限期监控
-            result_msg = book_by_train_number(driver, ttn, max_attempts=0, refresh_interval=(2,4), 
-                                           params=params, start_time=start_time, 
-                                           monitor_count_ref={'count': 0}, last_notification_time=last_notification_time)
-        else:
-            tr = params['depart_time_range']
-            logger.info(f"策略：时间范围 [{tr['start']} - {tr['end']}]")
-            result_msg = book_by_time_range(driver, tr['start'], tr['end'], max_attempts=30, refresh_interval=(2,4))
-        logger.info(result_msg)
+        # 网络截获（可选）：在第一次查询前开始监听，第一次查询的响应也能截获
+        capture = open_capture(params, driver)
+        if blocker is not None:
+            blocker.capture = capture
         
-        # 发送抢票结果通知
-        if '成功' in result_msg:
-            content = f"## 抢票任务成功\n" \
-                     f"> 结果: {result_msg}\n" \
-                     f"> 出发站: {params['from_station']}\n" \
-                     f"> 到达站: {params['to_station']}\n" \
-                     f"> 日期: {params['travel_date']}\n" \
-                     f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-            send_dingtalk_notification('抢票任务成功', content, params.get('dingtalk_token'))
-        else:
-            content = f"## 抢票任务结束\n" \
-                     f"> 结果: {result_msg}\n" \
-                     f"> 出发站: {params['from_station']}\n" \
-                     f"> 到达站: {params['to_station']}\n" \
-                     f"> 日期: {params['travel_date']}\n" \
-                     f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-            send_dingtalk_notification('抢票任务结束', content, params.get('dingtalk_token'))
+        # 第一次查询（开售并发查询命中并已预订时跳过）
+        if burst_booking is None:
+            try:
+                _acquire_first_query(limiter, PRIORITY_SALE if plan.booking_start else PRIORITY_MONITOR)
+                query_button = SELECTORS.wait(driver, 'query_button', 8, clickable=True)
+                query_button.click()
+                logger.info('✓ 已提交查询，正在等待结果...')
+                time.sleep(0.2)
+                recorder.mark('first_query')
+            except Exception as e:
+                logger.error(f'查询失败：{e}', exc_info=True)
+                return
         
-        # 选择乘车人
-        try:
-            passenger_name = params.get('passenger_name', '')
-            if passenger_name:
-                logger.info(f'尝试选择乘车人：{passenger_name}')
-                # 尝试通过姓名查找乘车人
-                passengers = driver.find_elements(By.XPATH, "//ul[@id='normal_passenger_id']//li")
-                selected = False
-                for passenger in passengers:
-                    if passenger_name in passenger.text:
-                        checkbox = passenger.find_element(By.XPATH, ".//input[@type='checkbox']")
-                        if checkbox:
-                            checkbox.click()
-                            logger.info(f'✓ 已成功选择乘车人：{passenger_name}')
-                            selected = True
-                            break
-                if not selected:
-                    # 如果找不到指定姓名的乘车人，选择第一个乘车人
-                    logger.warning(f'未找到姓名为 {passenger_name} 的乘车人，尝试选择第一个乘车人')
-                    passenger_checkbox = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.ID, 'normalPassenger_0')))
-                    passenger_checkbox.click()
-                    logger.info('✓ 已成功选择第一个乘车人')
+        # 执行抢票策略；下单失败时回到查询页面继续监控
+        on_change = _state_change_notifier(params) if params.get('notify_state_change') else None
+        order_failures = 0
+        while True:
+            if reloader is not None:
+                # 上一次下单失败后可能已切换过配置
+                plan = reloader.plan
+            ttn = plan.target_train_number
+            if burst_booking is not None:
+                # 开售并发查询命中并已提交订单（或已点击预订），直接进入下单结果处理
+                decision, _ = burst_booking
+                burst_booking = None
+                result_msg = f'成功尝试预订车次 {decision.train}（开售并发查询命中）'
+            elif params.get('strategy'):
+                # 自定义策略：交给通用执行器，未设置 max_attempts 时无限期监控
+                strategy = plan.create_strategy()
+                logger.info(f'策略：{strategy.describe()}')
+                decision, reason = run_strategy(driver, strategy, max_attempts=plan.max_attempts or 0,
+                                                refresh_interval=plan.refresh_interval,
+                                                params=params, history=history, coordination=coordination,
+                                                on_change=on_change, recorder=recorder, start_time=start_time,
+                                                monitor_count_ref=monitor_ref,
+                                                last_notification_time=monitor_ref['notified_at'], notify_errors=True,
+                                                watchdog=watchdog, session=session, monitor=monitor,
+                                                capture=capture, blocker=blocker, profiler=cycle_profiler,
+                                                errors=errors, order=order, reloader=reloader, checkpoint=checkpoint,
+                                                limiter=limiter)
+                result_msg = f'成功尝试预订车次 {decision.train}' if decision else f'监控结束（{reason}），未抢到车次'
+            elif ttn:
+                logger.info(f'策略：指定车次 [{ttn}]')
+                # 未设置 max_attempts 时无限期监控
+                result_msg = book_by_train_number(driver, ttn, max_attempts=plan.max_attempts or 0,
+                                               refresh_interval=plan.refresh_interval,
+                                               params=params, start_time=start_time, 
+                                               monitor_count_ref=monitor_ref,
+                                               last_notification_time=monitor_ref['notified_at'],
+                                               history=history, coordination=coordination, on_change=on_change,
+                                               recorder=recorder, watchdog=watchdog, session=session,
+                                               monitor=monitor, capture=capture, blocker=blocker,
+                                               profiler=cycle_profiler, errors=errors, order=order, reloader=reloader,
+                                               checkpoint=checkpoint, limiter=limiter)
             else:
-                # 没有指定乘车人姓名，选择第一个乘车人
-                passenger_checkbox = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.ID, 'normalPassenger_0')))
-                passenger_checkbox.click()
-                logger.info('✓ 已成功选择第一个乘车人')
-        except Exception as e:
-            logger.error(f'选择乘车人失败：{e}', exc_info=True)
-        
-        try:
-            WebDriverWait(driver, 1).until(EC.element_to_be_clickable((By.ID, 'dialog_xsertcj_ok'))).click()
-        except Exception as e:
-            logger.debug(f'点击确认按钮失败：{e}')
-        
-        # 订单页票种选择
-        try:
-            if params['ticket_type'] == 'adult':
-                ticket_type_select = WebDriverWait(driver, 1).until(EC.presence_of_element_located((By.ID, 'ticketType_1')))
-                Select(ticket_type_select).select_by_value('1')
-                logger.info('✓ 订单页已选择票种：成人票')
-        except Exception as e:
-            logger.error(f'订单页选择票种失败：{e}', exc_info=True)
-        
-        # 提交订单
-        try:
-            WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.ID, 'submitOrder_id'))).click()
-            logger.info('✓ 已成功点击提交订单按钮')
-        except Exception as e:
-            logger.error(f'点击提交订单按钮失败：{e}', exc_info=True)
-        time.sleep(0.4)
-        
-        # 学生票提示
-        if params['ticket_type'] == 'student':
+                tr = params['depart_time_range']
+                logger.info(f"策略：时间范围 [{tr['start']} - {tr['end']}]")
+                max_attempts = 30 if plan.max_attempts is None else plan.max_attempts
+                result_msg = book_by_time_range(driver, tr['start'], tr['end'], max_attempts=max_attempts,
+                                                refresh_interval=plan.refresh_interval,
+                                                params=params, history=history, coordination=coordination,
+                                                on_change=on_change, recorder=recorder, watchdog=watchdog,
+                                                session=session, monitor=monitor, capture=capture, blocker=blocker,
+                                                profiler=cycle_profiler, errors=errors, order=order, reloader=reloader,
+                                                checkpoint=checkpoint, limiter=limiter)
+            booked_at = time.perf_counter()
+            if reloader is not None:
+                # 监控期间可能切换过配置，下单使用切换后的乘车人和票种
+                plan = reloader.plan
+            if watchdog is not None:
+                # 监控期间浏览器可能已重启，后续下单使用新的实例
+                driver = watchdog.driver
+            logger.info(result_msg)
+            recorder.mark('strategy')
+            recorder.page('after_book_click', driver, result=result_msg)
+            if '成功' not in result_msg:
+                _send_finished_notification(params, result_msg)
+                if checkpoint is not None:
+                    checkpoint.clear()
+                break
+            
+            if order is not None and order.result is not None:
+                # 已通过 HTTP 接口提交订单，不再操作订单页面
+                outcome, order.result = order.result, None
+                token = order.token
+                recorder.mark('http_order')
+            else:
+                outcome = _submit_order_in_browser(driver, params, plan, recorder, booked_at, tracker)
+                token = tracker.token
+            if outcome.status != 'failed':
+                # 确认下单结果后才发送成功通知
+                _send_booked_notification(params, result_msg, outcome)
+                logger.info('=' * 60)
+                if outcome.status == 'confirmed':
+                    logger.info(f'🎉 抢票成功，{describe_result(outcome)}！请在 12306 未完成订单中完成支付')
+                else:
+                    logger.info(f'订单{describe_result(outcome)}，请稍后在 12306 未完成订单中查看结果')
+                logger.info('=' * 60)
+                if coordination is not None:
+                    # 其他节点收到后停止监控
+                    coordination.publish('ordered', status=outcome.status)
+                if checkpoint is not None:
+                    if outcome.status == 'confirmed':
+                        checkpoint.clear()
+                    else:
+                        # 仍在排队：保留断点、订单信息和订单页令牌，重启后先查询结果，避免重复下单
+                        checkpoint.save(status='queued', order=dict(outcome._asdict(), message=describe_result(outcome),
+                                                                    token=token))
+                break
+            
+            order_failures += 1
+            logger.warning(f'❌ 下单失败（{outcome.message}），第 {order_failures} 次')
+            if coordination is not None:
+                # 其他节点收到后恢复监控
+                coordination.release('failed', message=outcome.message)
+            if order_failures >= params.get('order_max_failures', 3):
+                _send_finished_notification(params, f'下单连续失败 {order_failures} 次，停止抢票（{outcome.message}）')
+                break
+            # 立即回到查询页面继续监控，不需要人工重启
             try:
-                WebDriverWait(driver, 6).until(EC.element_to_be_clickable((By.ID, 'qd_closeDefaultWarningWindowDialog_id'))).click()
+                restored = _query_page_restorer(params, recorder)(driver)
             except Exception as e:
-                logger.error(f'点击确认按钮失败：{e}', exc_info=True)
+                logger.error(f'回到查询页面失败: {e}')
+                restored = False
+            if not restored:
+                _send_finished_notification(params, f'下单失败且无法回到查询页面（{outcome.message}）')
+                break
+            logger.info('↻ 已回到查询页面，继续监控')
         
-        # 选座
-        select_seat_fast(driver, preferred_type=params.get('seat_position_preference','first'))
-        time.sleep(0.8)
-        
-        # 最终确认
-        try:
-            WebDriverWait(driver, 8).until(EC.element_to_be_clickable((By.ID, 'qr_submit_id'))).click()
-            logger.info('✓ 已提交最终确认')
-            logger.info('=' * 60)
-            logger.info('🎉 抢票流程完成！请在浏览器中完成支付')
-            logger.info('=' * 60)
-        except Exception as e:
-            logger.error(f'点击确认按钮失败：{e}', exc_info=True)
+        if capture is not None:
+            logger.info(capture.report())
+        if blocker is not None:
+            logger.info(blocker.report())
+        logger.info(limiter.report())
+        errors.maybe_alert(ttn or '', force=True)
+        logger.info(errors.report())
+        if reloader is not None:
+            logger.info(reloader.report())
+        if checkpoint is not None:
+            logger.info(checkpoint.report())
     
     except Exception as e:
         logger.error(f'抢票过程出现异常: {e}', exc_info=True)
         raise
+    finally:
+        if profiler is not None:
+            profiler.finish()
+        if order is not None:
+            logger.info(order.report())
+            order.close()
+        if reloader is not None:
+            reloader.close()
+        if history is not None:
+            history.close()
+        if coordination is not None:
+            coordination.close()
+        recorder.close()
+        if session is not None:
+            session.close()
+        logger.info(monitor.report())
+        if watchdog is not None:
+            logger.info(watchdog.report())
+        logger.debug(SELECTORS.report())
+        if selector_stats:
+            try:
+                SELECTORS.save_stats(selector_stats)
+            except Exception as e:
+                logger.debug(f'保存选择器统计失败: {e}')
+
+
+if __name__ == '__main__':
+    # 命令行运行（如在 Linux 服务器上以无头模式监控）：python booking_core.py config.json
+    import sys
+    from task_plan import read_tasks
+    task = read_tasks(sys.argv[1] if len(sys.argv) > 1 else 'config.json')[0]
+    cli_driver = setup_browser_and_login(task)
+    if cli_driver is not None:
+        run_booking_with_driver(cli_driver, task)
@@ -0,0 +1,160 @@
+"""
+鲸介12306 抢票助手 - 浏览器后端对比测试
+对每种浏览器后端（Edge / Chrome / Chromium）多次启动浏览器，统计启动耗时、浏览器进程内存，
+以及对本地模拟 12306 服务（mock_12306.py）的整页刷新和页面内查询耗时，结果写入 JSON 和 CSV，
+便于选择服务器上使用的浏览器
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+
+示例：python browser_bench.py --backends edge,chrome,chromium --runs 3 --refreshes 20 --headless
+"""
+import os
+import csv
+import json
+import time
+import platform
+import argparse
+from datetime import datetime
+
+from driver_backends import BACKENDS
+from load_test import percentile, start_mock_process, _git_revision
+from resource_monitor import browser_pids, total_rss_mb
+
+QUERY_PATH = ('/otn/leftTicket/queryG?leftTicketDTO.train_date=2026-02-12&leftTicketDTO.from_station=HZH'
+              '&leftTicketDTO.to_station=ZZF&purpose_codes=ADULT')
+
+# 页面内发起一次查询请求（与 12306 页面点击查询时的 XHR 相同路径），结束后回调
+_FETCH_JS = """
+var done = arguments[arguments.length - 1];
+fetch(arguments[0], {cache: 'no-store'}).then(function (r) { return r.text(); })
+    .then(function () { done(true); }, function () { done(false); });
+"""
+
+
+def _summary(prefix, values):
+    return {
+        f'{prefix}_avg_ms': round(sum(values) / len(values), 1) if values else None,
+        f'{prefix}_p50_ms': round(percentile(values, 50), 1) if values else None,
+        f'{prefix}_p95_ms': round(percentile(values, 95), 1) if values else None,
+    }
+
+
+def bench_backend(name, base_url, runs=3, refreshes=20, headless=True):
+    """测试一种后端，返回统计结果；浏览器无法启动时 available 为 False"""
+    backend = BACKENDS[name]
+    url = base_url + QUERY_PATH
+    launch, first_load, rss, refresh, fetch = [], [], [], [], []
+    errors = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        try:
+            driver = backend.launch(headless=headless)
+        except Exception as e:
+            return {'backend': name, 'available': False, 'error': str(e).strip().splitlines()[0][:200]}
+        launch.append((time.perf_counter() - started) * 1000)
+        try:
+            started = time.perf_counter()
+            driver.get(url)
+            first_load.append((time.perf_counter() - started) * 1000)
+            for _ in range(refreshes):
+                started = time.perf_counter()
+                driver.refresh()
+                refresh.append((time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                if driver.execute_async_script(_FETCH_JS, url):
+                    fetch.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+            mb = total_rss_mb(browser_pids(driver))
+            if mb is not None:
+                rss.append(mb)
+        except Exception as e:
+            errors += 1
+            print(f'{backend.label} 测试出错: {e}')
+        finally:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+    result = {'backend': name, 'available': True, 'runs': runs, 'errors': errors}
+    result.update(_summary('launch', launch))
+    result.update(_summary('first_load', first_load))
+    result.update(_summary('refresh', refresh))
+    result.update(_summary('fetch', fetch))
+    result['rss_mb'] = round(sum(rss) / len(rss), 1) if rss else None
+    return result
+
+
+def write_results(report, out_dir):
+    """写入 JSON 和 CSV，返回两个文件路径"""
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    json_path = os.path.join(out_dir, f'browser_bench_{stamp}.json')
+    csv_path = os.path.join(out_dir, f'browser_bench_{stamp}.csv')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    fields = []
+    for result in report['backends']:
+        fields += [k for k in result if k not in fields]
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['revision'] + fields)
+        writer.writeheader()
+        for result in report['backends']:
+            writer.writerow(dict(result, revision=report['meta']['revision']))
+    return json_path, csv_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='浏览器后端对比测试')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='要测试的后端，逗号分隔')
+    parser.add_argument('--runs', type=int, default=3, help='每种后端启动浏览器的次数')
+    parser.add_argument('--refreshes', type=int, default=20, help='每次启动后刷新和查询的次数')
+    parser.add_argument('--headless', action='store_true', help='以无头模式启动（服务器上没有图形界面时使用）')
+    parser.add_argument('--url', default='', help='使用已启动的模拟服务地址；留空则自动启动')
+    parser.add_argument('--latency', type=float, default=50, help='模拟服务响应延迟（毫秒）')
+    parser.add_argument('--out', default='browser_bench_results', help='结果输出目录')
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.backends.split(',') if n.strip()]
+    unknown = [n for n in names if n not in BACKENDS]
+    if unknown:
+        parser.error(f'未知的后端: {", ".join(unknown)}（可选 {", ".join(BACKENDS)}）')
+    proc = None
+    base = args.url.rstrip('/')
+    if not base:
+        proc, base = start_mock_process(args.latency, 0, 0, 30)
+    results = []
+    try:
+        for name in names:
+            result = bench_backend(name, base, args.runs, args.refreshes, args.headless)
+            results.append(result)
+            label = BACKENDS[name].label
+            if not result['available']:
+                print(f'{label:>8}: 无法启动（{result["error"]}）')
+                continue
+            memory = f"{result['rss_mb']:>6.0f}MB" if result['rss_mb'] is not None else '  未知'
+            print(f"{label:>8}: 启动 {result['launch_avg_ms']:>7.0f}ms  内存 {memory}  "
+                  f"刷新 p50 {result['refresh_p50_ms'] or 0:>6.1f}ms  页面查询 p50 {result['fetch_p50_ms'] or 0:>6.1f}ms  "
+                  f"错误 {result['errors']}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+    report = {
+        'meta': {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+        },
+        'backends': results,
+    }
+    json_path, csv_path = write_results(report, args.out)
+    print(f'结果已写入 {json_path} 和 {csv_path}')
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+鲸介12306 抢票助手 - 监控断点模块
+把每个任务的监控状态（开始时间、监控次数、上次状态通知时间、上次看到的余票、排队中的订单）
+定期写入一个小的 JSON 文件（先写临时文件再替换，中途崩溃也不会留下半个文件）；
+程序崩溃或重启后按任务标识读取，从断点继续，30 分钟状态通知和监控次数不会从零开始
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import os
+import json
+import time
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+# 超过这个时间的断点视为过期（通常是很久以前的任务），重新开始
+MAX_AGE = timedelta(hours=24)
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 从断点恢复的状态；order 为上次排队中的订单（OrderResult 字段的字典）或 None
+ResumeState = namedtuple('ResumeState', ['started_at', 'monitor_count', 'last_notification_time',
+                                         'last_seen', 'order', 'saved_at'])
+
+
+def _fmt(value):
+    return value.strftime(_TIME_FORMAT) if isinstance(value, datetime) else value
+
+
+def _parse(value):
+    return datetime.strptime(value, _TIME_FORMAT) if value else None
+
+
+def write_json_atomic(path, data):
+    """先写入同目录的临时文件并落盘，再整体替换目标文件"""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class MonitorCheckpoint:
+    """单个任务的监控断点
+
+    save() 写入断点，due() 判断距上次写入是否已超过 interval 秒（监控循环据此控制写入频率）；
+    resume() 读取上次的断点，任务标识不一致、已过期或文件损坏时返回 None
+    """
+
+    def __init__(self, directory, task_id, interval=10):
+        self.directory = directory
+        self.task_id = task_id
+        self.interval = interval
+        self.saves = 0
+        self.resumed = None
+        self.data = {}
+        self._saved_at = 0.0
+        self._seen = None
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'{self.task_id}.json')
+
+    def resume(self):
+        """读取断点并返回 ResumeState，没有可用断点时返回 None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f'⚠ 读取监控断点失败（将重新开始）: {e}')
+            return None
+        try:
+            if data.get('version') != VERSION or data.get('task_id') != self.task_id:
+                return None
+            saved_at = _parse(data['saved_at'])
+            if datetime.now() - saved_at > MAX_AGE:
+                logger.info(f'监控断点已过期（保存于 {data["saved_at"]}），重新开始')
+                return None
+            state = ResumeState(started_at=_parse(data['started_at']),
+                                monitor_count=int(data.get('monitor_count', 0)),
+                                last_notification_time=_parse(data.get('last_notification_at')),
+                                last_seen=data.get('last_seen') or [],
+                                order=data.get('order'),
+                                saved_at=saved_at)
+        except Exception as e:
+            logger.warning(f'⚠ 监控断点内容无效（将重新开始）: {e}')
+            return None
+        self.data = data
+        self.resumed = state
+        self._seen = state.last_seen
+        logger.info(f'✓ 从监控断点恢复：开始于 {data["started_at"]}，已监控 {state.monitor_count} 次，'
+                    f'断点保存于 {data["saved_at"]}')
+        return state
+
+    def take_seen(self):
+        """上次看到的余票快照，只返回一次（供第一次监控建立比对基线）"""
+        seen, self._seen = self._seen, None
+        return seen
+
+    def due(self):
+        return time.monotonic() - self._saved_at >= self.interval
+
+    def save(self, **fields):
+        """合并字段并写入断点；写入失败只记录日志，不影响监控"""
+        for key, value in fields.items():
+            self.data[key] = _fmt(value)
+        self.data.update(version=VERSION, task_id=self.task_id, saved_at=_fmt(datetime.now()))
+        started = time.perf_counter()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_json_atomic(self.path, self.data)
+        except Exception as e:
+            logger.warning(f'⚠ 写入监控断点失败: {e}')
+            return False
+        finally:
+            self._saved_at = time.monotonic()
+        self.saves += 1
+        METRICS.observe('checkpoint_ms', (time.perf_counter() - started) * 1000)
+        return True
+
+    def retarget(self, task_id):
+        """任务标识变化（运行中切换了线路、车次等配置）：删除旧断点，之后写入新文件"""
+        if task_id == self.task_id:
+            return
+        self.clear()
+        self.task_id = task_id
+        self._saved_at = 0.0
+
+    def clear(self):
+        """任务结束（已生成订单或监控结束）时删除断点"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.debug(f'删除监控断点失败: {e}')
+
+    def report(self):
+        return f'监控断点：写入 {self.saves} 次（{self.path}）'
+
+
+def open_checkpoint(params, plan):
+    """checkpoint_dir 不为空时创建任务的监控断点（默认 checkpoints 目录），否则返回 None"""
+    directory = params.get('checkpoint_dir', 'checkpoints')
+    if not directory:
+        return None
+    return MonitorCheckpoint(directory, plan.task_id, interval=params.get('checkpoint_interval', 10))
@@ -0,0 +1,182 @@
+"""
+鲸介12306 抢票助手 - 配置热更新模块
+抢票进行中修改目标车次、时间范围、席别、乘车人、刷新间隔等配置时不需要停止重来：
+新配置（来自监视的配置文件或界面的"应用修改"）先按 task_plan 的规则完整校验，通过后在两轮监控之间
+一次性切换，浏览器、登录状态、监控计数和异常状态都保持不变；只有线路或日期变化时才重新填写查询条件
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import os
+import logging
+import threading
+from collections import namedtuple
+
+from metrics import METRICS
+from task_plan import SCHEMA, ConfigError, compile_task, read_tasks
+
+logger = logging.getLogger(__name__)
+
+# 可以在运行中切换的配置项；其余配置项（浏览器、网络截获、协同、限流等）在开始时生效，修改后需重新开始抢票
+HOT_KEYS = frozenset({
+    'from_station', 'to_station', 'travel_date', 'ticket_type', 'seat_category', 'seat_position_preference',
+    'passenger_name', 'dingtalk_token', 'dingtalk_secret', 'target_train_number', 'target_train_numbers',
+    'depart_time_range', 'strategy', 'strict_seat', 'refresh_interval', 'max_attempts', 'order_max_failures',
+})
+
+# 变化后需要重新填写查询条件的配置项
+ROUTE_KEYS = frozenset({'from_station', 'to_station', 'travel_date', 'ticket_type'})
+
+# 一次配置切换：新的 TaskPlan 和发生变化的配置项
+ConfigChange = namedtuple('ConfigChange', ['plan', 'keys'])
+
+
+class ConfigReloader:
+    """运行中的配置热更新
+
+    submit() 可在任意线程调用（界面、文件监视线程），校验通过的新配置暂存起来；
+    监控线程每轮开始前调用 take()，在这里原地更新各组件共用的 params 字典并通知监听者，
+    因此切换只发生在两轮之间，不会出现一轮监控用到一半新、一半旧的配置
+    """
+
+    def __init__(self, path=None, interval=2.0):
+        self.path = path
+        self.interval = interval
+        self.plan = None
+        self.params = None
+        self.version = 0
+        self.rejected = 0
+        self._pending = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def bind(self, plan, params):
+        """绑定正在运行的任务：plan 为当前配置，params 为各组件共用的参数字典"""
+        with self._lock:
+            self.plan = plan
+            self.params = params
+            self._pending = None
+        if self.path:
+            self._mtime = self._stat()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name='config-watch', daemon=True)
+                self._thread.start()
+            logger.info(f'✓ 配置热更新：监视 {self.path}，修改保存后在下一轮监控前生效')
+        return self
+
+    def add_listener(self, listener):
+        """切换配置后调用 listener(plan)"""
+        self._listeners.append(listener)
+
+    def submit(self, params, source='接口'):
+        """校验新配置并等待切换，返回错误列表（为空表示已接受或没有变化）"""
+        with self._lock:
+            current = self.plan
+        if current is None:
+            return ['抢票任务尚未开始']
+        if not isinstance(params, dict):
+            return ['任务配置应为 JSON 对象']
+        merged = {k: v for k, v in current.params.items() if k not in HOT_KEYS}
+        merged.update((k, v) for k, v in params.items() if k in HOT_KEYS)
+        ignored = sorted(k for k, (_, _, default, _) in SCHEMA.items()
+                         if k not in HOT_KEYS and k in params and params[k] != current.params.get(k, default))
+        if ignored:
+            logger.warning(f'⚠ 以下配置项需重新开始抢票才能生效，本次忽略: {", ".join(ignored)}')
+        try:
+            plan = compile_task(merged)
+        except ConfigError as e:
+            self.rejected += 1
+            METRICS.inc('config_rejected')
+            logger.error(f'❌ 新配置（{source}）校验失败，继续使用原配置: {"；".join(e.errors)}')
+            return e.errors
+        keys = sorted(k for k in HOT_KEYS if plan.params.get(k) != current.params.get(k))
+        with self._lock:
+            if self.plan is not current:
+                # 校验期间已切换过一次，以最新配置为基准重新比较
+                keys = sorted(k for k in HOT_KEYS if plan.params.get(k) != self.plan.params.get(k))
+            self._pending = ConfigChange(plan, frozenset(keys)) if keys else None
+        if keys:
+            logger.info(f'✓ 新配置（{source}）已通过校验，下一轮监控前生效: {", ".join(keys)}')
+        else:
+            logger.info(f'新配置（{source}）与当前配置相同，无需切换')
+        return []
+
+    def take(self):
+        """监控线程在两轮之间调用：有待切换的配置时完成切换并返回 ConfigChange，否则返回 None"""
+        if self._pending is None:
+            return None
+        with self._lock:
+            change, self._pending = self._pending, None
+            if change is None:
+                return None
+            new_params = change.plan.to_params()
+            # 先整体更新再删除多余的键，其他线程读取时不会看到空字典
+            self.params.update(new_params)
+            for key in [k for k in self.params if k not in new_params]:
+                del self.params[key]
+            self.plan = change.plan
+            self.version += 1
+        METRICS.inc('config_reloads')
+        logger.info(f'✓ 已切换到新配置（第 {self.version} 次）: {", ".join(sorted(change.keys))}')
+        for listener in self._listeners:
+            try:
+                listener(change.plan)
+            except Exception as e:
+                logger.error(f'应用新配置失败: {e}', exc_info=True)
+        return change
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def check_file(self):
+        """配置文件有修改时读取并提交（文件包含多个任务时使用第一个）"""
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            tasks = read_tasks(self.path)
+        except Exception as e:
+            # 编辑器可能还没写完，下次修改时间变化后再读
+            logger.warning(f'⚠ 读取配置文件失败: {e}')
+            return
+        if not tasks:
+            logger.warning('⚠ 配置文件中没有任务')
+            return
+        if len(tasks) > 1:
+            logger.warning(f'⚠ 配置文件包含 {len(tasks)} 个任务，热更新只使用第一个')
+        self.submit(tasks[0], source=os.path.basename(self.path))
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_file()
+            except Exception as e:
+                logger.debug(f'检查配置文件失败: {e}')
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def report(self):
+        return f'配置热更新：切换 {self.version} 次，校验失败 {self.rejected} 次'
+
+
+def open_config_reloader(params, plan, reloader=None):
+    """绑定配置热更新：reloader 为调用方（界面）创建的重载器；未传入时 config_watch 为配置文件路径则监视该文件，
+    否则返回 None"""
+    if reloader is None:
+        path = params.get('config_watch')
+        if not path:
+            return None
+        reloader = ConfigReloader(path, interval=params.get('config_watch_interval', 2))
+    return reloader.bind(plan, params)
@@ -0,0 +1,416 @@
+"""
+鲸介12306 抢票助手 - 多节点协同模块
+多台机器监控同一线路时，保证同一任务/乘车人同一时刻只有一个节点去预订
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+
+支持两种后端：
+  sqlite:///path/to/coord.db   共享 SQLite 文件（同机多进程或共享盘）
+  tcp://host:port              本模块自带的 TCP 协调服务，启动方式：
+                               python coordination.py serve --port 9306
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+import socketserver
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 其他节点正在预订时，本节点每隔多少秒检查一次对方的结果
+STAND_DOWN_POLL = 2
+
+
+def default_node_id():
+    """默认节点标识：主机名-进程号"""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def lease_key(params):
+    """按 线路+日期+乘车人 生成租约键，同一乘车人同一天同一线路只允许一个节点下单"""
+    return '|'.join([
+        params.get('from_station', ''), params.get('to_station', ''),
+        params.get('travel_date', ''), params.get('passenger_name', '') or '*',
+    ])
+
+
+class Coordinator:
+    """协调后端接口"""
+
+    def acquire(self, key, owner, ttl=300):
+        """尝试获取租约，已被其他节点持有且未过期时返回 False"""
+        raise NotImplementedError
+
+    def release(self, key, owner):
+        """释放自己持有的租约"""
+        raise NotImplementedError
+
+    def holder(self, key):
+        """返回当前持有租约的节点，没有则返回 None"""
+        raise NotImplementedError
+
+    def publish(self, topic, owner, kind, info=None):
+        """发布事件，kind 见 TaskCoordination"""
+        raise NotImplementedError
+
+    def events(self, topic, since=0):
+        """读取 since 之后的事件：[(ts, owner, kind, info), ...]，ts 为后端时钟"""
+        raise NotImplementedError
+
+    def now(self):
+        """后端的当前时间（与事件 ts 使用同一时钟）"""
+        return time.time()
+
+    def close(self):
+        pass
+
+
+class SQLiteCoordinator(Coordinator):
+    """基于共享 SQLite 文件的协调后端（各节点时钟需同步）"""
+
+    def __init__(self, path, event_retention=86400):
+        self.path = path
+        self.event_retention = event_retention
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS events (ts REAL NOT NULL, topic TEXT NOT NULL, owner TEXT NOT NULL, kind TEXT NOT NULL, info TEXT)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_events_topic ON events (topic, ts)')
+
+    def acquire(self, key, owner, ttl=300):
+        now = time.time()
+        with self._lock:
+            cur = self._conn.cursor()
+            # BEGIN IMMEDIATE 在多进程间串行化"检查-写入"
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                row = cur.execute('SELECT owner, expires FROM leases WHERE key = ?', (key,)).fetchone()
+                if row and row[0] != owner and row[1] > now:
+                    cur.execute('COMMIT')
+                    return False
+                cur.execute('INSERT OR REPLACE INTO leases VALUES (?, ?, ?)', (key, owner, now + ttl))
+                cur.execute('COMMIT')
+                return True
+            except Exception:
+                cur.execute('ROLLBACK')
+                raise
+
+    def release(self, key, owner):
+        with self._lock:
+            self._conn.execute('DELETE FROM leases WHERE key = ? AND owner = ?', (key, owner))
+
+    def holder(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT owner, expires FROM leases WHERE key = ?', (key,)).fetchone()
+        if row and row[1] > time.time():
+            return row[0]
+        return None
+
+    def publish(self, topic, owner, kind, info=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('INSERT INTO events VALUES (?, ?, ?, ?, ?)',
+                               (now, topic, owner, kind, json.dumps(info or {}, ensure_ascii=False)))
+            self._conn.execute('DELETE FROM events WHERE ts < ?', (now - self.event_retention,))
+
+    def events(self, topic, since=0):
+        with self._lock:
+            rows = self._conn.execute('SELECT ts, owner, kind, info FROM events WHERE topic = ? AND ts > ? ORDER BY ts',
+                                      (topic, since)).fetchall()
+        return [(ts, owner, kind, json.loads(info or '{}')) for ts, owner, kind, info in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _CoordinatorState:
+    """TCP 协调服务的内存状态，以服务端时钟判断租约过期"""
+
+    def __init__(self, max_events=1000):
+        self.lock = threading.Lock()
+        self.leases = {}
+        self.events = {}
+        self.max_events = max_events
+
+    def handle(self, req):
+        op = req.get('op')
+        now = time.time()
+        with self.lock:
+            if op == 'acquire':
+                cur = self.leases.get(req['key'])
+                if cur and cur[0] != req['owner'] and cur[1] > now:
+                    return {'ok': False, 'holder': cur[0]}
+                self.leases[req['key']] = (req['owner'], now + float(req.get('ttl', 300)))
+                return {'ok': True}
+            if op == 'release':
+                cur = self.leases.get(req['key'])
+                if cur and cur[0] == req['owner']:
+                    del self.leases[req['key']]
+                return {'ok': True}
+            if op == 'holder':
+                cur = self.leases.get(req['key'])
+                return {'ok': True, 'holder': cur[0] if cur and cur[1] > now else None}
+            if op == 'publish':
+                q = self.events.setdefault(req['topic'], deque(maxlen=self.max_events))
+                q.append((now, req['owner'], req['kind'], req.get('info') or {}))
+                return {'ok': True}
+            if op == 'time':
+                return {'ok': True, 'time': now}
+            if op == 'events':
+                since = float(req.get('since', 0))
+                q = self.events.get(req['topic'], ())
+                return {'ok': True, 'events': [list(e) for e in q if e[0] > since]}
+        return {'ok': False, 'error': f'unknown op: {op}'}
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                resp = self.server.state.handle(json.loads(line.decode('utf-8')))
+            except Exception as e:
+                resp = {'ok': False, 'error': str(e)}
+            self.wfile.write((json.dumps(resp, ensure_ascii=False) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    """TCP 协调服务：每行一个 JSON 请求，每行一个 JSON 响应"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=9306):
+        super().__init__((host, port), _CoordinatorHandler)
+        self.state = _CoordinatorState()
+
+    def serve_in_background(self):
+        """在后台线程中运行服务，返回线程对象"""
+        t = threading.Thread(target=self.serve_forever, name='coordinator-server', daemon=True)
+        t.start()
+        return t
+
+
+class TcpCoordinator(Coordinator):
+    """TCP 协调服务的客户端，连接断开后自动重连"""
+
+    def __init__(self, host='127.0.0.1', port=9306, timeout=3):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._reader = None
+
+    def _call(self, **req):
+        data = (json.dumps(req, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            for retry in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = socket.create_connection(self.address, timeout=self.timeout)
+                        self._reader = self._sock.makefile('rb')
+                    self._sock.sendall(data)
+                    line = self._reader.readline()
+                    if not line:
+                        raise ConnectionError('协调服务关闭了连接')
+                    return json.loads(line.decode('utf-8'))
+                except (OSError, ValueError):
+                    self._disconnect()
+                    if retry:
+                        raise
+
+    def _disconnect(self):
+        try:
+            if self._sock is not None:
+                self._sock.close()
+        except OSError:
+            pass
+        self._sock = None
+        self._reader = None
+
+    def acquire(self, key, owner, ttl=300):
+        return bool(self._call(op='acquire', key=key, owner=owner, ttl=ttl).get('ok'))
+
+    def release(self, key, owner):
+        self._call(op='release', key=key, owner=owner)
+
+    def holder(self, key):
+        return self._call(op='holder', key=key).get('holder')
+
+    def publish(self, topic, owner, kind, info=None):
+        self._call(op='publish', topic=topic, owner=owner, kind=kind, info=info or {})
+
+    def events(self, topic, since=0):
+        return [tuple(e) for e in self._call(op='events', topic=topic, since=since).get('events', [])]
+
+    def now(self):
+        return float(self._call(op='time')['time'])
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+def create_coordinator(url):
+    """根据地址创建协调后端：sqlite:///path 或 tcp://host:port"""
+    url = (url or '').strip()
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        return SQLiteCoordinator(url[len('sqlite:///'):])
+    if url.startswith('tcp://'):
+        host, _, port = url[len('tcp://'):].rpartition(':')
+        return TcpCoordinator(host or '127.0.0.1', int(port))
+    raise ValueError(f'不支持的协调后端地址: {url}')
+
+
+class TaskCoordination:
+    """单个抢票任务与协调后端的交互封装，供 book_by_* 使用
+
+    事件：seen（发现有票，准备预订）、booked（已点击预订/已提交订单）、released（预订未成功，已释放租约）、
+    failed（下单失败，已释放租约）、ordered（订单已确认或排队中，任务完成）。
+    其他节点 seen / booked 时本节点暂缓刷新（standing_down），released / failed 后恢复，ordered 后停止；
+    事件按后端时钟读取，不受各节点本地时钟差异影响
+    """
+
+    def __init__(self, coordinator, params, node_id=None, lease_ttl=300, seen_window=30):
+        self.coordinator = coordinator
+        self.node_id = node_id or params.get('node_id') or default_node_id()
+        self.key = lease_key(params)
+        self.lease_ttl = lease_ttl
+        # 发现有票的节点通常几秒内就会点击预订或放弃，超过这个时间没有后续事件视为已放弃
+        self.seen_window = seen_window
+        self.started = self._backend_time()
+        self.ordered_by = None
+        self._cursor = self.started
+        self._busy = {}  # 节点 → (事件, 本机收到事件的时间)
+
+    def _backend_time(self):
+        try:
+            return self.coordinator.now()
+        except Exception as e:
+            logger.debug(f'读取协调后端时间失败: {e}')
+            return time.time()
+
+    def claim(self, train):
+        """预订前调用：拿到租约才允许点击预订"""
+        try:
+            if self.coordinator.acquire(self.key, self.node_id, self.lease_ttl):
+                return True
+            logger.info(f'车次 {train} 已由其他节点 {self.coordinator.holder(self.key)} 预订中，本节点让行')
+            return False
+        except Exception as e:
+            # 协调服务不可用时不阻塞抢票
+            logger.warning(f'协调服务不可用，直接预订: {e}')
+            return True
+
+    def release(self, kind='released', **info):
+        """预订未成功：通知其他节点恢复监控并释放租约；kind 为 released 或 failed"""
+        self.publish(kind, **info)
+        try:
+            self.coordinator.release(self.key, self.node_id)
+        except Exception as e:
+            logger.debug(f'释放租约失败: {e}')
+
+    def publish(self, kind, **info):
+        try:
+            self.coordinator.publish(self.key, self.node_id, kind, info)
+        except Exception as e:
+            logger.debug(f'发布协同事件失败: {e}')
+
+    def poll(self):
+        """读取其他节点的新事件，更新正在预订的节点和已完成订单的节点"""
+        try:
+            events = self.coordinator.events(self.key, self._cursor)
+        except Exception as e:
+            logger.debug(f'读取协同事件失败: {e}')
+            return
+        for ts, owner, kind, _ in events:
+            self._cursor = max(self._cursor, ts)
+            if owner == self.node_id:
+                continue
+            if kind in ('seen', 'booked'):
+                self._busy[owner] = (kind, time.monotonic())
+            elif kind in ('released', 'failed'):
+                self._busy.pop(owner, None)
+            elif kind == 'ordered':
+                self.ordered_by = owner
+
+    def busy_elsewhere(self):
+        """其他节点正持有租约时返回其节点标识"""
+        try:
+            holder = self.coordinator.holder(self.key)
+        except Exception:
+            return None
+        return holder if holder and holder != self.node_id else None
+
+    def standing_down(self):
+        """其他节点发现有票或正在预订时返回其节点标识（本节点暂缓刷新），否则返回 None
+
+        seen 超过 seen_window、booked 超过租约有效期仍没有后续事件时不再让行（对方可能已退出）
+        """
+        self.poll()
+        now = time.monotonic()
+        for owner, (kind, at) in list(self._busy.items()):
+            if now - at > (self.lease_ttl if kind == 'booked' else self.seen_window):
+                del self._busy[owner]
+        if self._busy:
+            return next(iter(self._busy))
+        return self.busy_elsewhere()
+
+    def booked_elsewhere(self):
+        """其他节点在本任务启动后已完成订单（ordered）时返回其节点标识"""
+        self.poll()
+        return self.ordered_by
+
+    def retarget(self, params):
+        """配置切换后按新的线路、日期、乘车人更新租约键；键变化时释放旧租约并从后端当前时间开始读取事件"""
+        key = lease_key(params)
+        if key == self.key:
+            return
+        self.release()
+        self.key = key
+        self.ordered_by = None
+        self._busy.clear()
+        self._cursor = self._backend_time()
+        logger.info(f'协同租约已切换为 {key}')
+
+    def close(self):
+        self.coordinator.close()
+
+
+def open_coordination(params):
+    """根据参数 coordinator 创建任务协同对象，未配置时返回 None"""
+    url = (params.get('coordinator') or '').strip()
+    if not url:
+        return None
+    try:
+        coord = TaskCoordination(create_coordinator(url), params,
+                                 lease_ttl=float(params.get('coordinator_lease_ttl', 300)))
+        logger.info(f'✓ 已启用多节点协同: {url}（节点 {coord.node_id}）')
+        return coord
+    except Exception as e:
+        logger.error(f'连接协调后端失败: {e}', exc_info=True)
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='12306 抢票助手多节点协调服务')
+    parser.add_argument('command', choices=['serve'])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9306)
+    args = parser.parse_args()
+    server = CoordinatorServer(args.host, args.port)
+    print(f'协调服务已启动: tcp://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
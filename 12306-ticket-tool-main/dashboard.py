@@ -0,0 +1,135 @@
+"""
+鲸介12306 抢票助手 - 运行看板模块
+GUI 中的实时看板：每分钟刷新次数、查询→解析和点击→提交耗时分位数、错误率、距上次成功刷新的时间，
+以及刷新速率和查询耗时的小图；数据来自进程内运行指标（metrics），按固定的低频率读取，不影响抢票线程
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import time
+import tkinter as tk
+from tkinter import ttk
+from collections import deque
+
+from metrics import METRICS
+
+
+class DashboardModel:
+    """从运行指标计算看板数据（与界面无关）"""
+
+    def __init__(self, metrics=METRICS, window=60, history=60, stall_after=30):
+        self.metrics = metrics
+        self.window = window  # 计算速率和错误率的时间窗口（秒）
+        self.stall_after = stall_after  # 超过该秒数没有成功刷新视为卡住
+        self._samples = deque()  # (时间, 刷新次数, 循环次数, 错误次数)
+        self.rate_history = deque(maxlen=history)
+        self.latency_history = deque(maxlen=history)
+
+    def sample(self, now=None, active=True):
+        """读取一次指标，返回看板数据；active 为假（未在抢票）时不判断卡住"""
+        now = time.time() if now is None else now
+        m = self.metrics
+        counts = (m.counter('refreshes'), m.counter('cycles'), m.counter('cycle_errors'))
+        self._samples.append((now,) + counts)
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+        first = self._samples[0]
+        span = now - first[0]
+        refreshes = counts[0] - first[1]
+        cycles = counts[1] - first[2]
+        errors = counts[2] - first[3]
+        per_min = refreshes / span * 60 if span > 0 else 0.0
+        query = m.summary('query_parse_ms')
+        last_ok = m.gauge('last_success_at')
+        since_ok = now - last_ok if last_ok else None
+        self.rate_history.append(per_min)
+        self.latency_history.append(query['p50'] or 0.0)
+        return {
+            'refreshes_per_min': per_min,
+            'query': query,
+            'submit': m.summary('click_submit_ms'),
+            'error_rate': errors / cycles if cycles else 0.0,
+            'errors': counts[2],
+            'cycles': counts[1],
+            'since_ok': since_ok,
+            'stalled': active and since_ok is not None and since_ok > self.stall_after,
+        }
+
+
+def _fmt_ms(summary, *keys):
+    if not summary['count']:
+        return '--'
+    return ' / '.join(f'{summary[k]:.0f}' for k in keys) + ' ms'
+
+
+class Sparkline(tk.Canvas):
+    """简单折线图"""
+
+    def __init__(self, parent, width=200, height=40, color='#1f77b4'):
+        super().__init__(parent, width=width, height=height, background='white',
+                         highlightthickness=1, highlightbackground='#cccccc')
+        self.w = width
+        self.h = height
+        self.color = color
+
+    def draw(self, values):
+        self.delete('all')
+        values = list(values)
+        if len(values) < 2:
+            return
+        top = max(values) or 1.0
+        step = (self.w - 4) / (len(values) - 1)
+        points = []
+        for i, v in enumerate(values):
+            points += [2 + i * step, self.h - 3 - (self.h - 6) * v / top]
+        self.create_line(*points, fill=self.color, width=1.5)
+        self.create_text(self.w - 3, 3, text=f'{top:.0f}', anchor=tk.NE, fill='gray', font=('Consolas', 7))
+
+
+class DashboardPanel(ttk.Frame):
+    """运行看板面板，start() 后每 interval_ms 毫秒在界面线程中更新一次
+
+    active 为返回是否正在抢票的函数，只在抢票时提示刷新卡住
+    """
+
+    def __init__(self, parent, model=None, interval_ms=1000, active=None):
+        super().__init__(parent, padding=8)
+        self.model = model or DashboardModel()
+        self.interval_ms = interval_ms
+        self.active = active or (lambda: True)
+        self.values = {}
+        rows = [
+            ('refreshes', '刷新次数/分钟:'),
+            ('query', '查询→解析 p50/p90/p99:'),
+            ('submit', '点击→提交 p50/p99:'),
+            ('errors', '错误率（近1分钟）:'),
+            ('since_ok', '距上次成功刷新:'),
+        ]
+        for i, (key, text) in enumerate(rows):
+            ttk.Label(self, text=text).grid(row=i, column=0, sticky=tk.W, pady=2)
+            self.values[key] = ttk.Label(self, text='--', font=('Consolas', 10))
+            self.values[key].grid(row=i, column=1, sticky=tk.W, padx=8)
+        ttk.Label(self, text='刷新次数/分钟', foreground='gray').grid(row=0, column=2, sticky=tk.W, padx=(20, 0))
+        self.rate_chart = Sparkline(self, color='#2ca02c')
+        self.rate_chart.grid(row=1, column=2, rowspan=2, sticky=tk.W, padx=(20, 0))
+        ttk.Label(self, text='查询→解析 p50（ms）', foreground='gray').grid(row=3, column=2, sticky=tk.W, padx=(20, 0))
+        self.latency_chart = Sparkline(self, color='#1f77b4')
+        self.latency_chart.grid(row=4, column=2, rowspan=2, sticky=tk.W, padx=(20, 0))
+
+    def start(self):
+        self.update_view()
+
+    def update_view(self):
+        data = self.model.sample(active=self.active())
+        self.values['refreshes'].config(text=f"{data['refreshes_per_min']:.1f}")
+        self.values['query'].config(text=_fmt_ms(data['query'], 'p50', 'p90', 'p99'))
+        self.values['submit'].config(text=_fmt_ms(data['submit'], 'p50', 'p99'))
+        self.values['errors'].config(text=f"{data['error_rate'] * 100:.1f}%（累计 {data['errors']} 次）",
+                                     foreground='red' if data['error_rate'] > 0.2 else '')
+        since = data['since_ok']
+        self.values['since_ok'].config(text='--' if since is None else f'{since:.0f} 秒',
+                                       foreground='red' if data['stalled'] else '')
+        self.rate_chart.draw(self.model.rate_history)
+        self.latency_chart.draw(self.model.latency_history)
+        self.after(self.interval_ms, self.update_view)
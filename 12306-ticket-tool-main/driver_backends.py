@@ -0,0 +1,211 @@
+"""
+鲸介12306 抢票助手 - 浏览器后端模块
+统一创建 Edge / Chrome / Chromium 浏览器：同一套启动参数、按系统选择的 User-Agent、可选无头模式、
+网络截获所需的性能日志，以及启动后的钩子（如注入已保存的登录 Cookie）。
+booking_core 只调用 launch_browser()，不关心具体使用哪种浏览器，因此可以在 Linux 服务器上以无头模式监控
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import os
+import json
+import shutil
+import logging
+import platform
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.edge.options import Options as EdgeOptions
+from selenium.webdriver.edge.service import Service as EdgeService
+
+from driver_watchdog import restore_cookies, save_cookies
+
+logger = logging.getLogger(__name__)
+
+CHROME_VERSION = '140.0.0.0'
+EDGE_VERSION = '140.0.3485.54'
+
+# 各后端共用的启动参数
+COMMON_ARGUMENTS = (
+    '--disable-blink-features=AutomationControlled',
+    '--no-proxy-server',
+    '--disable-extensions',
+    '--disable-gpu',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--ignore-certificate-errors',
+    '--ignore-ssl-errors',
+)
+
+# 无头模式没有真实窗口，固定窗口大小，页面布局与桌面一致
+HEADLESS_ARGUMENTS = ('--headless=new', '--window-size=1920,1080')
+
+
+def _platform_token():
+    system = platform.system()
+    if system == 'Windows':
+        return 'Windows NT 10.0; Win64; x64'
+    if system == 'Darwin':
+        return 'Macintosh; Intel Mac OS X 10_15_7'
+    return 'X11; Linux x86_64'
+
+
+class DriverBackend:
+    """一种浏览器后端：WebDriver 类、选项类、驱动服务类，以及浏览器和驱动程序的默认名称"""
+
+    def __init__(self, name, label, driver_cls, options_cls, service_cls, log_capability,
+                 ua_suffix='', binaries=(), driver_names=(), download_hint='', requires_binary=False):
+        self.name = name
+        self.label = label
+        self.driver_cls = driver_cls
+        self.options_cls = options_cls
+        self.service_cls = service_cls
+        self.log_capability = log_capability
+        self.ua_suffix = ua_suffix
+        self.binaries = binaries
+        self.driver_names = driver_names
+        self.download_hint = download_hint
+        # Chromium 与 Chrome 共用驱动，找不到程序时驱动会改为启动 Chrome，因此必须找到程序
+        self.requires_binary = requires_binary
+
+    def user_agent(self):
+        """与当前系统一致的 User-Agent（无头模式默认的 UA 带有 HeadlessChrome 标记）"""
+        return (f'Mozilla/5.0 ({_platform_token()}) AppleWebKit/537.36 (KHTML, like Gecko) '
+                f'Chrome/{CHROME_VERSION} Safari/537.36{self.ua_suffix}')
+
+    def find_binary(self):
+        """在 PATH 中查找浏览器程序（Chromium 的程序名因发行版而异），找不到返回空字符串"""
+        for name in self.binaries:
+            path = shutil.which(name)
+            if path:
+                return path
+        return ''
+
+    def find_driver(self):
+        """在 PATH 中查找驱动程序，找不到时返回空字符串（由 Selenium 自动下载匹配版本）"""
+        for name in self.driver_names:
+            path = shutil.which(name)
+            if path:
+                return path
+        return ''
+
+    def options(self, headless=False, capture_network=False, binary=''):
+        opts = self.options_cls()
+        if not headless:
+            # 脚本结束后保留浏览器窗口，便于手动完成支付
+            opts.add_experimental_option('detach', True)
+        for arg in COMMON_ARGUMENTS:
+            opts.add_argument(arg)
+        if headless:
+            for arg in HEADLESS_ARGUMENTS:
+                opts.add_argument(arg)
+        opts.add_argument(f'user-agent={self.user_agent()}')
+        opts.add_experimental_option('excludeSwitches', ['enable-logging'])
+        if capture_network:
+            opts.set_capability(self.log_capability, {'performance': 'ALL'})
+        binary = binary or self.find_binary()
+        if binary:
+            opts.binary_location = binary
+        elif self.requires_binary:
+            raise RuntimeError(f'未找到{self.label}程序，请用 browser_binary 指定路径')
+        return opts
+
+    def launch(self, headless=False, capture_network=False, binary='', driver_path=''):
+        """启动浏览器，失败抛出异常"""
+        opts = self.options(headless=headless, capture_network=capture_network, binary=binary)
+        driver_path = driver_path or self.find_driver()
+        service = self.service_cls(executable_path=driver_path) if driver_path else self.service_cls()
+        return self.driver_cls(options=opts, service=service)
+
+
+BACKENDS = {
+    'edge': DriverBackend(
+        'edge', 'Edge', webdriver.Edge, EdgeOptions, EdgeService, 'ms:loggingPrefs',
+        ua_suffix=f' Edg/{EDGE_VERSION}', binaries=('microsoft-edge', 'microsoft-edge-stable'),
+        driver_names=('msedgedriver',),
+        download_hint='https://developer.microsoft.com/en-us/microsoft-edge/tools/webdriver/'),
+    'chrome': DriverBackend(
+        'chrome', 'Chrome', webdriver.Chrome, ChromeOptions, ChromeService, 'goog:loggingPrefs',
+        binaries=('google-chrome', 'google-chrome-stable'), driver_names=('chromedriver',),
+        download_hint='https://googlechromelabs.github.io/chrome-for-testing/'),
+    'chromium': DriverBackend(
+        'chromium', 'Chromium', webdriver.Chrome, ChromeOptions, ChromeService, 'goog:loggingPrefs',
+        binaries=('chromium', 'chromium-browser'), driver_names=('chromedriver',),
+        download_hint='Debian/Ubuntu: apt install chromium chromium-driver', requires_binary=True),
+}
+
+
+def default_backend():
+    """未指定 browser 时：Windows 沿用 Edge，其他系统使用第一个已安装的浏览器"""
+    if platform.system() == 'Windows':
+        return 'edge'
+    for name in ('chromium', 'chrome', 'edge'):
+        if BACKENDS[name].find_binary():
+            return name
+    return 'edge'
+
+
+def load_session(path):
+    """读取保存的登录 Cookie，文件不存在或损坏时返回空列表"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cookies = json.load(f)
+        return cookies if isinstance(cookies, list) else []
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        logger.warning(f'⚠ 读取登录 Cookie 文件失败: {e}')
+        return []
+
+
+def export_session(driver, path):
+    """保存浏览器的登录 Cookie（扫码登录后调用），复制到服务器后无头模式可直接使用"""
+    cookies = save_cookies(driver)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cookies, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    logger.info(f'✓ 已保存 {len(cookies)} 个登录 Cookie 到 {path}')
+    return len(cookies)
+
+
+def session_injector(path):
+    """启动钩子：把保存的登录 Cookie 注入新浏览器"""
+    def inject(driver, backend):
+        cookies = load_session(path)
+        if cookies:
+            count = restore_cookies(driver, cookies)
+            logger.info(f'✓ 已向 {backend.label} 注入 {count} 个登录 Cookie')
+    return inject
+
+
+def launch_browser(params=None, capture_network=False, hooks=()):
+    """按 browser / headless / browser_binary / driver_path 参数启动浏览器并执行启动钩子，失败返回 None
+
+    session_cookies 为登录 Cookie 文件路径时自动注入（看门狗重启浏览器时同样生效）
+    """
+    params = params or {}
+    name = params.get('browser') or default_backend()
+    backend = BACKENDS[name]
+    headless = bool(params.get('headless'))
+    try:
+        logger.info(f'正在初始化{backend.label}浏览器{"（无头模式）" if headless else ""}...')
+        driver = backend.launch(headless=headless, capture_network=capture_network,
+                                binary=params.get('browser_binary', ''), driver_path=params.get('driver_path', ''))
+    except Exception as e:
+        logger.error(f'初始化浏览器时出错: {e}')
+        logger.error(f'❌ 无法初始化{backend.label}浏览器')
+        logger.error(f'提示：请确认已安装{backend.label}浏览器及匹配版本的 WebDriver（{backend.download_hint}）')
+        return None
+    logger.info(f'成功初始化{backend.label}浏览器')
+    hooks = list(hooks)
+    if params.get('session_cookies'):
+        hooks.insert(0, session_injector(params['session_cookies']))
+    for hook in hooks:
+        try:
+            hook(driver, backend)
+        except Exception as e:
+            logger.warning(f'⚠ 浏览器启动钩子执行失败: {e}')
+    return driver
@@ -0,0 +1,255 @@
+"""
+鲸介12306 抢票助手 - 浏览器看门狗模块
+给每次 WebDriver 调用加上超时，识别浏览器卡死/崩溃（会话失效、连续失败），
+自动关闭并重启浏览器、恢复登录 Cookie、回到查询页面，并报告每次恢复耗时
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 出现这些错误信息说明浏览器会话已经失效，重试没有意义
+DEAD_SESSION_MARKERS = (
+    'invalid session id',
+    'no such session',
+    'session deleted',
+    'chrome not reachable',
+    'disconnected',
+    'target window already closed',
+    'no such window',
+    'tab crashed',
+    'session not created',
+    'max retries exceeded',
+    'connection refused',
+    'connection aborted',
+    'read timed out',
+)
+
+
+class DriverStallError(Exception):
+    """WebDriver 调用超过时限未返回"""
+
+
+def is_dead_session(exc):
+    """根据异常判断浏览器会话是否已失效（崩溃、卡死或连接断开）"""
+    if isinstance(exc, DriverStallError):
+        return True
+    if type(exc).__name__ in ('InvalidSessionIdException', 'NoSuchWindowException',
+                              'MaxRetryError', 'ReadTimeoutError', 'ProtocolError'):
+        return True
+    text = str(exc).lower()
+    return any(marker in text for marker in DEAD_SESSION_MARKERS)
+
+
+def call_with_deadline(fn, timeout, *args, **kwargs):
+    """在后台线程中执行调用，超过 timeout 秒抛出 DriverStallError（卡住的线程会随浏览器关闭退出）"""
+    result = {}
+
+    def run():
+        try:
+            result['value'] = fn(*args, **kwargs)
+        except BaseException as e:
+            result['error'] = e
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise DriverStallError(f'{getattr(fn, "__name__", "调用")} 超过 {timeout}s 未返回')
+    if 'error' in result:
+        raise result['error']
+    return result.get('value')
+
+
+def apply_deadlines(driver, command_timeout=30, page_load_timeout=20, script_timeout=10):
+    """给浏览器设置超时：页面加载/脚本执行超时，以及每条 WebDriver 命令的 HTTP 超时"""
+    try:
+        driver.set_page_load_timeout(page_load_timeout)
+        driver.set_script_timeout(script_timeout)
+    except Exception as e:
+        logger.debug(f'设置页面超时失败: {e}')
+    executor = getattr(driver, 'command_executor', None)
+    config = getattr(executor, 'client_config', None) or getattr(executor, '_client_config', None)
+    if config is not None:
+        # 命令超时要大于页面加载超时，否则正常的慢页面也会被判为卡死
+        config.timeout = max(command_timeout, page_load_timeout + 5)
+
+
+def save_cookies(driver):
+    """读取浏览器中的全部 Cookie（优先使用 CDP，可拿到所有域名）"""
+    try:
+        return driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', [])
+    except Exception:
+        return driver.get_cookies()
+
+
+def restore_cookies(driver, cookies, home_url='https://kyfw.12306.cn/otn/'):
+    """把 Cookie 写回新浏览器，返回成功写入的数量"""
+    if not cookies:
+        return 0
+    try:
+        params = []
+        for c in cookies:
+            item = {k: c[k] for k in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite', 'expires')
+                    if k in c}
+            if 'expiry' in c and 'expires' not in item:
+                item['expires'] = c['expiry']
+            params.append(item)
+        driver.execute_cdp_cmd('Network.setCookies', {'cookies': params})
+        return len(params)
+    except Exception as e:
+        logger.debug(f'通过 CDP 恢复 Cookie 失败，改用 add_cookie: {e}')
+    # add_cookie 只能写入当前域名的 Cookie，需要先打开 12306 页面
+    driver.get(home_url)
+    restored = 0
+    for c in cookies:
+        cookie = {k: c[k] for k in ('name', 'value', 'path', 'secure', 'httpOnly') if k in c}
+        expiry = c.get('expiry', c.get('expires'))
+        if expiry and expiry > 0:
+            cookie['expiry'] = int(expiry)
+        try:
+            driver.add_cookie(cookie)
+            restored += 1
+        except Exception as e:
+            logger.debug(f'恢复 Cookie {c.get("name")} 失败: {e}')
+    return restored
+
+
+class BrowserWatchdog:
+    """监控浏览器健康状况，必要时重启浏览器并恢复到查询页面
+
+    factory() 创建新的浏览器实例（失败返回 None）；restore(driver) 在新浏览器中回到查询页面，
+    成功返回 True；notify(title, content) 用于发送恢复通知
+    """
+
+    def __init__(self, driver, factory, restore=None, notify=None, max_failures=3,
+                 command_timeout=30, page_load_timeout=20, cookie_interval=60, relaunch_attempts=3):
+        self.driver = driver
+        self.factory = factory
+        self.restore = restore
+        self.notify = notify
+        self.max_failures = max_failures
+        self.command_timeout = command_timeout
+        self.page_load_timeout = page_load_timeout
+        self.cookie_interval = cookie_interval
+        self.relaunch_attempts = relaunch_attempts
+        self.failures = 0
+        self.cookies = []
+        self.recoveries = []  # (时间, 耗时秒数, 原因, 是否成功)
+        self._last_cookie_save = 0.0
+        apply_deadlines(driver, command_timeout, page_load_timeout)
+        self.checkpoint(force=True)
+
+    def checkpoint(self, force=False):
+        """浏览器正常时定期保存 Cookie，供重启后恢复登录状态"""
+        now = time.monotonic()
+        if not force and now - self._last_cookie_save < self.cookie_interval:
+            return
+        try:
+            cookies = save_cookies(self.driver)
+            if cookies:
+                self.cookies = cookies
+            self._last_cookie_save = now
+        except Exception as e:
+            logger.debug(f'保存 Cookie 失败: {e}')
+
+    def on_success(self):
+        """一次监控循环成功完成"""
+        self.failures = 0
+        self.checkpoint()
+
+    def on_error(self, exc):
+        """一次监控循环失败，需要时重启浏览器。返回 True 表示已更换为新的浏览器实例"""
+        self.failures += 1
+        dead = is_dead_session(exc)
+        if not dead and self.failures < self.max_failures:
+            return False
+        message = (getattr(exc, 'msg', None) or str(exc)).strip()
+        reason = f'浏览器会话失效: {message[:80]}' if dead else f'连续 {self.failures} 次操作失败'
+        return self.recover(reason)
+
+    def _teardown(self):
+        try:
+            call_with_deadline(self.driver.quit, 5)
+        except Exception as e:
+            logger.debug(f'关闭旧浏览器失败: {e}，直接结束驱动进程')
+            try:
+                self.driver.service.process.kill()
+            except Exception:
+                pass
+
+    def recover(self, reason):
+        """关闭旧浏览器，启动新浏览器，恢复 Cookie 并回到查询页面"""
+        logger.warning(f'⚠ 检测到浏览器异常（{reason}），正在重启浏览器...')
+        started = time.monotonic()
+        self._teardown()
+        ok = False
+        for attempt in range(1, self.relaunch_attempts + 1):
+            try:
+                driver = self.factory()
+            except Exception as e:
+                logger.error(f'第{attempt}次重启浏览器失败: {e}')
+                driver = None
+            if driver is None:
+                time.sleep(min(2 * attempt, 10))
+                continue
+            try:
+                apply_deadlines(driver, self.command_timeout, self.page_load_timeout)
+                restored = restore_cookies(driver, self.cookies)
+                logger.info(f'✓ 已恢复 {restored} 个 Cookie')
+                if self.restore is None or self.restore(driver):
+                    self.driver = driver
+                    ok = True
+                    break
+                logger.error(f'第{attempt}次恢复查询页面失败')
+            except Exception as e:
+                logger.error(f'第{attempt}次恢复浏览器状态失败: {e}')
+            try:
+                call_with_deadline(driver.quit, 5)
+            except Exception:
+                pass
+        elapsed = time.monotonic() - started
+        self.recoveries.append((datetime.now(), elapsed, reason, ok))
+        self.failures = 0
+        if ok:
+            logger.info(f'✓ 浏览器已恢复，耗时 {elapsed:.1f} 秒')
+            self._last_cookie_save = 0.0
+        else:
+            logger.error(f'❌ 浏览器恢复失败（耗时 {elapsed:.1f} 秒），将在下次失败时重试')
+        if self.notify is not None:
+            content = f"## 浏览器{'已自动恢复' if ok else '恢复失败'}\n" \
+                     f"> 原因: {reason}\n" \
+                     f"> 恢复耗时: {elapsed:.1f}秒\n" \
+                     f"> 累计恢复次数: {len(self.recoveries)}\n" \
+                     f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            try:
+                self.notify('浏览器恢复', content)
+            except Exception as e:
+                logger.debug(f'发送恢复通知失败: {e}')
+        return ok
+
+    def report(self):
+        """恢复记录摘要"""
+        if not self.recoveries:
+            return '浏览器运行期间未发生重启'
+        lines = [f'浏览器共重启 {len(self.recoveries)} 次：']
+        for ts, elapsed, reason, ok in self.recoveries:
+            lines.append(f"  {ts.strftime('%H:%M:%S')} {'成功' if ok else '失败'} 耗时{elapsed:.1f}s {reason}")
+        return '\n'.join(lines)
+
+
+def open_watchdog(params, driver, factory, restore=None, notify=None):
+    """按参数创建看门狗；watchdog 为 false 时只设置调用超时，不自动重启"""
+    command_timeout = params.get('driver_command_timeout', 30)
+    if params.get('watchdog') is False:
+        apply_deadlines(driver, command_timeout)
+        return None
+    return BrowserWatchdog(driver, factory, restore=restore, notify=notify,
+                           max_failures=params.get('driver_max_failures', 3),
+                           command_timeout=command_timeout)
@@ -0,0 +1,225 @@
+"""
+鲸介12306 抢票助手 - 监控异常处理模块
+把监控循环中的异常分为元素过期、超时、会话失效、接口限流、网络异常和未知错误六类，
+每类有各自的重试等待（指数退避）和是否刷新页面的策略；同类错误只在第一次记录完整堆栈，
+连续失败过多时熔断（暂停监控一段时间后再试），钉钉通知按时间段汇总各类错误次数
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import time
+import random
+import logging
+from collections import namedtuple, Counter
+from datetime import datetime
+
+from driver_watchdog import DriverStallError, is_dead_session
+from metrics import METRICS
+from rate_limiter import RateLimited
+
+logger = logging.getLogger(__name__)
+
+# label: 中文名称；base/cap: 第一次重试前的等待秒数和退避上限；refresh: 失败后是否刷新查询；
+# trips: 是否计入熔断的连续失败次数
+ErrorPolicy = namedtuple('ErrorPolicy', ['label', 'base', 'cap', 'refresh', 'trips'])
+
+ERROR_POLICIES = {
+    # 表格刚好重新渲染，重新读取即可，不刷新也不等待
+    'stale': ErrorPolicy('元素过期', 0, 0, False, False),
+    'timeout': ErrorPolicy('超时', 2, 30, True, True),
+    # 登录失效由会话保活处理，浏览器失效由看门狗处理，刷新没有意义
+    'session': ErrorPolicy('会话失效', 5, 60, False, True),
+    # 被限流时继续按原节奏请求只会加重限流，退避时间更长
+    'throttled': ErrorPolicy('接口限流', 10, 300, True, True),
+    'network': ErrorPolicy('网络异常', 3, 60, True, True),
+    'unknown': ErrorPolicy('未知错误', 2, 60, True, True),
+}
+
+DEFAULT_ERROR_OPTIONS = {
+    'breaker_threshold': 8,      # 连续失败多少次后熔断（0 表示不熔断）
+    'breaker_cooldown': 300,     # 第一次熔断暂停的秒数，再次熔断时加倍
+    'breaker_max_cooldown': 1800,
+    'alert_interval': 600,       # 异常汇总通知的最短间隔（秒）
+}
+
+THROTTLE_MARKERS = (
+    '查询接口返回异常',
+    '网络可能存在问题',
+    '请求过于频繁',
+    '访问频率',
+    '系统繁忙',
+    'too many requests',
+)
+
+TIMEOUT_TYPES = ('TimeoutException', 'Timeout', 'ReadTimeout', 'ConnectTimeout', 'ReadTimeoutError')
+NETWORK_TYPES = ('ConnectionError', 'ConnectionResetError', 'ConnectionRefusedError', 'NewConnectionError',
+                 'ProxyError', 'SSLError', 'ChunkedEncodingError', 'gaierror')
+NETWORK_MARKERS = ('net::err_', 'name or service not known', 'network is unreachable')
+SESSION_MARKERS = ('登录', 'login')
+
+# 一次失败的处理结果：类别、重试前至少等待的秒数、是否刷新查询
+ErrorAction = namedtuple('ErrorAction', ['kind', 'delay', 'refresh'])
+
+
+def classify_error(exc):
+    """判断异常类别：stale / timeout / session / throttled / network / unknown"""
+    name = type(exc).__name__
+    text = str(exc).lower()
+    if name == 'StaleElementReferenceException':
+        return 'stale'
+    if isinstance(exc, RateLimited) or any(marker in text for marker in THROTTLE_MARKERS):
+        return 'throttled'
+    if isinstance(exc, DriverStallError) or name in TIMEOUT_TYPES or 'timed out' in text:
+        return 'timeout'
+    if name in NETWORK_TYPES or any(marker in text for marker in NETWORK_MARKERS):
+        return 'network'
+    if is_dead_session(exc) or any(marker in text for marker in SESSION_MARKERS):
+        return 'session'
+    return 'unknown'
+
+
+def _message(exc):
+    """异常信息的第一行（Selenium 异常会附带很长的堆栈文本）"""
+    text = (getattr(exc, 'msg', None) or str(exc)).strip()
+    return (text.splitlines() or [type(exc).__name__])[0][:200]
+
+
+class ErrorTracker:
+    """监控循环的异常处理：分类、退避、日志去重、熔断和汇总通知
+
+    run_strategy 每轮失败时调用 on_error()，成功时调用 on_success()，每轮开始时调用 breaker_wait()
+    取得需要暂停的秒数，并调用 maybe_alert() 按间隔发送汇总通知
+    """
+
+    def __init__(self, notify=None, policies=None, breaker_threshold=8, breaker_cooldown=300,
+                 breaker_max_cooldown=1800, alert_interval=600):
+        self.notify = notify
+        self.policies = policies or ERROR_POLICIES
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breaker_max_cooldown = breaker_max_cooldown
+        self.alert_interval = alert_interval
+        self.totals = Counter()
+        self.streaks = Counter()  # 每类连续失败次数，决定退避时间
+        self.consecutive = 0      # 计入熔断的连续失败次数
+        self.breaker = 'closed'   # closed / open / half_open
+        self.trips = 0
+        self.open_until = 0.0
+        self._cooldown = breaker_cooldown
+        self._seen = Counter()
+        self._pending = Counter()
+        self._samples = {}
+        self._pending_since = None
+        self._last_alert = None
+
+    def on_error(self, exc, attempt=0):
+        """记录一次失败，返回 ErrorAction"""
+        kind = classify_error(exc)
+        policy = self.policies[kind]
+        message = _message(exc)
+        self.totals[kind] += 1
+        self.streaks[kind] += 1
+        METRICS.inc(f'errors_{kind}')
+        # 同类同信息的错误只在第一次记录完整堆栈
+        signature = (kind, type(exc).__name__, message[:80])
+        self._seen[signature] += 1
+        seen = self._seen[signature]
+        if seen == 1:
+            logger.error(f'第{attempt}次尝试失败（{policy.label}）: {message}', exc_info=True)
+        else:
+            logger.warning(f'第{attempt}次尝试失败（{policy.label}，同类第{seen}次）: {message[:100]}')
+        if self._pending_since is None:
+            self._pending_since = datetime.now()
+        self._pending[kind] += 1
+        self._samples[kind] = message
+        if policy.trips:
+            self.consecutive += 1
+            if self.breaker == 'half_open' or (
+                    self.breaker_threshold and self.consecutive >= self.breaker_threshold):
+                self._trip(kind)
+        delay = 0.0
+        if policy.base:
+            delay = min(policy.cap, policy.base * 2 ** (self.streaks[kind] - 1)) * random.uniform(0.8, 1.0)
+        return ErrorAction(kind, delay, policy.refresh)
+
+    def on_success(self):
+        """一轮监控成功：清零连续失败计数，熔断试探成功时恢复"""
+        if self.breaker == 'half_open':
+            logger.info('✓ 熔断试探成功，恢复正常监控')
+            self.breaker = 'closed'
+            self._cooldown = self.breaker_cooldown
+            METRICS.set_gauge('breaker_open', 0)
+        self.consecutive = 0
+        if self.streaks:
+            self.streaks.clear()
+
+    def _trip(self, kind):
+        reason = f'连续失败 {self.consecutive} 次'
+        if self.breaker == 'half_open':
+            # 试探失败：暂停时间加倍
+            self._cooldown = min(self.breaker_max_cooldown, self._cooldown * 2)
+            reason = '熔断试探失败'
+        self.breaker = 'open'
+        self.trips += 1
+        self.open_until = time.monotonic() + self._cooldown
+        METRICS.inc('breaker_trips')
+        METRICS.set_gauge('breaker_open', 1)
+        resume = datetime.fromtimestamp(time.time() + self._cooldown).strftime('%H:%M:%S')
+        logger.warning(f'⚠ {reason}（最近为{self.policies[kind].label}），'
+                       f'熔断暂停监控 {self._cooldown:.0f} 秒，{resume} 后试探恢复')
+        # 熔断是需要人工关注的状态变化，不等汇总间隔
+        self._last_alert = None
+
+    def breaker_wait(self):
+        """熔断中返回还需暂停的秒数；暂停结束后进入试探状态并返回 0"""
+        if self.breaker != 'open':
+            return 0.0
+        remaining = self.open_until - time.monotonic()
+        if remaining > 0:
+            return remaining
+        self.breaker = 'half_open'
+        self.consecutive = 0
+        logger.info('熔断暂停结束，试探恢复监控...')
+        return 0.0
+
+    def maybe_alert(self, target='', force=False):
+        """有未通知的错误且距上次通知超过 alert_interval 时发送汇总通知"""
+        if not self._pending:
+            return
+        now = time.monotonic()
+        if not force and self._last_alert is not None and now - self._last_alert < self.alert_interval:
+            return
+        lines = [f'> {self.policies[k].label}: {n}次（最近: {self._samples[k][:60]}）'
+                 for k, n in self._pending.most_common()]
+        content = f"## 监控异常汇总\n" \
+                 f"> 车次: {target}\n" \
+                 f"> 统计区间: {self._pending_since.strftime('%H:%M:%S')} - {datetime.now().strftime('%H:%M:%S')}\n" + \
+                  '\n'.join(lines) + '\n'
+        if self.breaker == 'open':
+            resume = datetime.fromtimestamp(time.time() + self.open_until - now).strftime('%H:%M:%S')
+            content += f"> 熔断: 已暂停监控，{resume} 后试探恢复\n"
+        content += f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        self._pending.clear()
+        self._pending_since = None
+        self._last_alert = now
+        if self.notify is not None:
+            try:
+                self.notify('监控异常', content)
+            except Exception as e:
+                logger.debug(f'发送异常汇总通知失败: {e}')
+
+    def report(self):
+        if not self.totals:
+            return '监控期间没有出现异常'
+        counts = '，'.join(f'{self.policies[k].label} {n} 次' for k, n in self.totals.most_common())
+        return f'监控异常：{counts}；熔断 {self.trips} 次'
+
+
+def open_error_tracker(params, notify=None):
+    """按 error_policy 参数创建异常处理器：字典覆盖部分参数，false 关闭熔断（仍然分类、退避和汇总通知）"""
+    value = params.get('error_policy', True)
+    options = dict(DEFAULT_ERROR_OPTIONS, **(value if isinstance(value, dict) else {}))
+    if value is False:
+        options['breaker_threshold'] = 0
+    return ErrorTracker(notify=notify, **options)
@@ -5,6 +5,10 @@
 项目：12306 智能抢票系统
 开源协议：MIT License
 """
+import time
+# 进程启动时刻，用于统计界面就绪耗时
+_STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import json
@@ -14,11 +18,22 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
-# 导入核心抢票脚本
-from booking_core import setup_browser_and_login, run_booking_with_driver
+from dashboard import DashboardPanel
+
+# 核心抢票模块（selenium、requests 等）较重，在后台线程或使用时再导入，保证窗口立即显示
 
 CONFIG_PATH = 'config.json'
 
+# 由界面直接编辑的参数，其余配置项作为高级参数原样透传给核心模块
+FORM_KEYS = {
+    'from_station', 'to_station', 'travel_date', 'ticket_type', 'seat_category',
+    'seat_position_preference', 'booking_start_time', 'passenger_name',
+    'dingtalk_token', 'dingtalk_secret', 'target_train_number', 'depart_time_range', 'profile',
+}
+
+# 决定如何启动浏览器的参数，预启动的浏览器与预登录时的设置不一致则重新启动
+BROWSER_KEYS = ('network_capture', 'browser', 'headless', 'browser_binary', 'driver_path', 'session_cookies')
+
 
 class TicketBookingApp:
     def __init__(self, root):
@@ -35,11 +50,68 @@ class TicketBookingApp:
         
         self.booking_thread = None
         self.is_booking = False
+        self.reloader = None  # 运行中任务的配置热更新器
         self.driver = None  # 保存浏览器实例
         self.is_logged_in = False  # 登录状态标记
+        self.extra_params = {}  # 配置文件中界面未提供的高级参数（如 history_db），原样保留
+        self.prelaunch_thread = None  # 后台预启动浏览器的线程
+        self.prelaunched = None  # 预启动的浏览器，(driver, 启动时的浏览器设置)
         
         self.setup_ui()
         self.load_config()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # 窗口显示后再统计耗时并开始预启动浏览器
+        self.root.after(0, self.on_ready)
+    
+    def on_ready(self):
+        """窗口已显示：报告界面就绪耗时，并在后台预启动浏览器"""
+        print(f"界面就绪，耗时 {time.perf_counter() - _STARTED:.2f} 秒")
+        params = self.get_params()
+        if params.get('prelaunch_browser', True):
+            settings = {k: params.get(k) for k in BROWSER_KEYS}
+            self.prelaunch_thread = threading.Thread(target=self.run_prelaunch, args=(settings,), daemon=True)
+            self.prelaunch_thread.start()
+    
+    def run_prelaunch(self, settings):
+        """在后台线程中加载核心模块并启动浏览器，用户点击预登录时直接使用"""
+        try:
+            started = time.perf_counter()
+            from booking_core import prelaunch_browser
+            imported = time.perf_counter()
+            driver = prelaunch_browser(settings)
+            if driver is None:
+                print("⚠ 浏览器预启动失败，将在预登录时重新启动")
+                return
+            self.prelaunched = (driver, settings)
+            print(f"✓ 浏览器已在后台预启动（加载核心模块 {imported - started:.2f} 秒，"
+                  f"启动浏览器 {time.perf_counter() - imported:.2f} 秒）")
+        except Exception as e:
+            print(f"浏览器预启动出错: {e}")
+    
+    def take_prelaunched(self, params):
+        """取出预启动的浏览器；浏览器设置（网络截获、浏览器类型等）已变化时关闭它，由预登录重新启动"""
+        if self.prelaunch_thread is not None:
+            self.prelaunch_thread.join()
+        prelaunched, self.prelaunched = self.prelaunched, None
+        if prelaunched is None:
+            return None
+        driver, settings = prelaunched
+        if settings == {k: params.get(k) for k in BROWSER_KEYS}:
+            return driver
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        return None
+    
+    def on_close(self):
+        """关闭窗口：未使用的预启动浏览器一并关闭（已登录的浏览器保持原有行为）"""
+        if self.prelaunched is not None:
+            try:
+                self.prelaunched[0].quit()
+            except Exception:
+                pass
+        self.root.destroy()
     
     def setup_ui(self):
         """构建用户界面"""
@@ -168,6 +240,13 @@ class TicketBookingApp:
         ttk.Label(booking_time_frame, text="(可留空)", foreground="gray").pack(side=tk.LEFT, padx=5)
         ttk.Label(section_frame, text="", foreground="gray").grid(row=5, column=1, sticky=tk.W, padx=5)
         ttk.Label(section_frame, text="格式: YYYY-MM-DD HH:MM:SS", foreground="gray").grid(row=5, column=1, sticky=tk.W, padx=5)
+        
+        # 性能分析开关（结果写入 profiles 目录）
+        ttk.Label(section_frame, text="性能分析:").grid(row=6, column=0, sticky=tk.W, pady=5)
+        self.profile_var = tk.BooleanVar(value=False)
+        self.profile_mode = 'sample'  # 配置文件中可改为 cprofile
+        ttk.Checkbutton(section_frame, text="记录本次抢票的性能分析（输出火焰图和耗时汇总）",
+                        variable=self.profile_var).grid(row=6, column=1, sticky=tk.W, padx=5)
     
     def create_action_buttons(self, parent, start_row):
         """创建操作按钮区域"""
@@ -197,6 +276,10 @@ class TicketBookingApp:
                                       command=self.stop_booking, width=15, state=tk.DISABLED)
         self.stop_button.pack(side=tk.LEFT, padx=5)
         
+        self.apply_button = ttk.Button(booking_frame, text="🔄 应用修改", 
+                                       command=self.apply_changes, width=15, state=tk.DISABLED)
+        self.apply_button.pack(side=tk.LEFT, padx=5)
+        
         # 第三行按钮：配置管理
         config_frame = ttk.Frame(button_frame)
         config_frame.pack(pady=5)
@@ -208,13 +291,20 @@ class TicketBookingApp:
                   command=self.load_config, width=15).pack(side=tk.LEFT, padx=5)
     
     def create_log_section(self, parent, start_row):
-        """创建日志输出区域"""
+        """创建日志输出区域（日志和运行看板两个标签页）"""
         log_frame = ttk.LabelFrame(parent, text="运行日志", padding="5")
         log_frame.grid(row=start_row, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        notebook = ttk.Notebook(log_frame)
+        notebook.pack(fill=tk.BOTH, expand=True)
         
-        self.log_text = scrolledtext.ScrolledText(log_frame, height=15, width=80, 
+        self.log_text = scrolledtext.ScrolledText(notebook, height=15, width=80, 
                                                    wrap=tk.WORD, font=("Consolas", 9))
-        self.log_text.pack(fill=tk.BOTH, expand=True)
+        notebook.add(self.log_text, text="日志")
+        
+        # 运行看板：每秒读取一次运行指标
+        self.dashboard = DashboardPanel(notebook, active=lambda: self.is_booking)
+        notebook.add(self.dashboard, text="运行看板")
+        self.dashboard.start()
         
         # 重定向标准输出到日志窗口
         sys.stdout = TextRedirector(self.log_text, "stdout")
@@ -280,7 +370,9 @@ class TicketBookingApp:
             print("🔐 预登录12306")
             print("=" * 60)
             
-            self.driver = setup_browser_and_login()
+            # 传入当前参数：开启网络截获时需要在启动浏览器时打开性能日志
+            params = self.get_params()
+            self.driver = setup_browser_and_login(params, self.take_prelaunched(params))
             
             if self.driver:
                 self.is_logged_in = True
@@ -299,7 +391,8 @@ class TicketBookingApp:
     
     def get_params(self):
         """获取当前界面参数"""
-        params = {
+        params = dict(self.extra_params)
+        params.update({
             'from_station': self.from_station_var.get().strip(),
             'to_station': self.to_station_var.get().strip(),
             'travel_date': self.travel_date_var.get().strip(),
@@ -310,7 +403,8 @@ class TicketBookingApp:
             'passenger_name': self.passenger_name_var.get().strip(),
             'dingtalk_token': self.dingtalk_token_var.get().strip(),
             'dingtalk_secret': self.dingtalk_secret_var.get().strip(),
-        }
+            'profile': self.profile_mode if self.profile_var.get() else '',
+        })
         
         if self.strategy_var.get() == "time_range":
             params['depart_time_range'] = {
@@ -351,6 +445,14 @@ class TicketBookingApp:
                 messagebox.showerror("参数错误", "开售时间格式错误，应为 YYYY-MM-DD HH:MM:SS")
                 return False
         
+        # 按完整配置规则校验（包括配置文件中的高级配置项）
+        from task_plan import compile_task, ConfigError
+        try:
+            compile_task(params)
+        except ConfigError as e:
+            messagebox.showerror("参数错误", "\n".join(e.errors))
+            return False
+        
         return True
     
     def start_booking(self):
@@ -381,6 +483,7 @@ class TicketBookingApp:
         self.is_booking = True
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
+        self.apply_button.config(state=tk.NORMAL)
         self.login_button.config(state=tk.DISABLED)
         self.status_var.set("抢票中...")
         
@@ -392,12 +495,17 @@ class TicketBookingApp:
         """在后台线程中运行抢票逻辑"""
         try:
             from booking_core import run_booking_with_driver
-            run_booking_with_driver(self.driver, params)
+            from config_reload import ConfigReloader
+            # 运行中点击【应用修改】时把界面上的新参数交给热更新器
+            self.reloader = ConfigReloader(params.get('config_watch') or None,
+                                           interval=params.get('config_watch_interval', 2))
+            run_booking_with_driver(self.driver, params, reloader=self.reloader)
         except Exception as e:
             print(f"抢票过程出错: {e}")
             messagebox.showerror("错误", f"抢票过程出错: {e}")
         finally:
             self.is_booking = False
+            self.reloader = None
             self.root.after(0, self.on_booking_finished)
     
     def stop_booking(self):
@@ -407,12 +515,24 @@ class TicketBookingApp:
             self.status_var.set("已停止")
             self.start_button.config(state=tk.NORMAL)
             self.stop_button.config(state=tk.DISABLED)
+            self.apply_button.config(state=tk.DISABLED)
             print("\n用户手动停止抢票")
     
+    def apply_changes(self):
+        """把界面上修改后的参数应用到正在运行的抢票任务（下一轮监控前生效）"""
+        if not self.is_booking or self.reloader is None:
+            return
+        errors = self.reloader.submit(self.get_params(), source='界面')
+        if errors:
+            messagebox.showerror("参数错误", "\n".join(errors))
+        else:
+            self.status_var.set("抢票中（新配置将在下一轮监控前生效）")
+    
     def on_booking_finished(self):
         """抢票完成后的回调"""
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
+        self.apply_button.config(state=tk.DISABLED)
         self.login_button.config(state=tk.NORMAL)
         self.status_var.set("就绪")
     
@@ -436,6 +556,7 @@ class TicketBookingApp:
             with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
                 params = json.load(f)
             
+            self.extra_params = {k: v for k, v in params.items() if k not in FORM_KEYS}
             self.from_station_var.set(params.get('from_station', ''))
             self.to_station_var.set(params.get('to_station', ''))
             self.travel_date_var.set(params.get('travel_date', ''))
@@ -446,6 +567,8 @@ class TicketBookingApp:
             self.passenger_name_var.set(params.get('passenger_name', '张航铭'))
             self.dingtalk_token_var.set(params.get('dingtalk_token', '59a5435eb19966e52544ea4c8b3dda69bb0923e1c6d03f8bfda6b12b02a9f10f'))
             self.dingtalk_secret_var.set(params.get('dingtalk_secret', 'SEC0114e8018102ac44af2377745892f43ec74f54147ea4982c75564a23294c1c47'))
+            self.profile_var.set(bool(params.get('profile')))
+            self.profile_mode = params.get('profile') or 'sample'
             
             # 加载策略相关参数
             if params.get('target_train_number'):
@@ -467,12 +590,18 @@ class TicketBookingApp:
 
 class TextRedirector:
     """将标准输出重定向到 Text 组件"""
+    # 日志窗口最多保留的行数，长时间运行时丢弃最早的内容
+    MAX_LINES = 2000
+    
     def __init__(self, widget, tag="stdout"):
         self.widget = widget
         self.tag = tag
     
     def write(self, text):
         self.widget.insert(tk.END, text)
+        lines = int(self.widget.index('end-1c').split('.')[0])
+        if lines > self.MAX_LINES:
+            self.widget.delete('1.0', f'{lines - self.MAX_LINES + 1}.0')
         self.widget.see(tk.END)
     
     def flush(self):
@@ -0,0 +1,345 @@
+"""
+鲸介12306 抢票助手 - 余票历史记录模块
+把每次刷新解析到的余票状态追加写入本地 SQLite，并提供放票时间分析
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import os
+import queue
+import sqlite3
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 视为"无票"的状态，其余（有、数字）视为有票
+UNAVAILABLE_STATES = ('无', '--', '', '候补', '*')
+
+
+def is_available_state(state):
+    """判断某个席别的余票状态是否可购"""
+    s = (state or '').strip()
+    if s in UNAVAILABLE_STATES:
+        return False
+    return s == '有' or s.isdigit()
+
+
+def route_key(params):
+    """由抢票参数生成线路标识，如 杭州-郑州"""
+    return f"{params.get('from_station', '')}-{params.get('to_station', '')}"
+
+
+def transition_kind(old, new):
+    """状态跳变类型：release（无→有）、sellout（有→无），没有跳变时返回 None"""
+    was, now = is_available_state(old), is_available_state(new)
+    if not was and now:
+        return 'release'
+    if was and not now:
+        return 'sellout'
+    return None
+
+
+class AvailabilityHistory:
+    """余票历史记录：后台线程批量写入，热循环中只做入队
+
+    写线程在写入原始记录的同时维护跳变事件表（transitions），放票分析只查询事件表，
+    不必每次把整条线路的历史记录读出来逐行比较
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS availability ('
+        ' ts REAL NOT NULL, route TEXT NOT NULL, travel_date TEXT NOT NULL,'
+        ' train TEXT NOT NULL, seat TEXT NOT NULL, state TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS idx_availability_route'
+        ' ON availability (route, travel_date, train, seat, ts)',
+        'CREATE TABLE IF NOT EXISTS transitions ('
+        ' ts REAL NOT NULL, route TEXT NOT NULL, travel_date TEXT NOT NULL, train TEXT NOT NULL,'
+        ' seat TEXT NOT NULL, old TEXT NOT NULL, new TEXT NOT NULL, kind TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS idx_transitions_route ON transitions (route, kind, travel_date, ts)',
+    )
+    # 数据库版本（PRAGMA user_version）：1 表示 transitions 表已包含全部历史记录的跳变
+    VERSION = 1
+
+    def __init__(self, path='ticket_history.db', flush_interval=2.0, batch_size=500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._hot_cache = {}
+        self._last_states = {}  # (线路, 日期, 车次, 席别) → 最近一次状态，只在写线程中使用
+        self._migrated = threading.Event()
+        # 先在当前线程建表，确保查询接口随时可用
+        conn = self._connect()
+        try:
+            for sql in self.SCHEMA:
+                conn.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+        self._writer = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # ---------- 写入 ----------
+
+    def record(self, route, travel_date, train, seat, state, ts=None):
+        """记录单个车次单个席别的状态"""
+        self.record_many([(ts or time.time(), route, travel_date, train, seat, state)])
+
+    def record_snapshot(self, rows, route, travel_date, ts=None):
+        """记录一次刷新解析到的整张表（rows 为 read_table_snapshot 的结果）"""
+        ts = ts or time.time()
+        records = []
+        for row in rows:
+            train = row.get('train')
+            if not train:
+                continue
+            for seat, state in (row.get('seats') or {}).items():
+                # '--' 表示该车次不提供此席别，不落盘以节省空间
+                if state and state != '--':
+                    records.append((ts, route, travel_date, train, seat, state))
+        if records:
+            self.record_many(records)
+
+    def record_many(self, records):
+        """批量入队，不阻塞调用方"""
+        if self._closed.is_set():
+            return
+        with self._flushed:
+            self._pending += len(records)
+        self._queue.put(records)
+
+    def _last_state(self, conn, key):
+        if key not in self._last_states:
+            row = conn.execute('SELECT state FROM availability WHERE route = ? AND travel_date = ? AND train = ?'
+                               ' AND seat = ? ORDER BY ts DESC LIMIT 1', key).fetchone()
+            self._last_states[key] = row[0] if row else None
+        return self._last_states[key]
+
+    def _transitions_of(self, conn, batch):
+        """本批记录相对各自上一条记录的跳变事件（需在写入本批之前调用）"""
+        events = []
+        for ts, route, travel_date, train, seat, state in batch:
+            key = (route, travel_date, train, seat)
+            last = self._last_state(conn, key)
+            if last is not None:
+                kind = transition_kind(last, state)
+                if kind:
+                    events.append((ts, route, travel_date, train, seat, last, state, kind))
+            self._last_states[key] = state
+        return events
+
+    def _migrate(self, conn):
+        """旧版本的数据库没有跳变事件表：在写线程中按原始记录补齐一次"""
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= self.VERSION:
+            return
+        started = time.perf_counter()
+        conn.execute('DELETE FROM transitions')
+        cursor = conn.execute('SELECT ts, route, travel_date, train, seat, state FROM availability'
+                              ' ORDER BY route, travel_date, train, seat, ts')
+        last_key = last_state = None
+        events = []
+        for ts, route, travel_date, train, seat, state in cursor:
+            key = (route, travel_date, train, seat)
+            if key == last_key:
+                kind = transition_kind(last_state, state)
+                if kind:
+                    events.append((ts, route, travel_date, train, seat, last_state, state, kind))
+            last_key, last_state = key, state
+        conn.executemany('INSERT INTO transitions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', events)
+        conn.execute(f'PRAGMA user_version = {self.VERSION}')
+        conn.commit()
+        if events:
+            logger.info(f'✓ 已从历史记录补齐 {len(events)} 个放票/售罄事件（{time.perf_counter() - started:.1f} 秒）')
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            try:
+                self._migrate(conn)
+            except Exception as e:
+                logger.error(f'补齐放票/售罄事件失败: {e}', exc_info=True)
+            self._migrated.set()
+            while True:
+                batch = []
+                deadline = time.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        deadline = 0
+                        continue
+                    batch.extend(item)
+                if batch:
+                    try:
+                        events = self._transitions_of(conn, batch)
+                        conn.executemany('INSERT INTO availability VALUES (?, ?, ?, ?, ?, ?)', batch)
+                        conn.executemany('INSERT INTO transitions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', events)
+                        conn.commit()
+                    except Exception as e:
+                        logger.error(f'写入余票历史失败: {e}', exc_info=True)
+                    with self._flushed:
+                        self._pending -= len(batch)
+                        self._flushed.notify_all()
+                if self._closed.is_set() and self._queue.empty():
+                    break
+        finally:
+            conn.close()
+            self._migrated.set()
+            with self._flushed:
+                self._flushed.notify_all()
+
+    def flush(self, timeout=10):
+        """等待已入队的记录全部落盘（旧数据库还会等待跳变事件补齐）"""
+        self._queue.put(None)
+        end = time.time() + timeout
+        if not self._migrated.wait(timeout):
+            return False
+        with self._flushed:
+            while self._pending > 0 and self._writer.is_alive():
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def close(self):
+        """落盘并停止写线程"""
+        self._closed.set()
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+
+    # ---------- 查询与分析 ----------
+
+    @staticmethod
+    def _filters(route, travel_date=None, since=None, until=None, train=None, seat=None, kind=None):
+        sql = ' WHERE route = ?'
+        args = [route]
+        for column, value in (('kind', kind), ('travel_date', travel_date), ('train', train), ('seat', seat)):
+            if value:
+                sql += f' AND {column} = ?'
+                args.append(value)
+        if since:
+            sql += ' AND ts >= ?'
+            args.append(since)
+        if until:
+            sql += ' AND ts <= ?'
+            args.append(until)
+        return sql, args
+
+    def _query(self, sql, args):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+    def transitions(self, route, travel_date=None, since=None, until=None, train=None, seat=None):
+        """返回状态跳变事件列表：(ts, train, seat, old, new, kind)
+
+        kind 为 release（无→有，放票或退票回流）或 sellout（有→无）
+        """
+        where, args = self._filters(route, travel_date, since, until, train, seat)
+        return [tuple(r) for r in self._query(
+            f'SELECT ts, train, seat, old, new, kind FROM transitions{where} ORDER BY ts', args)]
+
+    def minute_histogram(self, route, kind='release', **filters):
+        """按一天中的分钟（HH:MM，本地时间）统计放票/售罄事件次数"""
+        where, args = self._filters(route, kind=kind, **filters)
+        rows = self._query(f"SELECT strftime('%H:%M', ts, 'unixepoch', 'localtime') AS minute, COUNT(*)"
+                           f' FROM transitions{where} GROUP BY minute ORDER BY minute', args)
+        return dict(rows)
+
+    def hot_minutes(self, route, top=10, **filters):
+        """历史上放票最多的分钟，按次数降序"""
+        where, args = self._filters(route, kind='release', **filters)
+        rows = self._query(f"SELECT strftime('%H:%M', ts, 'unixepoch', 'localtime') AS minute, COUNT(*) AS n"
+                           f' FROM transitions{where} GROUP BY minute ORDER BY n DESC, minute LIMIT ?',
+                           args + [top])
+        return [m for m, _ in rows]
+
+    def suggest_refresh_interval(self, route, base_interval, now=None, window=2, top=10,
+                                 cache_seconds=300, **filters):
+        """根据放票热点调整刷新间隔：热点前后 window 分钟内加快，其余时间放慢
+
+        热点分钟只查询跳变事件表的按分钟汇总，并缓存 cache_seconds 秒
+        """
+        key = (route, top, tuple(sorted(filters.items())))
+        cached = self._hot_cache.get(key)
+        if cached and time.time() - cached[0] < cache_seconds:
+            hot = cached[1]
+        else:
+            hot = self.hot_minutes(route, top=top, **filters)
+            self._hot_cache[key] = (time.time(), hot)
+        if not hot:
+            return base_interval
+        now = now or datetime.now()
+        cur = now.hour * 60 + now.minute
+        for hhmm in hot:
+            h, m = map(int, hhmm.split(':'))
+            diff = abs(cur - (h * 60 + m))
+            if min(diff, 1440 - diff) <= window:
+                lo, hi = base_interval
+                return (lo / 2, hi / 2)
+        lo, hi = base_interval
+        return (lo * 1.5, hi * 1.5)
+
+    def report(self, route, **filters):
+        """生成文本报告：放票事件与每分钟分布"""
+        events = self.transitions(route, **filters)
+        releases = [e for e in events if e[5] == 'release']
+        lines = [f'## 线路 {route} 放票分析', f'> 放票/回流次数: {len(releases)}',
+                 f'> 售罄次数: {len(events) - len(releases)}']
+        for ts, train, seat, old, new, _ in releases[-20:]:
+            when = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+            lines.append(f'> {when} {train} {seat}: {old} → {new}')
+        hist = self.minute_histogram(route, 'release', **filters)
+        if hist:
+            peak = max(hist.values())
+            lines.append('> 每分钟放票分布:')
+            for minute, count in hist.items():
+                lines.append(f'> {minute} {"#" * max(1, round(count * 30 / peak))} {count}')
+        return '\n'.join(lines)
+
+
+def open_history(params):
+    """根据参数打开历史记录库，未配置 history_db 时返回 None"""
+    path = (params.get('history_db') or '').strip()
+    if not path:
+        return None
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        history = AvailabilityHistory(path)
+        logger.info(f'✓ 已启用余票历史记录: {path}')
+        return history
+    except Exception as e:
+        logger.error(f'打开余票历史记录失败: {e}', exc_info=True)
+        return None
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 3:
+        print('用法: python history_store.py <history_db> <出发站-到达站> [出发日期]')
+        sys.exit(1)
+    h = AvailabilityHistory(sys.argv[1])
+    print(h.report(sys.argv[2], travel_date=sys.argv[3] if len(sys.argv) > 3 else None))
+    h.close()
@@ -0,0 +1,240 @@
+"""
+鲸介12306 抢票助手 - 余票查询数据模块
+解析 12306 余票查询接口（leftTicket/query*）返回的 JSON，生成与 read_table_snapshot 相同结构的行；
+支持两种数据来源：通过 DevTools 协议（CDP）截获页面自身的查询响应，或直接发送 HTTP 查询
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import json
+import time
+import logging
+
+import requests
+
+from strategies import SEAT_COLUMNS, PAGE_ONLY_SEATS
+from metrics import METRICS
+from query_cache import query_key
+from rate_limiter import RATE_LIMITER, PRIORITY_MONITOR, RateLimited
+
+logger = logging.getLogger(__name__)
+
+LEFT_TICKET_PATH = '/otn/leftTicket/query'
+QUERY_URL = 'https://kyfw.12306.cn/otn/leftTicket/queryG'
+# 票型 → 查询接口的 purpose_codes
+PURPOSE_CODES = {'adult': 'ADULT', 'student': '0X00'}
+
+# 查询结果每条记录以 | 分隔，各字段下标
+FIELD_SECRET = 0
+FIELD_BUTTON = 1
+FIELD_TRAIN_NO = 2
+FIELD_TRAIN_CODE = 3
+FIELD_FROM_CODE = 6
+FIELD_TO_CODE = 7
+FIELD_DEPART = 8
+FIELD_ARRIVE = 9
+FIELD_DURATION = 10
+FIELD_CAN_BUY = 11
+# 席别列名 → 字段下标（优选一等座暂无稳定字段，不解析，见 PAGE_ONLY_SEATS）
+SEAT_FIELDS = {
+    '商务座': 32,
+    '一等座': 31,
+    '二等座': 30,
+    '高级软卧': 21,
+    '软卧': 23,
+    '硬卧': 28,
+    '软座': 24,
+    '硬座': 29,
+    '无座': 26,
+    '其他': 22,
+}
+
+
+def parse_result_item(item, index=0):
+    """解析一条查询结果记录为结构化行，字段不足时返回 None"""
+    f = item.split('|')
+    if len(f) <= max(SEAT_FIELDS.values()):
+        return None
+    depart = f[FIELD_DEPART] or None
+    depart_min = None
+    if depart and len(depart) == 5 and depart[2] == ':':
+        try:
+            depart_min = int(depart[:2]) * 60 + int(depart[3:])
+        except ValueError:
+            depart, depart_min = None, None
+    seats = {}
+    for name in SEAT_COLUMNS:
+        if name in PAGE_ONLY_SEATS:
+            continue
+        # 接口中空字符串对应页面上的 "--"
+        seats[name] = f[SEAT_FIELDS[name]] or '--'
+    return {
+        'index': index,
+        # 页面表格行的 id 为 ticket_ + 车次编号，点击时据此定位
+        'id': f'ticket_{f[FIELD_TRAIN_NO]}' if f[FIELD_TRAIN_NO] else '',
+        'train': f[FIELD_TRAIN_CODE].upper() or None,
+        'depart': depart,
+        'depart_min': depart_min,
+        'seats': seats,
+        'bookable': f[FIELD_CAN_BUY] == 'Y' and bool(f[FIELD_SECRET]),
+        'secret': f[FIELD_SECRET],
+        'train_no': f[FIELD_TRAIN_NO],
+        'from_code': f[FIELD_FROM_CODE],
+        'to_code': f[FIELD_TO_CODE],
+    }
+
+
+def parse_left_ticket(payload):
+    """解析查询接口返回的 JSON（字符串或已解析的字典），返回行列表；格式不对时抛出 ValueError"""
+    if isinstance(payload, (bytes, str)):
+        payload = json.loads(payload)
+    data = (payload or {}).get('data')
+    if not isinstance(data, dict) or 'result' not in data:
+        raise ValueError(f"查询接口返回异常: {str(payload.get('messages') or payload)[:100]}")
+    rows = []
+    for item in data['result']:
+        row = parse_result_item(item, len(rows))
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+def query_left_ticket(session, travel_date, from_code, to_code, purpose='ADULT', url=QUERY_URL, timeout=5,
+                      cache=None, priority=PRIORITY_MONITOR, limiter=None):
+    """直接发送余票查询请求（需要车站电报码），返回行列表
+
+    给定 cache（QueryCache）时，同一线路、日期和票型的并发查询共用一次请求；返回的行只读，不要修改
+    实际发出请求前按 priority 从 limiter（默认为共享限流器）取令牌，被拒绝时抛出 RateLimited
+    """
+    if cache is not None:
+        rows, _ = cache.fetch(query_key(travel_date, from_code, to_code, purpose),
+                              lambda: query_left_ticket(session, travel_date, from_code, to_code,
+                                                        purpose=purpose, url=url, timeout=timeout,
+                                                        priority=priority, limiter=limiter))
+        return rows
+    if not (limiter or RATE_LIMITER).acquire(priority):
+        raise RateLimited('请求限流：未取得查询令牌')
+    params = [
+        ('leftTicketDTO.train_date', travel_date),
+        ('leftTicketDTO.from_station', from_code),
+        ('leftTicketDTO.to_station', to_code),
+        ('purpose_codes', purpose),
+    ]
+    with METRICS.timer('http_query_ms'):
+        resp = session.get(url, params=params, timeout=timeout,
+                           headers={'X-Requested-With': 'XMLHttpRequest'})
+    METRICS.inc('http_queries')
+    resp.raise_for_status()
+    return parse_left_ticket(resp.text)
+
+
+def http_session_from_driver(driver):
+    """创建复用浏览器登录状态（Cookie 和 User-Agent）的 HTTP 会话"""
+    session = requests.Session()
+    try:
+        session.headers['User-Agent'] = driver.execute_script('return navigator.userAgent')
+    except Exception as e:
+        logger.debug(f'读取浏览器 User-Agent 失败: {e}')
+    for c in driver.get_cookies():
+        session.cookies.set(c['name'], c['value'], domain=c.get('domain', 'kyfw.12306.cn'), path=c.get('path', '/'))
+    return session
+
+
+def page_query_url(driver, default=QUERY_URL):
+    """读取查询页面当前使用的查询接口地址（12306 会不定期更换 queryX 路径），失败时返回默认地址"""
+    try:
+        path = driver.execute_script("return typeof CLeftTicketUrl === 'undefined' ? '' : CLeftTicketUrl")
+    except Exception as e:
+        logger.debug(f'读取查询接口地址失败: {e}')
+        return default
+    return f'https://kyfw.12306.cn/otn/{path}' if path else default
+
+
+class NetworkCapture:
+    """通过 CDP 网络事件截获页面自身的余票查询响应
+
+    浏览器需要以性能日志方式启动（create_browser(capture_network=True)），
+    事件经由 WebDriver 的 performance 日志读取，响应体通过 Network.getResponseBody 获取
+    """
+
+    def __init__(self, driver, path=LEFT_TICKET_PATH):
+        self.driver = driver
+        self.path = path
+        self.captured = 0
+        self.fallbacks = 0
+        self.blocked = 0  # 被资源拦截规则拦下的请求数
+        self._pending = {}
+        self._rows = None
+        self.attach(driver)
+
+    def attach(self, driver):
+        """切换到新的浏览器实例（看门狗重启浏览器后调用）"""
+        self.driver = driver
+        self._pending.clear()
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+        except Exception as e:
+            logger.debug(f'启用 CDP 网络事件失败: {e}')
+
+    def _drain(self):
+        """读取积压的网络事件，处理已完成的查询响应"""
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except Exception:
+                continue
+            method = message.get('method')
+            params = message.get('params') or {}
+            if method == 'Network.responseReceived':
+                url = (params.get('response') or {}).get('url', '')
+                if self.path in url:
+                    self._pending[params.get('requestId')] = time.monotonic()
+            elif method == 'Network.loadingFinished' and params.get('requestId') in self._pending:
+                started = self._pending.pop(params['requestId'])
+                self._read_body(params['requestId'], started)
+            elif method == 'Network.loadingFailed':
+                self._pending.pop(params.get('requestId'), None)
+                if params.get('blockedReason'):
+                    self.blocked += 1
+
+    def _read_body(self, request_id, started):
+        try:
+            body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            rows = parse_left_ticket(body.get('body', ''))
+        except Exception as e:
+            logger.debug(f'解析截获的查询响应失败: {e}')
+            return
+        self._rows = rows
+        self.captured += 1
+        METRICS.inc('cdp_captures')
+        METRICS.observe('cdp_capture_ms', (time.monotonic() - started) * 1000)
+
+    def wait_rows(self, timeout=5, poll=0.05):
+        """等待下一次查询响应，返回解析出的行；超时返回 None（调用方改为读取页面表格）"""
+        end = time.monotonic() + timeout
+        while True:
+            self._drain()
+            if self._rows is not None:
+                rows, self._rows = self._rows, None
+                return rows
+            if time.monotonic() >= end:
+                self.fallbacks += 1
+                METRICS.inc('cdp_fallbacks')
+                return None
+            time.sleep(poll)
+
+    def report(self):
+        return f'网络截获：成功 {self.captured} 次，回退读取页面 {self.fallbacks} 次'
+
+
+def open_capture(params, driver):
+    """network_capture 为 true 时创建网络截获；浏览器未开启性能日志时返回 None"""
+    if not params.get('network_capture'):
+        return None
+    try:
+        driver.get_log('performance')
+    except Exception as e:
+        logger.warning(f'⚠ 浏览器未开启网络事件日志，无法截获查询响应（请在加载配置后重新预登录）: {e}')
+        return None
+    return NetworkCapture(driver)
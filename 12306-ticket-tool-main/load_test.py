@@ -0,0 +1,284 @@
+"""
+鲸介12306 抢票助手 - 并发压测工具
+对本地模拟 12306 服务（mock_12306.py）启动 N 个模拟监控任务，每个任务循环执行
+"HTTP 查询 → 解析 → 策略决策"，逐级增加任务数，统计每秒查询数、p99 周期耗时、
+每个任务的 CPU 和内存占用，并找出性能饱和点；结果写入 JSON 和 CSV，便于跨版本对比
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+
+示例：python load_test.py --levels 1,2,4,8,16,32 --duration 10 --latency 50 --max-qps 300
+"""
+import os
+import sys
+import csv
+import json
+import time
+import socket
+import platform
+import argparse
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import requests
+
+from left_ticket import query_left_ticket
+from query_cache import QUERY_CACHE
+from rate_limiter import RATE_LIMITER, RateLimited
+from resource_monitor import process_rss_mb
+from task_plan import compile_task
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 压测使用的任务配置（站名、电报码只用于拼接请求，模拟服务不校验）
+DEFAULT_TASK = {
+    'from_station': '杭州',
+    'to_station': '郑州',
+    'travel_date': '2026-02-12',
+    'depart_time_range': {'start': '08:00', 'end': '12:00'},
+    'seat_category': '二等座',
+    'strict_seat': True,
+}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def run_task(base_url, duration, interval, task=None, cache_ttl=0):
+    """单个模拟监控任务，返回统计结果（在线程或子进程中运行）
+
+    cache_ttl 大于 0 时同一进程内的任务通过共享缓存复用查询结果
+    """
+    cache = QUERY_CACHE if cache_ttl else None
+    if cache is not None:
+        cache.ttl = cache_ttl
+    plan = compile_task(dict(DEFAULT_TASK, **(task or {})))
+    strategy = plan.create_strategy()
+    state = strategy.new_state()
+    session = requests.Session()
+    url = base_url + '/otn/leftTicket/queryG'
+    latencies = []
+    errors = throttled = limited = decisions = 0
+    cpu_start = time.process_time()
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        started = time.perf_counter()
+        try:
+            rows = query_left_ticket(session, plan.travel_date, 'HZH', 'ZZF', url=url, cache=cache)
+            if strategy.step(rows, state).action == 'book':
+                decisions += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+        except RateLimited:
+            limited += 1
+        except ValueError:
+            throttled += 1
+        except Exception:
+            errors += 1
+        if interval:
+            time.sleep(interval)
+    session.close()
+    return {
+        'queries': len(latencies),
+        'errors': errors,
+        'throttled': throttled,
+        'limited': limited,
+        'decisions': decisions,
+        'latencies': latencies,
+        'cpu_s': time.process_time() - cpu_start,
+        'rss_mb': process_rss_mb(os.getpid()),
+        'pid': os.getpid(),
+    }
+
+
+def _server_requests(base_url):
+    try:
+        return requests.get(base_url + '/mock/stats', timeout=2).json()['requests']
+    except Exception:
+        return None
+
+
+def run_level(n, base_url, duration, interval, executor='thread', cache_ttl=0):
+    """以 n 个并发任务运行一轮，返回汇总结果
+
+    queries 为任务得到的查询结果次数，upstream_queries 为模拟服务实际收到的请求数（开启缓存时前者更多）
+    """
+    QUERY_CACHE.clear()
+    upstream_before = _server_requests(base_url)
+    rss_before = process_rss_mb(os.getpid())
+    cpu_before = time.process_time()
+    pool_cls = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    started = time.monotonic()
+    with pool_cls(max_workers=n) as pool:
+        futures = [pool.submit(run_task, base_url, duration, interval, None, cache_ttl) for _ in range(n)]
+        results = [f.result() for f in futures]
+    wall = time.monotonic() - started
+    upstream_after = _server_requests(base_url)
+    latencies = [ms for r in results for ms in r['latencies']]
+    queries = sum(r['queries'] for r in results)
+    if executor == 'process':
+        # 每个子进程单独统计 CPU 和内存
+        cpu_per_task = sum(r['cpu_s'] for r in results) / n
+        rss_per_task = sum(r['rss_mb'] or 0 for r in results) / n
+    else:
+        # 线程模式：整个进程的 CPU 和内存增量平均到每个任务
+        cpu_per_task = (time.process_time() - cpu_before) / n
+        rss_after = process_rss_mb(os.getpid())
+        rss_per_task = ((rss_after or 0) - (rss_before or 0)) / n
+    return {
+        'tasks': n,
+        'executor': executor,
+        'duration_s': round(wall, 2),
+        'queries': queries,
+        'qps': round(queries / wall, 1) if wall else 0.0,
+        'qps_per_task': round(queries / wall / n, 2) if wall else 0.0,
+        'cache_ttl': cache_ttl,
+        # 统计接口自身的一次请求不计入
+        'upstream_queries': (upstream_after - upstream_before - 1) if None not in (upstream_before, upstream_after) else None,
+        'p50_ms': round(percentile(latencies, 50) or 0, 1),
+        'p99_ms': round(percentile(latencies, 99) or 0, 1),
+        'errors': sum(r['errors'] for r in results),
+        'throttled': sum(r['throttled'] for r in results),
+        'limited': sum(r['limited'] for r in results),
+        'decisions': sum(r['decisions'] for r in results),
+        'cpu_pct_per_task': round(cpu_per_task / wall * 100, 2) if wall else 0.0,
+        'rss_mb_per_task': round(rss_per_task, 2),
+    }
+
+
+def find_saturation(levels, efficiency=0.8, p99_factor=2.0):
+    """饱和点：总吞吐低于线性扩展的 efficiency 倍，或 p99 超过单任务时的 p99_factor 倍
+
+    返回 (最大可持续任务数, 开始饱和的任务数或 None)
+    """
+    if not levels:
+        return None, None
+    base = levels[0]
+    base_qps = base['qps_per_task'] or 0
+    base_p99 = base['p99_ms'] or 0
+    sustainable = base['tasks']
+    for level in levels[1:]:
+        linear = base_qps * level['tasks']
+        slow = base_p99 and level['p99_ms'] > base_p99 * p99_factor
+        if (linear and level['qps'] < linear * efficiency) or slow:
+            return sustainable, level['tasks']
+        sustainable = level['tasks']
+    return sustainable, None
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return ''
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_mock_process(latency, jitter, max_qps, trains):
+    """在独立进程中启动模拟服务，避免其 CPU 占用计入压测进程"""
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'mock_12306.py'), '--port', str(port),
+                             '--latency', str(latency), '--jitter', str(jitter), '--max-qps', str(max_qps),
+                             '--trains', str(trains)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    for _ in range(50):
+        try:
+            requests.get(base + '/mock/stats', timeout=1)
+            return proc, base
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('模拟服务启动失败')
+
+
+def write_results(report, out_dir):
+    """写入 JSON 和 CSV，返回两个文件路径"""
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    json_path = os.path.join(out_dir, f'loadtest_{stamp}.json')
+    csv_path = os.path.join(out_dir, f'loadtest_{stamp}.csv')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    fields = list(report['levels'][0].keys()) if report['levels'] else []
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['revision'] + fields)
+        writer.writeheader()
+        for level in report['levels']:
+            writer.writerow(dict(level, revision=report['meta']['revision']))
+    return json_path, csv_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='并发监控任务压测')
+    parser.add_argument('--levels', default='1,2,4,8,16,32', help='逐级并发任务数，逗号分隔')
+    parser.add_argument('--duration', type=float, default=10, help='每级运行秒数')
+    parser.add_argument('--interval', type=float, default=0, help='任务每次查询后的等待秒数（0 为不等待，压满）')
+    parser.add_argument('--executor', choices=('thread', 'process'), default='thread', help='任务执行方式')
+    parser.add_argument('--url', default='', help='使用已启动的模拟服务地址；留空则自动启动')
+    parser.add_argument('--latency', type=float, default=50, help='模拟服务响应延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=20, help='模拟服务延迟抖动（毫秒）')
+    parser.add_argument('--max-qps', type=float, default=0, help='模拟服务限流（每秒请求数），0 为不限')
+    parser.add_argument('--trains', type=int, default=30, help='每次查询返回的车次数')
+    parser.add_argument('--cache-ttl', type=float, default=0,
+                        help='任务间共享查询缓存的有效期（秒），0 为不共享；仅线程模式下生效')
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='本地限流（每秒查询数，全局/账号/IP 共用），0 为不限；仅线程模式下在任务间共享')
+    parser.add_argument('--out', default='loadtest_results', help='结果输出目录')
+    args = parser.parse_args(argv)
+
+    levels = [int(x) for x in args.levels.split(',') if x.strip()]
+    if args.rate_limit:
+        RATE_LIMITER.configure(global_qps=args.rate_limit, account_qps=args.rate_limit, ip_qps=args.rate_limit)
+    else:
+        RATE_LIMITER.configure(enabled=False)
+    proc = None
+    base = args.url.rstrip('/')
+    if not base:
+        proc, base = start_mock_process(args.latency, args.jitter, args.max_qps, args.trains)
+    results = []
+    try:
+        for n in levels:
+            level = run_level(n, base, args.duration, args.interval, args.executor, args.cache_ttl)
+            results.append(level)
+            print(f"任务数 {n:>4}: {level['qps']:>8.1f} 次/秒  p99 {level['p99_ms']:>7.1f}ms  "
+                  f"CPU/任务 {level['cpu_pct_per_task']:>5.1f}%  内存/任务 {level['rss_mb_per_task']:>6.2f}MB  "
+                  f"限流 {level['throttled']}  本地限流 {level['limited']}  错误 {level['errors']}  实际请求 {level['upstream_queries']}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+    sustainable, saturated = find_saturation(results)
+    report = {
+        'meta': {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+        'levels': results,
+        'saturation': {'max_sustainable_tasks': sustainable, 'saturated_at_tasks': saturated},
+    }
+    json_path, csv_path = write_results(report, args.out)
+    if saturated:
+        print(f'饱和点：{saturated} 个任务时性能明显下降，建议单机不超过 {sustainable} 个任务')
+    else:
+        print(f'在测试范围内未饱和（最高 {sustainable} 个任务）')
+    print(f'结果已写入 {json_path} 和 {csv_path}')
+    return report
+
+
+if __name__ == '__main__':
+    main()
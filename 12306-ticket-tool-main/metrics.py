@@ -0,0 +1,145 @@
+"""
+鲸介12306 抢票助手 - 运行指标模块
+进程内的轻量指标：计数器（累计次数）、仪表（当前值）和耗时分布（最近样本的分位数），
+供日志、看板和压测报告读取
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import time
+import threading
+from collections import deque
+
+
+class _Distribution:
+    """保留最近 window 个样本，用于计算分位数"""
+    __slots__ = ('count', 'total', 'min', 'max', 'recent')
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.recent = deque(maxlen=window)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.recent.append(value)
+
+    def summary(self):
+        values = sorted(self.recent)
+        def pct(p):
+            if not values:
+                return None
+            return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': pct(50),
+            'p90': pct(90),
+            'p99': pct(99),
+        }
+
+
+class Metrics:
+    """线程安全的指标集合"""
+
+    def __init__(self, window=1000):
+        self._window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._dists = {}
+        self.started = time.time()
+
+    def inc(self, name, n=1):
+        """计数器加 n"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def set_gauge(self, name, value):
+        """记录当前值（如内存占用）"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        """记录一个样本（如一次查询耗时，单位毫秒）"""
+        with self._lock:
+            dist = self._dists.get(name)
+            if dist is None:
+                dist = self._dists[name] = _Distribution(self._window)
+            dist.add(value)
+
+    def timer(self, name):
+        """用法：with METRICS.timer('query_ms'): ..."""
+        return _Timer(self, name)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def gauge(self, name, default=None):
+        with self._lock:
+            return self._gauges.get(name, default)
+
+    def summary(self, name):
+        """单个耗时分布的统计（没有样本时 count 为 0）"""
+        with self._lock:
+            dist = self._dists.get(name)
+            return dist.summary() if dist is not None else _Distribution(1).summary()
+
+    def snapshot(self):
+        """当前全部指标的副本"""
+        with self._lock:
+            return {
+                'uptime_s': round(time.time() - self.started, 1),
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'distributions': {k: d.summary() for k, d in self._dists.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._dists.clear()
+            self.started = time.time()
+
+    def report(self):
+        """文本报告，便于写入日志"""
+        snap = self.snapshot()
+        lines = [f"运行指标（已运行 {snap['uptime_s']:.0f} 秒）"]
+        for name, value in sorted(snap['counters'].items()):
+            lines.append(f'  {name}: {value}')
+        for name, value in sorted(snap['gauges'].items()):
+            lines.append(f'  {name}: {value:.1f}' if isinstance(value, float) else f'  {name}: {value}')
+        for name, s in sorted(snap['distributions'].items()):
+            if s['count']:
+                lines.append(f"  {name}: 次数{s['count']} 平均{s['avg']:.1f} p50 {s['p50']:.1f} p99 {s['p99']:.1f}")
+        return '\n'.join(lines)
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+# 全局指标
+METRICS = Metrics()
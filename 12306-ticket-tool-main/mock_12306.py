@@ -0,0 +1,247 @@
+"""
+鲸介12306 抢票助手 - 本地模拟 12306 服务
+提供与 12306 相同格式的余票查询接口和下单/排队接口，可配置响应延迟、抖动、限流、放票概率
+以及下单结果，用于压测和离线调试，不会向真实 12306 发送任何请求
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+
+启动：python mock_12306.py --port 8306 --latency 50 --jitter 20 --max-qps 200
+"""
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# 查询结果字段数（与真实接口一致，席别字段在 21~32）
+_FIELD_COUNT = 40
+
+
+class _TokenBucket:
+    """简单令牌桶，用于模拟 12306 的限流"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class MockState:
+    """模拟服务的配置与统计"""
+
+    def __init__(self, latency_ms=50, jitter_ms=20, max_qps=0, trains=30, release_prob=0.05, seed=None,
+                 order_outcome='confirmed', queue_polls=2):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.bucket = _TokenBucket(max_qps)
+        self.trains = trains
+        self.release_prob = release_prob
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        # 下单模拟：order_outcome 为 confirmed / queued / failed / soldout，queue_polls 为出结果前的排队轮询次数
+        self.order_outcome = order_outcome
+        self.queue_polls = queue_polls
+        self.orders = {}  # 订单页令牌 → 排队轮询次数
+        self.order_steps = []
+
+    def delay(self):
+        ms = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else self.latency_ms
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def result(self, from_code, to_code):
+        """生成一次查询结果：车次固定，余票状态按放票概率随机变化"""
+        rows = []
+        for i in range(self.trains):
+            f = [''] * _FIELD_COUNT
+            code = f'{"GD"[i % 2]}{100 + i}'
+            with self.lock:
+                available = self.random.random() < self.release_prob
+            f[0] = f'MOCKSECRET{i}' if available else ''
+            f[1] = '预订'
+            f[2] = f'mock{i:04d}{code}'
+            f[3] = code
+            f[6], f[7] = from_code, to_code
+            f[8] = f'{6 + i * 16 // self.trains:02d}:{(i * 7) % 60:02d}'
+            f[9] = '23:00'
+            f[10] = '05:00'
+            f[11] = 'Y' if available else 'N'
+            for pos in (30, 31, 32):
+                f[pos] = '有' if available and pos == 30 else '无'
+            rows.append('|'.join(f))
+        return rows
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模拟 12306 接口"""
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，不关闭 Nagle 算法会额外产生约 40ms 的延迟确认等待
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt % args)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length).decode('utf-8') if length else ''
+        return {k: v[0] for k, v in parse_qs(raw).items()}
+
+    def do_GET(self):
+        state = self.state
+        url = urlparse(self.path)
+        with state.lock:
+            state.requests += 1
+        if url.path.startswith('/otn/leftTicket/query'):
+            if not state.bucket.take():
+                with state.lock:
+                    state.throttled += 1
+                # 12306 被限流时返回的也是 200，内容为错误提示
+                self._send_json({'status': False, 'messages': ['网络繁忙，请稍后重试'], 'data': None})
+                return
+            state.delay()
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            result = state.result(q.get('leftTicketDTO.from_station', 'AAA'), q.get('leftTicketDTO.to_station', 'BBB'))
+            self._send_json({'httpstatus': 200, 'status': True, 'messages': '', 'data': {'result': result, 'flag': '1', 'map': {}}})
+        elif url.path == '/otn/confirmPassenger/queryOrderWaitTime':
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            self._send_json({'status': True, 'data': self._wait_time(q.get('REPEAT_SUBMIT_TOKEN', ''))})
+        elif url.path == '/mock/stats':
+            self._send_json({'requests': state.requests, 'throttled': state.throttled,
+                             'order_steps': list(state.order_steps)})
+        else:
+            self._send_json({'status': False, 'messages': ['not found']}, 404)
+
+    def _wait_time(self, token):
+        """排队结果：前 queue_polls 次返回排队中，之后按 order_outcome 出结果"""
+        state = self.state
+        with state.lock:
+            if token not in state.orders:
+                return {'queryOrderWaitTimeStatus': True, 'waitTime': -3, 'msg': '订单已撤销'}
+            state.orders[token] += 1
+            polls = state.orders[token]
+        if state.order_outcome == 'queued' or polls <= state.queue_polls:
+            return {'queryOrderWaitTimeStatus': True, 'waitTime': 4, 'waitCount': 12, 'orderId': None}
+        if state.order_outcome == 'failed':
+            return {'queryOrderWaitTimeStatus': True, 'waitTime': -2, 'orderId': None,
+                    'msg': '出票失败，余票不足'}
+        return {'queryOrderWaitTimeStatus': True, 'waitTime': -1, 'orderId': f'E{int(token[:8], 16) % 10 ** 9:09d}'}
+
+    def _order(self, path, form):
+        """下单接口，按 12306 的顺序校验令牌"""
+        state = self.state
+        step = path.rsplit('/', 1)[-1]
+        with state.lock:
+            state.order_steps.append(step)
+        state.delay()
+        token = form.get('REPEAT_SUBMIT_TOKEN')
+        if step not in ('submitOrderRequest', 'initDc') and token not in state.orders:
+            self._send_json({'status': False, 'messages': ['页面已过期，请重新提交']})
+        elif step == 'submitOrderRequest':
+            if not form.get('secretStr', '').startswith('MOCKSECRET'):
+                self._send_json({'status': False, 'messages': ['提交失败，请重试']})
+            else:
+                self._send_json({'status': True, 'data': 'N'})
+        elif step == 'initDc':
+            token = uuid.uuid4().hex
+            with state.lock:
+                state.orders[token] = 0
+            body = (f"<script>var globalRepeatSubmitToken = '{token}';\n"
+                    "var ticketInfoForPassengerForm={'key_check_isChange':'MOCKKEY','leftTicketStr':'MOCKLEFT',"
+                    "'train_location':'P2','purpose_codes':'00'};</script>").encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html;charset=UTF-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif step == 'getPassengerDTOs':
+            self._send_json({'status': True, 'data': {'normal_passengers': [
+                {'passenger_name': name, 'passenger_id_type_code': '1', 'passenger_id_no': f'1101**********{i:04d}',
+                 'mobile_no': '', 'passenger_type': '1', 'allEncStr': f'MOCKENC{i}'}
+                for i, name in enumerate(('张三', '李四'))]}})
+        elif step == 'checkOrderInfo':
+            self._send_json({'status': True, 'data': {'submitStatus': True}})
+        elif step == 'getQueueCount':
+            ticket = '0' if state.order_outcome == 'soldout' else '21'
+            self._send_json({'status': True, 'data': {'count': '0', 'countT': '3', 'ticket': ticket, 'op_1': 'false'}})
+        elif step == 'confirmSingleForQueue':
+            self._send_json({'status': True, 'data': {'submitStatus': True}})
+        else:
+            self._send_json({'status': False, 'messages': ['not found']}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        form = self._read_form()
+        with self.state.lock:
+            self.state.requests += 1
+        if url.path == '/otn/login/checkUser':
+            self._send_json({'status': True, 'data': {'flag': True}})
+        elif url.path.startswith(('/otn/leftTicket/submitOrderRequest', '/otn/confirmPassenger/')):
+            self._order(url.path, form)
+        else:
+            self._send_json({'status': False, 'messages': ['not found']}, 404)
+
+
+def start_mock_server(host='127.0.0.1', port=0, **options):
+    """在后台线程启动模拟服务，返回 (server, base_url)；port 为 0 时自动分配端口"""
+    handler = type('BoundMockHandler', (MockHandler,), {'state': MockState(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='mock-12306', daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地模拟 12306 服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8306)
+    parser.add_argument('--latency', type=float, default=50, help='平均响应延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=20, help='延迟抖动（毫秒）')
+    parser.add_argument('--max-qps', type=float, default=0, help='查询接口限流（每秒请求数），0 为不限')
+    parser.add_argument('--trains', type=int, default=30, help='每次查询返回的车次数')
+    parser.add_argument('--release-prob', type=float, default=0.05, help='每个车次每次查询有票的概率')
+    parser.add_argument('--order-outcome', default='confirmed', choices=('confirmed', 'queued', 'failed', 'soldout'),
+                        help='下单结果')
+    parser.add_argument('--queue-polls', type=int, default=2, help='出结果前排队轮询的次数')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    server, base = start_mock_server(args.host, args.port, latency_ms=args.latency, jitter_ms=args.jitter,
+                                     max_qps=args.max_qps, trains=args.trains, release_prob=args.release_prob,
+                                     order_outcome=args.order_outcome, queue_polls=args.queue_polls)
+    print(f'模拟 12306 服务已启动: {base}/otn/leftTicket/queryG')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,310 @@
+"""
+鲸介12306 抢票助手 - HTTP 下单模块
+点击预订后不再操作订单页面，直接在已登录的会话上按 12306 下单接口的顺序发送请求：
+提交预订请求 → 订单页令牌 → 乘车人 → 检查订单 → 查询排队人数 → 确认提交 → 轮询排队结果。
+预订所需的 secretStr 直接取自查询数据；任何一步返回意外的响应都会抛出 OrderFallback，
+由调用方改走浏览器下单流程
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+
+对本地模拟 12306 服务（mock_12306.py）完整走一遍下单流程的测试见 tests/test_order_http.py
+"""
+import re
+import time
+import logging
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import unquote
+
+from history_store import is_available_state
+from left_ticket import http_session_from_driver, PURPOSE_CODES
+from metrics import METRICS
+from strategies import SEAT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = 'https://kyfw.12306.cn/otn'
+
+# 席别列名 → 下单接口的席别代码
+SEAT_TYPE_CODES = {
+    '商务座': '9',
+    '一等座': 'M',
+    '二等座': 'O',
+    '高级软卧': '6',
+    '软卧': '4',
+    '硬卧': '3',
+    '软座': '2',
+    '硬座': '1',
+    '无座': '1',
+}
+# 票型 → 下单接口的票种代码
+TICKET_TYPE_CODES = {'adult': '1', 'student': '3'}
+
+# 下单结果：status 为 confirmed（已出票/已生成订单）、queued（仍在排队）或 failed（失败）
+OrderResult = namedtuple('OrderResult', ['status', 'order_id', 'wait_time', 'message'])
+
+
+class OrderFallback(Exception):
+    """下单接口返回了意外的响应，需要改走浏览器下单流程"""
+
+
+class OrderRejected(Exception):
+    """12306 明确拒绝了本次下单（如余票不足），继续监控即可，不必再走浏览器流程"""
+
+
+def pick_seat_type(row, preferred=None):
+    """选择下单的席别代码：优先所选席别，没有票时取该车次第一个有票的席别"""
+    seats = row.get('seats') or {}
+    if preferred in SEAT_TYPE_CODES and is_available_state(seats.get(preferred)):
+        return SEAT_TYPE_CODES[preferred]
+    for name in SEAT_COLUMNS:
+        if name in SEAT_TYPE_CODES and is_available_state(seats.get(name)):
+            return SEAT_TYPE_CODES[name]
+    return SEAT_TYPE_CODES.get(preferred)
+
+
+def _js_date(travel_date):
+    """getQueueCount 要求的 JavaScript Date 字符串格式"""
+    day = datetime.strptime(travel_date, '%Y-%m-%d')
+    return day.strftime('%a %b %d %Y 00:00:00 GMT+0800 (中国标准时间)')
+
+
+def _js_value(html, name):
+    m = re.search(r"'" + re.escape(name) + r"'\s*:\s*'([^']*)'", html)
+    return m.group(1) if m else None
+
+
+def passenger_strings(passengers, seat_type, ticket_type):
+    """拼接 checkOrderInfo / confirmSingleForQueue 的乘车人参数，返回 (passengerTicketStr, oldPassengerStr)"""
+    tickets, olds = [], []
+    for p in passengers:
+        tickets.append(','.join([seat_type, '0', ticket_type, p['passenger_name'], p['passenger_id_type_code'],
+                                 p['passenger_id_no'], p.get('mobile_no', ''), 'N', p.get('allEncStr', '')]))
+        olds.append(','.join([p['passenger_name'], p['passenger_id_type_code'], p['passenger_id_no'],
+                              p.get('passenger_type', '1')]) + '_')
+    return '_'.join(tickets), ''.join(olds)
+
+
+def query_order_status(session, token, base_url=BASE_URL, request_timeout=5):
+    """查询一次排队结果，返回 OrderResult（仍在排队时 status 为 queued）
+
+    queryOrderWaitTime 的 waitTime：大于等于 0 为预计还需排队的秒数，-1 为已生成订单，
+    -2 为失败，-3 为订单已撤销，-4 为正在处理
+    """
+    resp = session.get(f'{base_url}/confirmPassenger/queryOrderWaitTime',
+                       params={'random': str(int(time.time() * 1000)), 'tourFlag': 'dc',
+                               '_json_att': '', 'REPEAT_SUBMIT_TOKEN': token},
+                       timeout=request_timeout, headers={'X-Requested-With': 'XMLHttpRequest'})
+    data = (resp.json() or {}).get('data') or {}
+    wait_time = data.get('waitTime')
+    if data.get('orderId'):
+        return OrderResult('confirmed', data['orderId'], 0, '已生成订单')
+    if wait_time in (-2, -3):
+        return OrderResult('failed', None, None, data.get('msg') or '排队失败')
+    return OrderResult('queued', None, wait_time, data.get('msg') or '仍在排队')
+
+
+def wait_for_order(session, token, base_url=BASE_URL, timeout=10, poll=0.5, request_timeout=5):
+    """轮询排队结果直到出结果或超过 timeout 秒，返回 OrderResult"""
+    end = time.monotonic() + timeout
+    while True:
+        result = query_order_status(session, token, base_url, request_timeout)
+        if result.status != 'queued' or time.monotonic() >= end:
+            return result
+        time.sleep(poll)
+
+
+class HttpOrderPipeline:
+    """通过 HTTP 接口完成下单
+
+    submit(driver, decision) 在查询结果中带有 secretStr 时使用，返回 OrderResult；
+    意外的响应抛出 OrderFallback，12306 明确拒绝时抛出 OrderRejected
+    """
+
+    def __init__(self, travel_date, from_station, to_station, ticket_type='adult', passenger_names=(),
+                 base_url=BASE_URL, timeout=5, wait_timeout=10):
+        self.travel_date = travel_date
+        self.from_station = from_station
+        self.to_station = to_station
+        self.ticket_type = ticket_type
+        self.passenger_names = tuple(passenger_names)
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.wait_timeout = wait_timeout
+        self.session = None
+        self.token = None
+        self.attempts = 0
+        self.fallbacks = 0
+        self.result = None  # 最近一次成功提交的 OrderResult
+
+    def retarget(self, plan):
+        """运行中切换配置后使用新的日期、线路、票种和乘车人"""
+        self.travel_date = plan.travel_date
+        self.from_station = plan.from_station
+        self.to_station = plan.to_station
+        self.ticket_type = plan.ticket_type
+        self.passenger_names = tuple(plan.passenger_names)
+
+    def can_submit(self, decision):
+        """查询数据中带有 secretStr（网络截获或 HTTP 查询）时才能直接下单"""
+        return bool(decision.row and decision.row.get('secret'))
+
+    def _post(self, path, data, step):
+        with METRICS.timer('order_http_ms'):
+            resp = self.session.post(f'{self.base_url}/{path}', data=data, timeout=self.timeout,
+                                     headers={'X-Requested-With': 'XMLHttpRequest'})
+        if resp.status_code != 200:
+            raise OrderFallback(f'{step}: HTTP {resp.status_code}')
+        if path.endswith('initDc'):
+            return resp.text
+        try:
+            payload = resp.json()
+        except ValueError:
+            # 会话失效或被限流时 12306 会返回登录页等 HTML
+            raise OrderFallback(f'{step}: 返回的不是 JSON')
+        if not payload.get('status'):
+            raise OrderFallback(f"{step}: {str(payload.get('messages') or payload)[:100]}")
+        return payload.get('data')
+
+    def _passengers(self):
+        data = self._post('confirmPassenger/getPassengerDTOs',
+                          {'_json_att': '', 'REPEAT_SUBMIT_TOKEN': self.token}, '读取乘车人')
+        passengers = (data or {}).get('normal_passengers') or []
+        if not passengers:
+            raise OrderFallback('读取乘车人: 账号下没有乘车人')
+        chosen = [p for name in self.passenger_names for p in passengers if p.get('passenger_name') == name]
+        if not chosen:
+            if self.passenger_names:
+                logger.warning(f'⚠ 未找到乘车人 {"、".join(self.passenger_names)}，使用第一个乘车人')
+            chosen = passengers[:1]
+        return chosen
+
+    def submit(self, driver, decision):
+        """按下单接口顺序提交订单，返回 OrderResult"""
+        self.attempts += 1
+        started = time.perf_counter()
+        row = decision.row
+        try:
+            if self.session is None:
+                self.session = http_session_from_driver(driver)
+            else:
+                # 复用已建立的连接，只同步最新的登录 Cookie
+                for c in driver.get_cookies():
+                    self.session.cookies.set(c['name'], c['value'], domain=c.get('domain', 'kyfw.12306.cn'),
+                                             path=c.get('path', '/'))
+            self._post('leftTicket/submitOrderRequest', {
+                'secretStr': unquote(row['secret']),
+                'train_date': self.travel_date,
+                'back_train_date': self.travel_date,
+                'tour_flag': 'dc',
+                'purpose_codes': PURPOSE_CODES.get(self.ticket_type, 'ADULT'),
+                'query_from_station_name': self.from_station,
+                'query_to_station_name': self.to_station,
+                'undefined': '',
+            }, '提交预订请求')
+            html = self._post('confirmPassenger/initDc', {'_json_att': ''}, '订单页令牌')
+            m = re.search(r"globalRepeatSubmitToken\s*=\s*'([^']+)'", html or '')
+            form = {k: _js_value(html or '', k) for k in ('key_check_isChange', 'leftTicketStr', 'train_location')}
+            if m is None or None in form.values():
+                raise OrderFallback('订单页令牌: 页面中没有 globalRepeatSubmitToken')
+            self.token = m.group(1)
+            passengers = self._passengers()
+            seat_type = pick_seat_type(row, decision.seat)
+            if seat_type is None:
+                raise OrderFallback(f'无法确定席别代码: {decision.seat}')
+            ticket_str, old_str = passenger_strings(passengers, seat_type,
+                                                    TICKET_TYPE_CODES.get(self.ticket_type, '1'))
+            data = self._post('confirmPassenger/checkOrderInfo', {
+                'cancel_flag': '2',
+                'bed_level_order_num': '000000000000000000000000000000',
+                'passengerTicketStr': ticket_str,
+                'oldPassengerStr': old_str,
+                'tour_flag': 'dc',
+                'randCode': '',
+                'whatsSelect': '1',
+                '_json_att': '',
+                'REPEAT_SUBMIT_TOKEN': self.token,
+            }, '检查订单')
+            if not (data or {}).get('submitStatus'):
+                raise OrderRejected((data or {}).get('errMsg') or '检查订单未通过')
+            data = self._post('confirmPassenger/getQueueCount', {
+                'train_date': _js_date(self.travel_date),
+                'train_no': row.get('train_no', ''),
+                'stationTrainCode': row.get('train') or '',
+                'seatType': seat_type,
+                'fromStationTelecode': row.get('from_code', ''),
+                'toStationTelecode': row.get('to_code', ''),
+                'leftTicket': form['leftTicketStr'],
+                'purpose_codes': '00',
+                'train_location': form['train_location'],
+                '_json_att': '',
+                'REPEAT_SUBMIT_TOKEN': self.token,
+            }, '查询排队人数')
+            ticket = str((data or {}).get('ticket', '')).split(',')[0]
+            if ticket.isdigit() and int(ticket) == 0:
+                raise OrderRejected('余票不足')
+            logger.info(f"排队人数 {(data or {}).get('countT', '?')}，余票 {ticket or '?'}")
+            data = self._post('confirmPassenger/confirmSingleForQueue', {
+                'passengerTicketStr': ticket_str,
+                'oldPassengerStr': old_str,
+                'randCode': '',
+                'purpose_codes': '00',
+                'key_check_isChange': form['key_check_isChange'],
+                'leftTicketStr': form['leftTicketStr'],
+                'train_location': form['train_location'],
+                'choose_seats': '',
+                'seatDetailType': '000',
+                'whatsSelect': '1',
+                'roomType': '00',
+                'dwAll': 'N',
+                '_json_att': '',
+                'REPEAT_SUBMIT_TOKEN': self.token,
+            }, '确认提交')
+            if not (data or {}).get('submitStatus'):
+                raise OrderRejected((data or {}).get('errMsg') or '确认提交未通过')
+            METRICS.observe('order_submit_ms', (time.perf_counter() - started) * 1000)
+            logger.info(f'✓ 订单已通过 HTTP 提交（{row.get("train")}，耗时 {time.perf_counter() - started:.2f} 秒），等待排队结果...')
+        except OrderRejected:
+            METRICS.inc('order_http_rejected')
+            raise
+        except OrderFallback:
+            self.fallbacks += 1
+            METRICS.inc('order_http_fallbacks')
+            raise
+        except Exception as e:
+            # 网络异常、字段缺失等都按意外响应处理
+            self.fallbacks += 1
+            METRICS.inc('order_http_fallbacks')
+            raise OrderFallback(f'{type(e).__name__}: {e}') from e
+        # 订单已经提交，之后查询排队结果出错也不能再走浏览器流程（会重复下单）
+        try:
+            result = wait_for_order(self.session, self.token, self.base_url, timeout=self.wait_timeout,
+                                    request_timeout=self.timeout)
+        except Exception as e:
+            logger.warning(f'⚠ 查询排队结果失败: {e}')
+            result = OrderResult('queued', None, None, f'查询排队结果失败: {e}')
+        if result.status != 'failed':
+            self.result = result
+        return result
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def report(self):
+        return f'HTTP 下单：尝试 {self.attempts} 次，改走浏览器 {self.fallbacks} 次'
+
+
+def open_order_pipeline(params, plan):
+    """order_engine 为 http 时创建 HTTP 下单流程，否则返回 None（使用浏览器下单）"""
+    if params.get('order_engine', 'browser') != 'http':
+        return None
+    if not params.get('network_capture'):
+        # 只有截获的查询数据中才有 secretStr，读取页面表格时每次都会改走浏览器
+        logger.warning('⚠ HTTP 下单需要查询数据中的 secretStr，建议同时开启 network_capture')
+    logger.info('✓ 下单方式：HTTP 接口（失败时自动改走浏览器）')
+    return HttpOrderPipeline(plan.travel_date, plan.from_station, plan.to_station, ticket_type=plan.ticket_type,
+                             passenger_names=plan.passenger_names)
@@ -0,0 +1,106 @@
+"""
+鲸介12306 抢票助手 - 订单结果跟踪模块
+浏览器下单点击最终确认后，同时观察页面状态（跳转到支付页、弹出失败提示）并用页面的
+REPEAT_SUBMIT_TOKEN 轮询排队结果接口，在限定时间内得出结果：已生成订单、仍在排队（附预计等待时间）
+或失败（附原因）。失败时由调用方立即回到监控，不需要人工重启
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import time
+import logging
+
+from left_ticket import http_session_from_driver
+from metrics import METRICS
+from order_http import BASE_URL, OrderResult, query_order_status
+from selector_registry import SELECTORS
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_JS = "return typeof globalRepeatSubmitToken === 'undefined' ? '' : globalRepeatSubmitToken"
+
+
+class OrderTracker:
+    """跟踪一次下单的结果
+
+    track(driver) 每 poll 秒检查一次页面和排队接口，最多 timeout 秒，返回 OrderResult；
+    超时仍在排队时返回 queued 和最后一次的预计等待秒数。token 为最近一次跟踪使用的订单页令牌
+    """
+
+    def __init__(self, base_url=BASE_URL, timeout=30, poll=0.3, request_timeout=3):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.poll = poll
+        self.request_timeout = request_timeout
+        self.token = ''
+
+    def read_token(self, driver):
+        """订单页的 REPEAT_SUBMIT_TOKEN，需在离开订单页之前读取"""
+        try:
+            return driver.execute_script(_TOKEN_JS) or ''
+        except Exception as e:
+            logger.debug(f'读取订单页令牌失败: {e}')
+            return ''
+
+    def _page_result(self, driver):
+        """根据页面判断结果：跳转到支付页为成功，弹出失败提示为失败，其余返回 None"""
+        try:
+            if 'payOrder' in (driver.current_url or ''):
+                return OrderResult('confirmed', None, 0, '已跳转到支付页面')
+            el = SELECTORS.find(driver, 'order_error', optional=True)
+            if el is not None and el.is_displayed() and el.text.strip():
+                return OrderResult('failed', None, None, el.text.strip()[:100])
+        except Exception as e:
+            logger.debug(f'读取订单页面状态失败: {e}')
+        return None
+
+    def track(self, driver, token=None):
+        """等待下单结果；token 为空时从页面读取，读不到时只观察页面"""
+        started = time.monotonic()
+        token = self.token = token or self.read_token(driver)
+        session = http_session_from_driver(driver) if token else None
+        result = OrderResult('queued', None, None, '未取得排队结果')
+        try:
+            while True:
+                page = self._page_result(driver)
+                if page is not None and page.status == 'failed':
+                    result = page
+                    break
+                if session is not None:
+                    try:
+                        result = query_order_status(session, token, self.base_url, self.request_timeout)
+                    except Exception as e:
+                        logger.debug(f'查询排队结果失败: {e}')
+                    if result.status != 'queued':
+                        break
+                if page is not None:
+                    # 已跳转到支付页：排队接口查不到订单号时以页面为准
+                    result = page
+                    break
+                if time.monotonic() - started >= self.timeout:
+                    break
+                time.sleep(self.poll)
+        finally:
+            if session is not None:
+                session.close()
+        elapsed = time.monotonic() - started
+        METRICS.observe('order_outcome_ms', elapsed * 1000)
+        METRICS.inc(f'orders_{result.status}')
+        logger.info(f'下单结果（{elapsed:.1f} 秒）：{describe_result(result)}')
+        return result
+
+
+def describe_result(result):
+    """下单结果的中文描述"""
+    if result.status == 'confirmed':
+        return f'已生成订单{f"（订单号 {result.order_id}）" if result.order_id else ""}'
+    if result.status == 'queued':
+        wait = f'，预计还需 {result.wait_time} 秒' if isinstance(result.wait_time, int) and result.wait_time >= 0 else ''
+        return f'仍在排队{wait}'
+    return f'失败：{result.message}'
+
+
+def open_order_tracker(params):
+    """创建订单结果跟踪器，order_track_timeout 为最长跟踪秒数"""
+    return OrderTracker(timeout=params.get('order_track_timeout', 30))
@@ -0,0 +1,184 @@
+"""
+鲸介12306 抢票助手 - 性能分析模块
+按需对一次抢票运行（或每个监控循环）做性能分析：采样模式定时记录抢票线程的调用栈，
+输出火焰图可用的折叠栈文件（flamegraph.pl / speedscope 可直接打开）；确定性模式使用 cProfile，
+输出 .prof 文件。两种模式都会生成耗时前 N 的函数汇总。未开启时不创建任何对象，没有额外开销
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import io
+import os
+import sys
+import time
+import pstats
+import logging
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+def _frame_name(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """定时采样指定线程的调用栈（默认调用 start 的线程），按折叠栈计数"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.active = False
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+        self._sampler.start()
+
+    def resume(self):
+        self.active = True
+
+    def pause(self):
+        self.active = False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.active = False
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(1)
+
+    def write(self, base, top=30):
+        """写入 base.folded（折叠栈）和 base_top.txt（耗时前 N），返回文件路径列表"""
+        folded = base + '.folded'
+        with open(folded, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        n = self.samples or 1
+        lines = [f'采样 {self.samples} 次，间隔 {self.interval * 1000:.0f}ms', '',
+                 f'自身耗时前 {top}（占比 / 函数）']
+        lines += [f'{count / n * 100:6.1f}%  {name}' for name, count in own.most_common(top)]
+        lines += ['', f'累计耗时前 {top}（占比 / 函数，含调用的函数）']
+        lines += [f'{count / n * 100:6.1f}%  {name}' for name, count in total.most_common(top)]
+        summary = base + '_top.txt'
+        with open(summary, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return [folded, summary]
+
+
+class DeterministicProfiler:
+    """cProfile 确定性分析（记录每次函数调用，开销较大，适合短时间分析）"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.active = False
+
+    def start(self):
+        pass
+
+    def resume(self):
+        if not self.active:
+            self.profile.enable()
+            self.active = True
+
+    def pause(self):
+        if self.active:
+            self.profile.disable()
+            self.active = False
+
+    def stop(self):
+        self.pause()
+
+    def write(self, base, top=30):
+        """写入 base.prof（可用 snakeviz 查看）和 base_top.txt，返回文件路径列表"""
+        prof = base + '.prof'
+        self.profile.dump_stats(prof)
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out).strip_dirs()
+        stats.sort_stats('cumulative').print_stats(top)
+        stats.sort_stats('tottime').print_stats(top)
+        summary = base + '_top.txt'
+        with open(summary, 'w', encoding='utf-8') as f:
+            f.write(out.getvalue())
+        return [prof, summary]
+
+
+class RunProfiler:
+    """一次抢票运行的性能分析
+
+    scope 为 run 时整个运行期间都在分析；为 cycle 时只在监控循环的工作部分分析（不含刷新间隔的等待），
+    由 run_strategy 调用 resume()/pause()
+    """
+
+    def __init__(self, mode='sample', scope='run', out_dir='profiles', label='run', top=30):
+        self.mode = mode
+        self.scope = scope
+        self.out_dir = out_dir
+        self.label = label
+        self.top = top
+        self.impl = DeterministicProfiler() if mode == 'cprofile' else SamplingProfiler()
+        self.started = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self.impl.start()
+        if self.scope == 'run':
+            self.impl.resume()
+        logger.info(f'性能分析已开启（{self.mode}，范围：{"整次运行" if self.scope == "run" else "监控循环"}）')
+
+    def resume(self):
+        self.impl.resume()
+
+    def pause(self):
+        self.impl.pause()
+
+    def finish(self):
+        """停止分析并写入结果文件，返回文件路径列表"""
+        self.impl.stop()
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f'{self.label}_{datetime.now().strftime("%Y%m%d_%H%M%S")}')
+        try:
+            paths = self.impl.write(base, self.top)
+        except Exception as e:
+            logger.error(f'写入性能分析结果失败: {e}')
+            return []
+        logger.info(f'✓ 性能分析结果（运行 {time.monotonic() - self.started:.0f} 秒）：{", ".join(paths)}')
+        return paths
+
+
+def open_profiler(params, label='run'):
+    """profile 为 sample/cprofile 时创建并开始分析，未开启时返回 None"""
+    mode = params.get('profile')
+    if not mode:
+        return None
+    profiler = RunProfiler(mode, scope=params.get('profile_scope', 'run'),
+                           out_dir=params.get('profile_dir', 'profiles'), label=label,
+                           top=int(params.get('profile_top', 30)))
+    profiler.start()
+    return profiler
@@ -0,0 +1,166 @@
+"""
+鲸介12306 抢票助手 - 查询结果共享缓存模块
+多个任务监控同一线路、日期和票型时共用一次余票查询：结果缓存很短的时间（TTL），
+同一时刻只有一个任务真正发出请求（single-flight），其余任务等待并复用其结果；
+缓存按时间淘汰，并限制条目数和估算内存，命中/未命中次数写入运行指标
+目前只有压测工具（load_test.py）使用：图形界面和命令行每个进程只运行一个抢票任务，没有可共享的查询
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+def query_key(travel_date, from_station, to_station, ticket_type='adult'):
+    """缓存键：线路 + 日期 + 票型（车站可以是站名或电报码，同一进程内保持一致即可）"""
+    return f'{from_station}-{to_station}|{travel_date}|{ticket_type}'
+
+
+def _rows_size(rows):
+    """估算一次查询结果占用的内存（字节）"""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sys.getsizeof(row.get('seats') or {})
+        size += sum(sys.getsizeof(v) for v in row.values() if isinstance(v, str))
+    return size
+
+
+class _Entry:
+    __slots__ = ('rows', 'fetched_at', 'size')
+
+    def __init__(self, rows, fetched_at, size):
+        self.rows = rows
+        self.fetched_at = fetched_at
+        self.size = size
+
+
+class QueryCache:
+    """线程安全的查询结果缓存
+
+    fetch(key, loader) 是主要入口：有未过期结果时直接返回；其他线程正在查询同一个键时等待其结果；
+    否则调用 loader() 查询并写入缓存。ttl 为 0 时不缓存，每次都调用 loader
+    """
+
+    def __init__(self, ttl=1.5, max_entries=256, max_bytes=32 * 1024 * 1024, wait_timeout=10):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.wait_timeout = wait_timeout
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _fresh(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry.fetched_at >= self.ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self, now):
+        """淘汰过期条目，再按最久未使用淘汰到条目数和内存上限以内"""
+        for key in [k for k, e in self._entries.items() if now - e.fetched_at >= self.ttl]:
+            self._drop(key)
+            self.evictions += 1
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _publish_gauges(self):
+        METRICS.set_gauge('query_cache_entries', len(self._entries))
+        METRICS.set_gauge('query_cache_bytes', self._bytes)
+
+    def get(self, key):
+        """返回未过期的结果，没有时返回 None（不发起查询）"""
+        with self._lock:
+            entry = self._fresh(key, time.monotonic())
+            return entry.rows if entry is not None else None
+
+    def put(self, key, rows):
+        """写入一次查询结果"""
+        if not self.ttl:
+            return
+        now = time.monotonic()
+        entry = _Entry(rows, now, _rows_size(rows))
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict(now)
+            self._publish_gauges()
+
+    def fetch(self, key, loader):
+        """取缓存或查询，返回 (rows, 是否由本次调用查询)"""
+        if not self.ttl:
+            return loader(), True
+        with self._lock:
+            entry = self._fresh(key, time.monotonic())
+            if entry is not None:
+                self.hits += 1
+                METRICS.inc('query_cache_hits')
+                return entry.rows, False
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            # 其他任务正在查询同一线路：等它的结果，超时或它失败时自己查询
+            if event.wait(self.wait_timeout):
+                rows = self.get(key)
+                if rows is not None:
+                    with self._lock:
+                        self.waits += 1
+                    METRICS.inc('query_cache_waits')
+                    return rows, False
+            return self.fetch(key, loader)
+        try:
+            with self._lock:
+                self.misses += 1
+            METRICS.inc('query_cache_misses')
+            rows = loader()
+            self.put(key, rows)
+            return rows, True
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._publish_gauges()
+
+    def report(self):
+        with self._lock:
+            served = self.hits + self.waits
+            total = served + self.misses
+            return (f'查询缓存：实际查询 {self.misses} 次，复用 {served} 次'
+                    f'（命中率 {served / total * 100 if total else 0:.1f}%），'
+                    f'当前 {len(self._entries)} 条约 {self._bytes / 1024:.0f}KB，淘汰 {self.evictions} 条')
+
+
+# 进程内共享的缓存实例
+QUERY_CACHE = QueryCache()
@@ -0,0 +1,226 @@
+"""
+鲸介12306 抢票助手 - 请求限流模块
+所有余票查询（页面刷新和 HTTP 查询）发出前都从进程内的令牌桶取令牌：全局、每个账号、每个出口 IP
+各一个桶，三个桶都有令牌才放行。任务增多时总请求速率受控，不会随任务数线性增长而触发 12306 限流或封禁；
+开售瞬间的查询优先于日常监控，日常监控优先于后台查询；等待时间和拒绝次数写入运行指标
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import time
+import socket
+import logging
+import threading
+from collections import Counter
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# 优先级（数字越小越优先）
+PRIORITY_SALE = 0        # 开售瞬间：不等待，可透支一个桶容量的令牌，透支后由后续请求偿还
+PRIORITY_MONITOR = 1     # 日常监控刷新：等待令牌
+PRIORITY_BACKGROUND = 2  # 后台查询：只使用预留部分以外的令牌
+
+DEFAULT_LIMITS = {
+    'global_qps': 2.0,
+    'account_qps': 1.0,
+    'ip_qps': 1.5,
+    'burst': 10,
+    'reserve': 0.3,
+    'max_wait': 10,
+    'account': '',
+    'ip': '',
+}
+
+
+class RateLimited(RuntimeError):
+    """等待令牌超时，请求被拒绝"""
+
+
+class TokenBucket:
+    """令牌桶：rate 为每秒补充的令牌数，capacity 为最多积累的令牌数；令牌数可以为负（透支）"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, floor):
+        """令牌数超过 floor + 1 还需等待的秒数"""
+        missing = floor + 1 - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float('inf')
+
+
+class RateLimiter:
+    """全局 / 账号 / IP 三级令牌桶
+
+    acquire() 在三个桶都有令牌时取走各一个并返回 True；
+    被拒绝（开售优先级没有可透支的令牌，或等待超过 max_wait）时返回 False
+    """
+
+    def __init__(self, enabled=True, **limits):
+        self.enabled = enabled
+        self._cond = threading.Condition()
+        self._waiting = Counter()
+        self.acquired = 0
+        self.rejected = 0
+        self.waited_s = 0.0
+        self.configure(enabled, **limits)
+        self.configured = False
+
+    def configure(self, enabled=True, **limits):
+        """设置限额（会重置所有桶）"""
+        options = dict(DEFAULT_LIMITS, **limits)
+        with self._cond:
+            self.enabled = enabled
+            self.global_qps = float(options['global_qps'])
+            self.account_qps = float(options['account_qps'])
+            self.ip_qps = float(options['ip_qps'])
+            self.burst = max(1, int(options['burst']))
+            self.reserve = float(options['reserve'])
+            self.max_wait = float(options['max_wait'])
+            self.account = options['account']
+            self.ip = options['ip']
+            self._buckets = {}
+            self.configured = True
+            self._cond.notify_all()
+
+    def _bucket(self, key, rate):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, self.burst)
+        return bucket
+
+    def _floor(self, priority):
+        if priority <= PRIORITY_SALE:
+            return -float(self.burst)
+        if priority >= PRIORITY_BACKGROUND:
+            return self.burst * self.reserve
+        return 0.0
+
+    def acquire(self, priority=PRIORITY_MONITOR, account=None, ip=None, timeout=None):
+        """取一个令牌；timeout 为 None 时使用 max_wait"""
+        if not self.enabled:
+            return True
+        timeout = self.max_wait if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        floor = self._floor(priority)
+        with self._cond:
+            buckets = [
+                self._bucket('global', self.global_qps),
+                self._bucket(f'account:{account if account is not None else self.account}', self.account_qps),
+                self._bucket(f'ip:{ip if ip is not None else self.ip}', self.ip_qps),
+            ]
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    for bucket in buckets:
+                        bucket.refill(now)
+                    wait = max(bucket.wait_for(floor) for bucket in buckets)
+                    # 有更高优先级的请求在等待时让它先取
+                    ahead = any(n for p, n in self._waiting.items() if p < priority)
+                    if wait <= 0 and not ahead:
+                        for bucket in buckets:
+                            bucket.tokens -= 1
+                        break
+                    # 开售优先级不等待；预计等待超过期限时直接拒绝，不白等
+                    if priority <= PRIORITY_SALE or now >= deadline or (not ahead and now + wait > deadline):
+                        self.rejected += 1
+                        METRICS.inc('rate_limit_rejections')
+                        return False
+                    self._cond.wait(min(deadline - now, wait if not ahead else 0.05))
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+            waited = time.monotonic() - started
+            self.acquired += 1
+            self.waited_s += waited
+        METRICS.inc('rate_limit_acquired')
+        METRICS.observe('rate_limit_wait_ms', waited * 1000)
+        return True
+
+    def bind(self, account='', ip=''):
+        """返回按指定账号和出口 IP 取令牌的限流器，供单个任务使用"""
+        return BoundLimiter(self, account, ip)
+
+    def report(self):
+        with self._cond:
+            if not self.enabled:
+                return '请求限流：未启用'
+            avg = self.waited_s / self.acquired * 1000 if self.acquired else 0
+            return (f'请求限流：放行 {self.acquired} 次（平均等待 {avg:.0f}ms），拒绝 {self.rejected} 次；'
+                    f'限额 全局 {self.global_qps}/秒，账号 {self.account_qps}/秒，IP {self.ip_qps}/秒')
+
+
+class BoundLimiter:
+    """绑定了账号和出口 IP 的限流器：令牌仍从共享的桶中取，账号桶和 IP 桶按绑定的值区分"""
+
+    def __init__(self, limiter, account='', ip=''):
+        self.limiter = limiter
+        self.account = account
+        self.ip = ip
+
+    @property
+    def enabled(self):
+        return self.limiter.enabled
+
+    def acquire(self, priority=PRIORITY_MONITOR, timeout=None):
+        return self.limiter.acquire(priority, account=self.account, ip=self.ip, timeout=timeout)
+
+    def report(self):
+        return f'{self.limiter.report()}（账号 {self.account or "未知"}，出口 IP {self.ip or "未知"}）'
+
+
+# 进程内共享的限流器，所有查询路径都从这里取令牌
+RATE_LIMITER = RateLimiter()
+
+# 不限流（轨迹回放、任务关闭限流时使用）
+NO_LIMIT = RateLimiter(enabled=False)
+
+
+def egress_ip(host='kyfw.12306.cn', port=443):
+    """访问 12306 时使用的本机地址（UDP connect 只选路由，不发送数据），无法获取时返回空字符串"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((host, port))
+            return sock.getsockname()[0]
+    except OSError as e:
+        logger.debug(f'获取出口 IP 失败: {e}')
+        return ''
+
+
+def open_rate_limiter(params, account='', ip=None):
+    """按 rate_limit 参数返回本任务使用的限流器：true 使用默认限额，字典覆盖部分限额，false 本任务不限流
+
+    限额在进程内第一次调用时设置，之后的任务共用同一组桶（不会重置其他任务已消耗的令牌）；
+    账号桶按登录账号区分，IP 桶按出口 IP 区分，rate_limit 中的 account / ip 可覆盖
+    """
+    value = params.get('rate_limit', True)
+    if not value:
+        logger.info('本任务不限流')
+        return NO_LIMIT.bind()
+    options = dict(value) if isinstance(value, dict) else {}
+    account = options.pop('account', '') or account
+    ip = options.pop('ip', '') or (egress_ip() if ip is None else ip)
+    with RATE_LIMITER._cond:
+        first = not RATE_LIMITER.configured
+        if first:
+            RATE_LIMITER.configure(**options)
+    if first:
+        logger.info(f'✓ 请求限流：全局 {RATE_LIMITER.global_qps}/秒，账号 {RATE_LIMITER.account_qps}/秒，'
+                    f'IP {RATE_LIMITER.ip_qps}/秒，突发 {RATE_LIMITER.burst}')
+    elif options:
+        logger.info('请求限流已由先启动的任务设置，本任务沿用进程内的限额')
+    logger.info(f'✓ 请求限流：账号 {account or "未知"}，出口 IP {ip or "未知"}')
+    return RATE_LIMITER.bind(account, ip)
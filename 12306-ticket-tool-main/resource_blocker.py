@@ -0,0 +1,133 @@
+"""
+鲸介12306 抢票助手 - 资源拦截模块
+通过 DevTools 协议（Network.setBlockedURLs）在浏览器层面拦截广告、统计脚本、图片和字体等
+与抢票无关的请求，降低每次刷新的加载时间、带宽和 CPU 占用，并统计节省的请求数和流量
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import fnmatch
+import logging
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# 12306 页面默认拦截列表（通配符 *）；不拦截 js/css，页面脚本和元素可见性依赖它们
+DEFAULT_BLOCKLIST = (
+    # 广告与统计
+    '*ad.12306.cn*',
+    '*hm.baidu.com*',
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*cnzz.com*',
+    '*/otn/resources/merged/*ad*',
+    # 图片、字体、音视频
+    '*.png', '*.png?*',
+    '*.jpg', '*.jpg?*',
+    '*.jpeg', '*.jpeg?*',
+    '*.gif', '*.gif?*',
+    '*.webp', '*.webp?*',
+    '*.ico',
+    '*.woff', '*.woff2', '*.ttf',
+    '*.mp4', '*.mp3',
+)
+
+# 页面资源统计脚本：返回已加载资源的地址和传输大小
+_RESOURCES_JS = """
+return performance.getEntriesByType('resource').map(function(e) {
+    return [e.name, e.transferSize || e.encodedBodySize || 0];
+});
+"""
+
+
+class ResourceBlocker:
+    """在浏览器中启用请求拦截并估算节省的请求数和流量
+
+    开启时先统计当前页面（尚未拦截）中会被拦截的资源，作为每次整页加载的基准；
+    同时开启网络截获时，按被拦截请求的实际失败事件计数（NetworkCapture.blocked）
+    """
+
+    def __init__(self, patterns=DEFAULT_BLOCKLIST):
+        self.patterns = list(patterns)
+        self.active = False
+        self.page_requests = 0
+        self.page_bytes = 0
+        self.page_loads = 0
+        self.refreshes = 0
+        self.capture = None
+
+    def matches(self, url):
+        return any(fnmatch.fnmatchcase(url, p) for p in self.patterns)
+
+    def _measure_baseline(self, driver):
+        try:
+            entries = driver.execute_script(_RESOURCES_JS) or []
+        except Exception as e:
+            logger.debug(f'读取页面资源统计失败: {e}')
+            return
+        hit = [size for url, size in entries if self.matches(url)]
+        if hit:
+            self.page_requests = len(hit)
+            self.page_bytes = sum(hit)
+
+    def apply(self, driver):
+        """在当前浏览器中启用拦截"""
+        if not self.page_requests:
+            self._measure_baseline(driver)
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.patterns})
+            self.active = True
+        except Exception as e:
+            logger.warning(f'⚠ 启用资源拦截失败: {e}')
+            self.active = False
+        return self.active
+
+    def clear(self, driver):
+        """暂时取消拦截（如需要显示登录二维码时）"""
+        try:
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []})
+        except Exception as e:
+            logger.debug(f'取消资源拦截失败: {e}')
+        self.active = False
+
+    def page_loaded(self):
+        """记录一次拦截状态下的整页加载（整页刷新、重新打开查询页）"""
+        if self.active:
+            self.page_loads += 1
+
+    def refreshed(self):
+        """记录一次查询刷新并更新指标"""
+        self.refreshes += 1
+        saved_requests, saved_bytes = self.saved()
+        METRICS.set_gauge('blocked_requests', saved_requests)
+        METRICS.set_gauge('blocked_bytes_est', saved_bytes)
+
+    def saved(self):
+        """返回 (节省的请求数, 估算节省的字节数)"""
+        avg = self.page_bytes / self.page_requests if self.page_requests else 0
+        if self.capture is not None and self.capture.blocked:
+            requests = self.capture.blocked
+        else:
+            requests = self.page_loads * self.page_requests
+        return requests, int(requests * avg)
+
+    def report(self):
+        requests, saved_bytes = self.saved()
+        per = self.refreshes or 1
+        return (f'资源拦截：共拦截约 {requests} 个请求、{saved_bytes / 1024:.0f}KB，'
+                f'平均每次刷新 {requests / per:.1f} 个请求、{saved_bytes / per / 1024:.1f}KB')
+
+
+def open_blocker(params, driver):
+    """按参数启用资源拦截：block_resources 为 true 使用默认列表，为列表时使用自定义列表"""
+    value = params.get('block_resources')
+    if not value:
+        return None
+    blocker = ResourceBlocker(value if isinstance(value, list) else DEFAULT_BLOCKLIST)
+    if not blocker.apply(driver):
+        return None
+    logger.info(f'✓ 已启用资源拦截（{len(blocker.patterns)} 条规则）')
+    return blocker
@@ -0,0 +1,181 @@
+"""
+鲸介12306 抢票助手 - 资源监控模块
+定期采样 Python 进程和浏览器进程的内存占用（RSS）并写入运行指标；
+浏览器内存超过阈值（或空闲时超过软阈值）时回收标签页，仍然过高时重启浏览器，登录状态保持不变
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import os
+import time
+import logging
+
+from metrics import METRICS
+
+try:
+    import psutil
+except ImportError:  # 可选依赖，未安装时 Linux 下读取 /proc
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def process_rss_mb(pid):
+    """进程常驻内存（MB），无法获取时返回 None"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss / 1048576
+        except Exception:
+            return None
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1048576
+    except Exception:
+        return None
+
+
+def child_pids(pid):
+    """进程的所有子孙进程号（浏览器由 msedgedriver / chromedriver 启动，渲染进程是其子孙进程）"""
+    if psutil is not None:
+        try:
+            return [p.pid for p in psutil.Process(pid).children(recursive=True)]
+        except Exception:
+            return []
+    parents = {}
+    try:
+        for name in os.listdir('/proc'):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{name}/stat', 'r') as f:
+                    stat = f.read()
+                # 进程名可能包含空格，取最后一个右括号之后的字段
+                ppid = int(stat[stat.rindex(')') + 2:].split()[1])
+                parents.setdefault(ppid, []).append(int(name))
+            except Exception:
+                continue
+    except Exception:
+        return []
+    result, stack = [], [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def browser_pids(driver):
+    """浏览器驱动进程号及其全部子孙进程号"""
+    try:
+        root = driver.service.process.pid
+    except Exception:
+        return []
+    return [root] + child_pids(root)
+
+
+def total_rss_mb(pids):
+    """多个进程的常驻内存之和（MB）；一个进程的内存都读不到时返回 None，而不是 0"""
+    sizes = [s for s in (process_rss_mb(pid) for pid in pids) if s is not None]
+    return sum(sizes) if sizes else None
+
+
+class ResourceMonitor:
+    """内存采样与浏览器回收
+
+    tick(driver, quiet) 在监控循环中调用（有间隔限制），返回之后应使用的浏览器实例；
+    回收标签页需要 restore(driver) 回到查询页面，重启浏览器需要看门狗（driver_watchdog）
+    """
+
+    def __init__(self, browser_limit_mb=1500, soft_ratio=0.7, interval=60, restore=None, watchdog=None):
+        self.browser_limit_mb = browser_limit_mb
+        self.soft_ratio = soft_ratio
+        self.interval = interval
+        self.restore = restore
+        self.watchdog = watchdog
+        self.last = {}
+        self.tab_recycles = 0
+        self.browser_recycles = 0
+        self._last_sample = 0.0
+
+    def sample(self, driver):
+        """采样一次内存并写入指标"""
+        python_mb = process_rss_mb(os.getpid())
+        pids = browser_pids(driver)
+        browser_mb = total_rss_mb(pids)
+        self.last = {'python_mb': python_mb, 'browser_mb': browser_mb, 'browser_procs': len(pids)}
+        if python_mb is not None:
+            METRICS.set_gauge('python_rss_mb', round(python_mb, 1))
+        if browser_mb is not None:
+            METRICS.set_gauge('browser_rss_mb', round(browser_mb, 1))
+            METRICS.set_gauge('browser_procs', len(pids))
+        return self.last
+
+    def tick(self, driver, quiet=False):
+        """按间隔采样，必要时回收；返回之后使用的浏览器实例"""
+        now = time.monotonic()
+        if now - self._last_sample < self.interval:
+            return driver
+        self._last_sample = now
+        usage = self.sample(driver)
+        browser_mb = usage.get('browser_mb')
+        if browser_mb is None or not self.browser_limit_mb:
+            return driver
+        if browser_mb >= self.browser_limit_mb:
+            reason = f'浏览器内存 {browser_mb:.0f}MB 超过上限 {self.browser_limit_mb}MB'
+        elif quiet and browser_mb >= self.browser_limit_mb * self.soft_ratio:
+            reason = f'空闲期回收，浏览器内存 {browser_mb:.0f}MB'
+        else:
+            return driver
+        logger.info(f'♻ {reason}，回收标签页...')
+        driver = self.recycle_tab(driver)
+        after = self.sample(driver).get('browser_mb')
+        if after is not None and after >= self.browser_limit_mb and self.watchdog is not None:
+            logger.info(f'♻ 回收标签页后内存仍为 {after:.0f}MB，重启浏览器...')
+            if self.watchdog.recover(f'内存回收（{after:.0f}MB）'):
+                self.browser_recycles += 1
+                METRICS.inc('browser_recycles')
+                driver = self.watchdog.driver
+                self.sample(driver)
+        return driver
+
+    def recycle_tab(self, driver):
+        """新开一个标签页回到查询页面，再关闭旧标签页（同一浏览器，Cookie 不变）"""
+        started = time.monotonic()
+        old = driver.current_window_handle
+        try:
+            driver.switch_to.new_window('tab')
+            new = driver.current_window_handle
+            if self.restore is not None and not self.restore(driver):
+                raise RuntimeError('新标签页恢复查询页面失败')
+            driver.switch_to.window(old)
+            driver.close()
+            driver.switch_to.window(new)
+        except Exception as e:
+            logger.error(f'回收标签页失败: {e}')
+            try:
+                driver.switch_to.window(old)
+            except Exception:
+                pass
+            return driver
+        self.tab_recycles += 1
+        METRICS.inc('tab_recycles')
+        logger.info(f'✓ 标签页已回收，耗时 {time.monotonic() - started:.1f} 秒')
+        return driver
+
+    def report(self):
+        last = self.last or {}
+        def fmt(v):
+            return f'{v:.0f}MB' if v is not None else '未知'
+        return (f"内存：Python {fmt(last.get('python_mb'))}，浏览器 {fmt(last.get('browser_mb'))}"
+                f"（{last.get('browser_procs', 0)} 个进程）；回收标签页 {self.tab_recycles} 次，"
+                f"重启浏览器 {self.browser_recycles} 次")
+
+
+def open_resource_monitor(params, restore=None, watchdog=None):
+    """按参数创建资源监控；browser_memory_limit_mb 为 0 时只采样不回收"""
+    return ResourceMonitor(browser_limit_mb=params.get('browser_memory_limit_mb', 1500),
+                           interval=params.get('resource_sample_interval', 60),
+                           restore=restore, watchdog=watchdog)
@@ -0,0 +1,142 @@
+"""
+鲸介12306 抢票助手 - 查询结果增量比对模块
+按 车次+各席别状态 给每一行生成指纹，与上一次刷新比对，只对变化的行重新评估
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import logging
+from collections import namedtuple
+
+from history_store import is_available_state
+
+logger = logging.getLogger(__name__)
+
+# 状态变化事件
+# kind: release（无→有）、sellout（有→无）、change（余量变化，如 有→5）、
+#       bookable / unbookable（预订按钮出现/消失）、appear / vanish（车次出现/消失）
+StateChange = namedtuple('StateChange', ['train', 'seat', 'old', 'new', 'kind', 'row'])
+
+
+def row_fingerprint(row):
+    """行指纹：车次号 + 各席别状态 + 是否可预订"""
+    seats = row.get('seats') or {}
+    return (row.get('train'), row.get('depart'), tuple(seats.items()), bool(row.get('bookable')))
+
+
+class RowDiffer:
+    """跨刷新比对查询结果，缓存每行的评估结果并发出状态变化事件"""
+
+    def __init__(self, evaluate=None):
+        self.evaluate = evaluate
+        self._prev = {}
+        self._results = {}
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """注册状态变化回调，callback(events)"""
+        self._listeners.append(callback)
+
+    def reset(self):
+        """丢弃上一次快照（如更换线路、日期后）"""
+        self._prev = {}
+        self._results = {}
+
+    def diff(self, rows):
+        """比对本次快照，返回 (变化的行, 事件列表)，并只对变化的行调用 evaluate"""
+        current = {}
+        changed = []
+        events = []
+        for row in rows:
+            train = row.get('train')
+            if not train:
+                continue
+            fp = row_fingerprint(row)
+            current[train] = (fp, row)
+            prev = self._prev.get(train)
+            if prev is not None and prev[0] == fp:
+                if self.evaluate is not None and train not in self._results:
+                    # 基线来自 seed() 的精简快照，用本次的完整行补上评估结果
+                    self._results[train] = self.evaluate(row)
+                continue
+            changed.append(row)
+            events.extend(self._row_events(prev[1] if prev else None, row))
+            if self.evaluate is not None:
+                self._results[train] = self.evaluate(row)
+        for train, (_, row) in self._prev.items():
+            if train not in current:
+                events.append(StateChange(train, None, None, None, 'vanish', row))
+                self._results.pop(train, None)
+        # 首次快照只建立基线，不报告 appear 事件
+        if not self._prev:
+            events = [e for e in events if e.kind != 'appear']
+        self._prev = current
+        if events:
+            for callback in self._listeners:
+                try:
+                    callback(events)
+                except Exception as e:
+                    logger.debug(f'状态变化回调出错: {e}')
+        return changed, events
+
+    def snapshot(self):
+        """上一次快照的精简副本（车次、出发时间、各席别状态、是否可预订），可写入 JSON"""
+        return [{'train': row.get('train'), 'depart': row.get('depart'), 'seats': dict(row.get('seats') or {}),
+                 'bookable': bool(row.get('bookable'))} for _, row in self._prev.values()]
+
+    def seed(self, rows):
+        """以保存的快照作为基线（断点恢复、切换策略时），下一次比对报告这期间发生的变化
+
+        快照只有指纹所需的字段，评估推迟到下一次比对时用完整的行进行
+        """
+        self.reset()
+        for row in rows:
+            train = row.get('train')
+            if train:
+                self._prev[train] = (row_fingerprint(row), row)
+
+    def result(self, train):
+        """返回该车次最近一次的评估结果（未变化的行沿用缓存）"""
+        return self._results.get(train)
+
+    def matches(self, rows):
+        """按本次快照顺序返回评估结果为真的行"""
+        return [r for r in rows if r.get('train') and self._results.get(r['train'])]
+
+    @staticmethod
+    def _row_events(old, new):
+        train = new.get('train')
+        if old is None:
+            return [StateChange(train, None, None, None, 'appear', new)]
+        events = []
+        old_seats = old.get('seats') or {}
+        for seat, state in (new.get('seats') or {}).items():
+            before = old_seats.get(seat, '')
+            if before == state:
+                continue
+            was, now = is_available_state(before), is_available_state(state)
+            if not was and now:
+                kind = 'release'
+            elif was and not now:
+                kind = 'sellout'
+            else:
+                kind = 'change'
+            events.append(StateChange(train, seat, before, state, kind, new))
+        if bool(old.get('bookable')) != bool(new.get('bookable')):
+            kind = 'bookable' if new.get('bookable') else 'unbookable'
+            events.append(StateChange(train, None, old.get('bookable'), new.get('bookable'), kind, new))
+        return events
+
+
+def describe_events(events):
+    """把事件列表转成便于日志/通知的文字，如 D230 一等座 无→有"""
+    parts = []
+    for e in events:
+        if e.seat:
+            parts.append(f'{e.train} {e.seat} {e.old or "?"}→{e.new or "?"}')
+        elif e.kind in ('bookable', 'unbookable'):
+            parts.append(f'{e.train} {"可预订" if e.kind == "bookable" else "不可预订"}')
+        else:
+            parts.append(f'{e.train} {"新出现" if e.kind == "appear" else "已消失"}')
+    return '；'.join(parts)
@@ -0,0 +1,186 @@
+"""
+鲸介12306 抢票助手 - 开售瞬间并发查询模块
+在开售时刻（T-0）前后，按错开的时间表从多个 HTTP 会话（复用浏览器登录 Cookie）发出余票查询，
+第一个看到可预订余票的查询胜出，其余工作线程随即停止；每次查询的计划时刻、实际发出时刻和耗时
+都会记录到日志，便于每次开售后调整错开时间表
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import time
+import logging
+import threading
+from collections import namedtuple
+
+from left_ticket import query_left_ticket, http_session_from_driver, page_query_url, PURPOSE_CODES
+from metrics import METRICS
+from rate_limiter import PRIORITY_SALE, PRIORITY_BACKGROUND, RateLimited
+from selector_registry import SELECTORS
+
+logger = logging.getLogger(__name__)
+
+# 默认时间表：T-200ms 到 T+1s，每 50ms 发出一次，由 4 个工作线程轮流承担
+DEFAULT_BURST = {'start_ms': -200, 'end_ms': 1000, 'step_ms': 50, 'workers': 4}
+
+# 一次查询的记录；offset 均为相对开售时刻的毫秒数
+BurstShot = namedtuple('BurstShot', ['worker', 'planned_ms', 'sent_ms', 'latency_ms', 'result', 'train'])
+
+_RESULT_TEXT = {
+    'book': '有票',
+    'wait': '无票',
+    'throttled': '接口异常/限流',
+    'limited': '本地限流跳过',
+    'error': '请求失败',
+}
+
+
+def burst_offsets(start_ms, end_ms, step_ms):
+    """时间表：相对开售时刻的发出时间（毫秒），包含两端"""
+    count = int((end_ms - start_ms) // step_ms) + 1
+    return [start_ms + i * step_ms for i in range(count)]
+
+
+class SaleBurst:
+    """开售瞬间的错开并发查询
+
+    工作线程 i 负责时间表中第 i、i+N、i+2N… 个时刻，相邻时刻由不同线程发出，
+    单个查询变慢不会推迟下一个时刻；任一查询让策略做出预订决定后，其余线程不再发出新查询
+    """
+
+    def __init__(self, strategy, travel_date, from_code, to_code, purpose='ADULT',
+                 start_ms=-200, end_ms=1000, step_ms=50, workers=4, timeout=3, limiter=None):
+        self.strategy = strategy
+        self.travel_date = travel_date
+        self.from_code = from_code
+        self.to_code = to_code
+        self.purpose = purpose
+        self.offsets = burst_offsets(int(start_ms), int(end_ms), int(step_ms))
+        self.workers = max(1, min(int(workers), len(self.offsets)))
+        self.timeout = timeout
+        self.limiter = limiter
+        self.shots = []
+        self.winner = None  # (BurstShot, Decision, rows)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _fire(self, index, session, url, state, planned, t0):
+        sent = (time.time() - t0) * 1000
+        started = time.perf_counter()
+        rows = decision = None
+        try:
+            rows = query_left_ticket(session, self.travel_date, self.from_code, self.to_code,
+                                     purpose=self.purpose, url=url, timeout=self.timeout, priority=PRIORITY_SALE,
+                                     limiter=self.limiter)
+            decision = self.strategy.step(rows, state)
+            result = decision.action
+        except RateLimited:
+            result = 'limited'
+        except ValueError:
+            result = 'throttled'
+        except Exception as e:
+            logger.debug(f'并发查询失败（线程{index}）: {e}')
+            result = 'error'
+        latency = (time.perf_counter() - started) * 1000
+        METRICS.observe('burst_query_ms', latency)
+        shot = BurstShot(index, planned, round(sent, 1), round(latency, 1), result,
+                         decision.train if result == 'book' else None)
+        with self._lock:
+            self.shots.append(shot)
+            if result == 'book' and self.winner is None:
+                self.winner = (shot, decision, rows)
+                self._stop.set()
+
+    def _worker(self, index, session, url, t0):
+        state = self.strategy.new_state()
+        for planned in self.offsets[index::self.workers]:
+            delay = t0 + planned / 1000.0 - time.time()
+            # 等待期间有其他线程命中则直接让出
+            if (delay > 0 and self._stop.wait(delay)) or self._stop.is_set():
+                return
+            self._fire(index, session, url, state, planned, t0)
+
+    def run(self, driver, t0):
+        """在开售前调用（建议提前 10 秒左右）：准备会话并执行时间表，返回 winner 或 None
+
+        t0 为开售时刻（time.time() 时间戳）。任一查询命中后立即返回，不等时间表结束，
+        调用方直接用命中的决定（带 secretStr 的行）预订
+        """
+        url = page_query_url(driver)
+        sessions = [http_session_from_driver(driver) for _ in range(self.workers)]
+        # 预热：提前建立 TLS 连接，开售时刻的查询不必再握手（开售前的查询结果忽略）
+        for session in sessions:
+            try:
+                query_left_ticket(session, self.travel_date, self.from_code, self.to_code,
+                                  purpose=self.purpose, url=url, timeout=self.timeout, priority=PRIORITY_BACKGROUND,
+                                  limiter=self.limiter)
+            except Exception as e:
+                logger.debug(f'并发查询预热失败: {e}')
+        logger.info(f'⚡ 开售并发查询已就绪：{self.workers} 个工作线程，'
+                    f'{self.offsets[0]:+d}ms ~ {self.offsets[-1]:+d}ms 共 {len(self.offsets)} 次')
+        threads = [threading.Thread(target=self._worker, args=(i, sessions[i], url, t0),
+                                    name=f'sale-burst-{i}', daemon=True)
+                   for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        deadline = t0 + self.offsets[-1] / 1000.0 + self.timeout + 1
+        # 命中即返回；未命中时等到所有线程结束或超过期限
+        while not self._stop.wait(0.005):
+            if time.time() >= deadline or not any(t.is_alive() for t in threads):
+                break
+        # 让还在等待下一个时刻的线程退出；仍在进行中的查询随会话关闭中止，完成的也只记录不生效
+        self._stop.set()
+        for session in sessions:
+            session.close()
+        METRICS.inc('burst_runs')
+        if self.winner is not None:
+            METRICS.inc('burst_wins')
+        return self.winner
+
+    def report(self):
+        """返回日志行：每次查询的时刻与耗时，以及命中情况"""
+        with self._lock:
+            shots = sorted(self.shots, key=lambda s: s.planned_ms)
+            winner = self.winner
+        lines = []
+        for s in shots:
+            text = _RESULT_TEXT.get(s.result, s.result)
+            if s.train:
+                text += f' {s.train}'
+            if winner is not None and s is not winner[0] and s.sent_ms >= winner[0].sent_ms:
+                text += '（已让出）'
+            lines.append(f'  线程{s.worker}: 计划 {s.planned_ms:+d}ms 发出 {s.sent_ms:+.0f}ms '
+                         f'耗时 {s.latency_ms:.0f}ms {text}')
+        if winner is not None:
+            shot = winner[0]
+            lines.append(f'⚡ 开售并发查询命中：线程{shot.worker} 计划 {shot.planned_ms:+d}ms '
+                         f'（响应于 {shot.sent_ms + shot.latency_ms:+.0f}ms），车次 {shot.train}')
+        else:
+            lines.append(f'开售并发查询结束：{len(shots)} 次查询均未看到可预订余票')
+        return lines
+
+
+def _station_code(driver, name):
+    """读取查询页面隐藏的车站电报码输入框（填写查询表单后才有值）"""
+    try:
+        return (SELECTORS.find(driver, name).get_attribute('value') or '').strip()
+    except Exception:
+        return ''
+
+
+def open_sale_burst(params, plan, driver, limiter=None):
+    """sale_burst 为 true（默认时间表）或字典（覆盖部分参数）时创建；没有开售时间或电报码时返回 None"""
+    value = params.get('sale_burst')
+    if not value:
+        return None
+    if plan.booking_start is None:
+        logger.warning('⚠ 未设置开售时间（booking_start_time），不启用开售并发查询')
+        return None
+    options = dict(DEFAULT_BURST, **(value if isinstance(value, dict) else {}))
+    from_code = plan.from_code or _station_code(driver, 'from_station_code')
+    to_code = plan.to_code or _station_code(driver, 'to_station_code')
+    if not (from_code and to_code):
+        logger.warning('⚠ 无法获取车站电报码，不启用开售并发查询（可配置 station_table）')
+        return None
+    return SaleBurst(plan.create_strategy(), plan.travel_date, from_code, to_code,
+                     purpose=PURPOSE_CODES.get(plan.ticket_type, 'ADULT'), limiter=limiter, **options)
@@ -0,0 +1,323 @@
+"""
+鲸介12306 抢票助手 - 选择器注册表
+集中管理页面元素的定位方式：每个逻辑元素有一组按优先级排列的选择器（快速的 ID/CSS 在前，
+通用 XPath 兜底在后），注册表记录每个选择器的命中率和耗时，自动把最快且有效的提到最前
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException
+
+logger = logging.getLogger(__name__)
+
+# wait() 的前一半时间只尝试 ID / CSS 等快速选择器，之后才加入通用 XPath 兜底：
+# 页面还在加载时兜底 XPath 可能先匹配到别的元素（如登录页上任何含"登录"的链接）
+PRIMARY_SHARE = 0.5
+
+
+class _Strategy:
+    """单个选择器及其统计"""
+    __slots__ = ('by', 'value', 'text', 'order', 'fallback', 'hits', 'misses', 'total_ms')
+
+    def __init__(self, by, value, text=None, order=0, fallback=False):
+        self.by = by
+        self.value = value
+        self.text = text  # 可选：要求元素文字包含该内容
+        self.order = order
+        self.fallback = fallback  # 通用 XPath 兜底（同一元素还有快速选择器时）
+        self.hits = 0
+        self.misses = 0
+        self.total_ms = 0.0
+
+    @property
+    def avg_ms(self):
+        n = self.hits + self.misses
+        return self.total_ms / n if n else 0.0
+
+    @property
+    def hit_rate(self):
+        n = self.hits + self.misses
+        return self.hits / n if n else None
+
+    @property
+    def proven(self):
+        rate = self.hit_rate
+        return rate is not None and rate >= 0.5
+
+    def rank_key(self):
+        # 未使用过的保持注册顺序；命中率过半的按平均耗时排序；经常失效的排到最后
+        rate = self.hit_rate
+        if rate is None:
+            return (1, 0.0, self.order)
+        if rate >= 0.5:
+            return (0, self.avg_ms, self.order)
+        return (2, -rate, self.order)
+
+    def describe(self):
+        return f'{self.by}={self.value}'
+
+
+class SelectorRegistry:
+    """逻辑元素名 → 有序选择器列表"""
+
+    def __init__(self):
+        self._entries = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def register(self, name, strategies):
+        """注册逻辑元素，strategies 为 (by, value) 或 (by, value, 必含文字) 的列表，按优先级排列
+
+        同时有 XPath 和其他定位方式时，XPath 视为兜底，wait() 时晚一些才尝试
+        """
+        has_fast = any(s[0] != By.XPATH for s in strategies)
+        self._entries[name] = [_Strategy(*s, order=i, fallback=has_fast and s[0] == By.XPATH)
+                               for i, s in enumerate(strategies)]
+
+    def names(self):
+        return list(self._entries)
+
+    def _ranked(self, name):
+        with self._lock:
+            ranked = sorted(self._entries[name], key=_Strategy.rank_key)
+        return ranked
+
+    def _record(self, strategy, hit, elapsed_ms):
+        with self._lock:
+            if hit:
+                strategy.hits += 1
+            else:
+                strategy.misses += 1
+            strategy.total_ms += elapsed_ms
+
+    def _lookup(self, root, strategy, fmt, clickable):
+        value = strategy.value.format(**fmt) if fmt else strategy.value
+        elements = root.find_elements(strategy.by, value)
+        result = []
+        for el in elements:
+            if strategy.text and strategy.text not in (el.text or ''):
+                continue
+            if clickable and not (el.is_displayed() and el.is_enabled()):
+                continue
+            result.append(el)
+        return result
+
+    def _prefer_fallback(self, name):
+        """兜底选择器已被证明有效而快速选择器没有（页面结构已变化）时，wait() 不再先等快速选择器"""
+        with self._lock:
+            entries = self._entries[name]
+            return (any(s.proven for s in entries if s.fallback)
+                    and not any(s.proven for s in entries if not s.fallback))
+
+    def _try_once(self, root, name, fmt, clickable, multiple, primary_only=False):
+        """按当前排名依次尝试，返回 (结果, 本轮尝试记录)；primary_only 时跳过兜底选择器"""
+        tried = []
+        for strategy in self._ranked(name):
+            if primary_only and strategy.fallback:
+                continue
+            start = time.perf_counter()
+            try:
+                found = self._lookup(root, strategy, fmt, clickable)
+            except Exception:
+                found = []
+            tried.append((strategy, (time.perf_counter() - start) * 1000))
+            if found:
+                return (found if multiple else found[0]), tried
+        return ([] if multiple else None), tried
+
+    def _settle(self, name, tried, success):
+        # 成功时：命中的记一次 hit，排在它前面失效的记 miss；失败时全部记 miss
+        for i, (strategy, ms) in enumerate(tried):
+            self._record(strategy, success and i == len(tried) - 1, ms)
+        if success:
+            if name in self._failed:
+                self._failed.discard(name)
+                logger.info(f'选择器 {name} 已恢复，当前使用 {tried[-1][0].describe()}')
+        elif name not in self._failed:
+            self._failed.add(name)
+            logger.warning(f'⚠ 元素 {name} 的所有选择器均未命中，12306 页面结构可能已变化')
+
+    def find(self, root, name, clickable=False, optional=False, **fmt):
+        """立即查找单个元素，找不到返回 None
+
+        optional=True 表示元素本来就可能不存在（如可选弹窗），找不到时不计入失效统计
+        """
+        el, tried = self._try_once(root, name, fmt, clickable, False)
+        if el is not None or not optional:
+            self._settle(name, tried, el is not None)
+        return el
+
+    def find_all(self, root, name, **fmt):
+        """立即查找全部元素，找不到返回空列表（不视为选择器失效）
+
+        表格本来就可能为空，空结果不记入统计；找到时命中的记 hit，排在它前面的记 miss
+        """
+        els, tried = self._try_once(root, name, fmt, False, True)
+        if els:
+            self._settle(name, tried, True)
+        return els
+
+    def wait(self, root, name, timeout=5, clickable=False, poll=0.1, optional=False, **fmt):
+        """等待元素出现（clickable 时还要求可见且可用），超时抛出 TimeoutException
+
+        前 PRIMARY_SHARE 的时间只尝试快速选择器，之后加入兜底选择器；兜底命中时快速选择器还没等满
+        timeout，不记 miss，只有超时才记入
+        """
+        start = time.monotonic()
+        end = start + timeout
+        widen_at = start if self._prefer_fallback(name) else start + timeout * PRIMARY_SHARE
+        while True:
+            el, tried = self._try_once(root, name, fmt, clickable, False,
+                                       primary_only=time.monotonic() < widen_at)
+            if el is not None:
+                if tried[-1][0].fallback:
+                    tried = [t for t in tried if t[0].fallback]
+                self._settle(name, tried, True)
+                return el
+            if time.monotonic() >= end:
+                if not optional:
+                    self._settle(name, tried, False)
+                raise TimeoutException(f'等待元素 {name} 超时（{timeout}s）')
+            time.sleep(poll)
+
+    def stats(self):
+        """各逻辑元素的选择器统计，按当前排名排列"""
+        result = {}
+        for name in self._entries:
+            result[name] = [{
+                'selector': s.describe(),
+                'hits': s.hits,
+                'misses': s.misses,
+                'avg_ms': round(s.avg_ms, 2),
+            } for s in self._ranked(name)]
+        return result
+
+    def report(self):
+        """文本报告，便于写入日志"""
+        lines = ['选择器统计（名称: 命中/未命中 平均耗时）']
+        for name, items in self.stats().items():
+            used = [i for i in items if i['hits'] or i['misses']]
+            if not used:
+                continue
+            desc = '；'.join(f"{i['selector']} {i['hits']}/{i['misses']} {i['avg_ms']}ms" for i in used)
+            lines.append(f'  {name}: {desc}')
+        return '\n'.join(lines)
+
+    def save_stats(self, path):
+        """保存统计，下次启动时沿用排名"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.stats(), f, ensure_ascii=False, indent=2)
+
+    def load_stats(self, path):
+        """加载之前保存的统计（只按选择器文字匹配，已删除的选择器忽略）"""
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except Exception as e:
+            logger.debug(f'加载选择器统计失败: {e}')
+            return
+        with self._lock:
+            for name, items in saved.items():
+                strategies = {s.describe(): s for s in self._entries.get(name, [])}
+                for item in items:
+                    s = strategies.get(item.get('selector'))
+                    if s is not None:
+                        s.hits = int(item.get('hits', 0))
+                        s.misses = int(item.get('misses', 0))
+                        s.total_ms = float(item.get('avg_ms', 0)) * (s.hits + s.misses)
+
+
+# 全局注册表：所有 12306 页面元素的定位方式
+SELECTORS = SelectorRegistry()
+
+# 登录页
+SELECTORS.register('login_button', [
+    (By.ID, 'J-btn-login'),
+    (By.XPATH, "//a[contains(text(),'登录') or contains(@class,'login')]"),
+])
+SELECTORS.register('scan_login', [
+    (By.XPATH, "//a[text()='扫码登录' or contains(text(),'扫码')]"),
+])
+SELECTORS.register('logged_in_marker', [
+    (By.XPATH, "//a[text()='个人中心' or contains(text(),'个人')]"),
+    (By.XPATH, "//*[contains(@class,'user') or contains(@id,'user')]"),
+])
+
+# 查询页
+SELECTORS.register('ticket_link', [(By.ID, 'link_for_ticket')])
+SELECTORS.register('from_station_input', [(By.ID, 'fromStationText')])
+SELECTORS.register('to_station_input', [(By.ID, 'toStationText')])
+# 选择车站后页面写入的电报码（隐藏输入框）
+SELECTORS.register('from_station_code', [(By.ID, 'fromStation')])
+SELECTORS.register('to_station_code', [(By.ID, 'toStation')])
+SELECTORS.register('station_first_option', [
+    (By.CSS_SELECTOR, '#citem_0 > span:nth-child(1)'),
+    (By.ID, 'citem_0'),
+])
+SELECTORS.register('date_input', [(By.ID, 'train_date')])
+SELECTORS.register('calendar', [(By.CLASS_NAME, 'cal')])
+SELECTORS.register('ticket_type_adult', [(By.ID, 'sf1')])
+SELECTORS.register('ticket_type_student', [(By.ID, 'sf2')])
+SELECTORS.register('query_button', [(By.ID, 'query_ticket')])
+SELECTORS.register('query_table', [(By.ID, 'queryLeftTable')])
+SELECTORS.register('table_rows', [
+    (By.CSS_SELECTOR, "#queryLeftTable > tr:not(.ticket-hd):not([style*='display: none'])"),
+    (By.XPATH, "//*[@id='queryLeftTable']/tr[not(contains(@class,'ticket-hd')) and not(contains(@style,'display: none'))]"),
+])
+SELECTORS.register('row_by_train', [
+    (By.XPATH, "//*[@id='queryLeftTable']//a[normalize-space(text())='{train}']/ancestor::tr[1]"),
+])
+# 以下相对于表格行查找
+SELECTORS.register('row_train_cell', [
+    (By.CSS_SELECTOR, 'td:first-child a.number'),
+    (By.XPATH, ".//td[1]//*[self::strong or self::span or self::a or self::div]"),
+])
+SELECTORS.register('row_depart_cell', [
+    (By.CSS_SELECTOR, 'td:first-child strong.start-t'),
+    (By.XPATH, ".//td[position()=2 or contains(@class,'cdz') or contains(@class,'cds')]//*[self::strong or self::span or self::div or self::em]"),
+])
+SELECTORS.register('row_book_button', [
+    (By.CSS_SELECTOR, 'td:last-child a.btn72', '预订'),
+    (By.XPATH, ".//a[contains(text(),'预订')]"),
+])
+
+# 订单页
+SELECTORS.register('passenger_items', [
+    (By.CSS_SELECTOR, '#normal_passenger_id li'),
+    (By.XPATH, "//ul[@id='normal_passenger_id']//li"),
+])
+SELECTORS.register('passenger_checkbox', [
+    (By.CSS_SELECTOR, "input[type='checkbox']"),
+    (By.XPATH, ".//input[@type='checkbox']"),
+])
+SELECTORS.register('first_passenger', [
+    (By.ID, 'normalPassenger_0'),
+    (By.CSS_SELECTOR, "#normal_passenger_id li:first-child input[type='checkbox']"),
+])
+SELECTORS.register('student_confirm', [(By.ID, 'dialog_xsertcj_ok')])
+SELECTORS.register('order_ticket_type', [(By.ID, 'ticketType_1')])
+SELECTORS.register('submit_order', [(By.ID, 'submitOrder_id')])
+SELECTORS.register('student_warning_close', [(By.ID, 'qd_closeDefaultWarningWindowDialog_id')])
+SELECTORS.register('seat_panel', [
+    (By.CLASS_NAME, 'seat-sel-bd'),
+])
+SELECTORS.register('seat_options', [
+    (By.CSS_SELECTOR, ".seat-sel-bd a[href^='javascript:']"),
+    (By.XPATH, "//div[@class='seat-sel-bd']//a[contains(@href, 'javascript:')]"),
+])
+SELECTORS.register('final_confirm', [(By.ID, 'qr_submit_id')])
+# 最终确认后下单失败时弹出的提示
+SELECTORS.register('order_error', [
+    (By.ID, 'content_defaultwarningAlert_id'),
+    (By.ID, 'orderResultInfo_id'),
+])
@@ -0,0 +1,203 @@
+"""
+鲸介12306 抢票助手 - 登录会话保活模块
+后台线程定期用浏览器的 Cookie 请求 12306 的登录状态接口：既能让服务器端会话保持活跃，
+也能在登录真正失效时第一时间发现，暂停监控并通过钉钉提醒重新扫码登录
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CHECK_USER_URL = 'https://kyfw.12306.cn/otn/login/checkUser'
+LOGIN_PAGE_URL = 'https://kyfw.12306.cn/otn/resources/login.html'
+MY12306_URL = 'https://kyfw.12306.cn/otn/index/initMy12306Api'
+
+
+class SessionKeeper:
+    """登录会话保活与失效检测
+
+    sync(driver) 只在主线程（操作浏览器的线程）调用，把浏览器 Cookie 同步给后台检查线程；
+    连续 fail_threshold 次检查确认未登录才判定失效，网络错误不计入
+    """
+
+    def __init__(self, interval=120, notify=None, restore=None, fail_threshold=2,
+                 cookie_interval=60, realert_interval=600, timeout=5):
+        self.interval = interval
+        self.notify = notify
+        self.restore = restore
+        self.fail_threshold = fail_threshold
+        self.cookie_interval = cookie_interval
+        self.realert_interval = realert_interval
+        self.timeout = timeout
+        self.state = 'unknown'  # unknown / valid / expired
+        self.checks = 0
+        self.last_check = None
+        self.expired_since = None
+        self._misses = 0
+        self._last_alert = 0.0
+        self._cookies_at = 0.0
+        self._http = requests.Session()
+        self._user_agent = ''
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def expired(self):
+        return self.state == 'expired'
+
+    def sync(self, driver, force=False):
+        """从浏览器复制 Cookie 和 User-Agent（有间隔限制，开销很小）"""
+        now = time.monotonic()
+        if not force and now - self._cookies_at < self.cookie_interval:
+            return
+        self._cookies_at = now
+        try:
+            cookies = driver.get_cookies()
+            if not self._user_agent:
+                self._user_agent = driver.execute_script('return navigator.userAgent')
+                self._http.headers['User-Agent'] = self._user_agent
+        except Exception as e:
+            logger.debug(f'同步浏览器 Cookie 失败: {e}')
+            return
+        jar = requests.cookies.RequestsCookieJar()
+        for c in cookies:
+            jar.set(c['name'], c['value'], domain=c.get('domain', 'kyfw.12306.cn'), path=c.get('path', '/'))
+        # 整体替换 Cookie，后台线程下一次请求即使用新值
+        self._http.cookies = jar
+
+    def check(self):
+        """请求一次登录状态：已登录返回 True，未登录返回 False，无法判断返回 None"""
+        try:
+            resp = self._http.post(CHECK_USER_URL, data={'_json_att': ''}, timeout=self.timeout,
+                                   headers={'X-Requested-With': 'XMLHttpRequest'})
+        except Exception as e:
+            logger.debug(f'检查登录状态失败: {e}')
+            return None
+        try:
+            logged_in = bool((resp.json().get('data') or {}).get('flag'))
+        except (ValueError, AttributeError):
+            if not is_login_redirect(resp):
+                # 错误页、维护页、反爬页等非 JSON 响应无法判断登录状态，不计入失效
+                logger.debug(f'登录状态接口返回了非 JSON 响应（HTTP {resp.status_code}），本次不判断')
+                return None
+            # 未登录时接口重定向到登录页
+            logged_in = False
+        self.checks += 1
+        self.last_check = datetime.now()
+        self._update(logged_in)
+        return logged_in
+
+    def _update(self, logged_in):
+        if logged_in:
+            self._misses = 0
+            if self.state == 'expired':
+                paused = (datetime.now() - self.expired_since).total_seconds() if self.expired_since else 0
+                logger.info(f'✓ 登录状态已恢复（暂停 {paused:.0f} 秒）')
+                self._send('登录已恢复', f"## 登录已恢复\n"
+                                          f"> 暂停时长: {paused / 60:.1f}分钟\n"
+                                          f"> 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                                          f"> 状态: 继续监控\n")
+                self.expired_since = None
+            self.state = 'valid'
+            return
+        self._misses += 1
+        if self._misses >= self.fail_threshold and self.state != 'expired':
+            self.state = 'expired'
+            self.expired_since = datetime.now()
+            logger.error('❌ 12306 登录已失效，暂停监控，请重新扫码登录')
+            self._alert()
+
+    def _alert(self):
+        self._last_alert = time.monotonic()
+        since = self.expired_since.strftime('%Y-%m-%d %H:%M:%S') if self.expired_since else '未知'
+        self._send('登录失效', f"## 12306 登录已失效\n"
+                                f"> 失效时间: {since}\n"
+                                f"> 状态: 已暂停监控\n"
+                                f"> 处理: 请在抢票电脑的浏览器中重新扫码登录，登录后自动继续\n")
+
+    def _send(self, title, content):
+        if self.notify is None:
+            return
+        try:
+            self.notify(title, content)
+        except Exception as e:
+            logger.debug(f'发送登录状态通知失败: {e}')
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        """启动后台保活线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='session-keeper', daemon=True)
+            self._thread.start()
+        return self
+
+    def wait_for_relogin(self, driver, poll=10):
+        """登录失效时暂停监控：打开登录页，等待用户扫码，恢复后回到查询页面。返回暂停秒数"""
+        started = time.monotonic()
+        try:
+            driver.get(LOGIN_PAGE_URL)
+        except Exception as e:
+            logger.debug(f'打开登录页失败: {e}')
+        while self.expired and not self._stop.is_set():
+            time.sleep(poll)
+            self.sync(driver, force=True)
+            self.check()
+            if self.expired and time.monotonic() - self._last_alert >= self.realert_interval:
+                self._alert()
+        if self.restore is not None and not self._stop.is_set():
+            try:
+                self.restore(driver)
+            except Exception as e:
+                logger.error(f'重新登录后恢复查询页面失败: {e}')
+        return time.monotonic() - started
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+        self._http.close()
+
+
+def is_login_redirect(resp):
+    """响应是否经重定向到达了登录页"""
+    if not resp.history:
+        return False
+    path = urlparse(resp.url).path
+    return path in (urlparse(LOGIN_PAGE_URL).path, '/otn/login/init')
+
+
+def login_account(http, timeout=5):
+    """用已登录的 HTTP 会话读取 12306 账号的用户名，无法获取时返回空字符串"""
+    try:
+        resp = http.post(MY12306_URL, timeout=timeout, headers={'X-Requested-With': 'XMLHttpRequest'})
+        data = resp.json().get('data') or {}
+        return str(data.get('user_name') or '').strip()
+    except Exception as e:
+        logger.debug(f'读取登录账号失败: {e}')
+        return ''
+
+
+def open_session_keeper(params, driver, notify=None, restore=None):
+    """按参数创建并启动会话保活；session_keepalive 为 false 时返回 None"""
+    if params.get('session_keepalive') is False:
+        return None
+    keeper = SessionKeeper(interval=params.get('session_check_interval', 120), notify=notify, restore=restore)
+    keeper.sync(driver, force=True)
+    # 开始监控前先确认一次，避免在已失效的会话上监控
+    for _ in range(keeper.fail_threshold):
+        if keeper.check() is not False:
+            break
+    return keeper.start()
@@ -0,0 +1,390 @@
+"""
+鲸介12306 抢票助手 - 会话录制与回放模块
+实盘运行时把每次刷新的表格快照、订单页状态和各阶段耗时写入压缩轨迹文件；
+回放时用 ReplayDriver 模拟浏览器，把轨迹原样喂给 book_by_* 等策略，无需打开浏览器
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+
+回放命令：python session_trace.py replay trace.jsonl.gz [--speed 10]
+策略基准：python session_trace.py bench trace.jsonl.gz [--repeat 100]
+"""
+import gzip
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 录制 meta 时不写入的敏感参数
+_SECRET_KEYS = ('dingtalk_token', 'dingtalk_secret')
+
+
+class SessionRecorder:
+    """轨迹录制器：每行一个 JSON 事件，gzip 压缩"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wt', encoding='utf-8', compresslevel=5)
+        self._last_mark = time.perf_counter()
+
+    def record(self, kind, **data):
+        """写入一个事件，kind 为 meta / snapshot / page / phase / decision"""
+        data['kind'] = kind
+        data['t'] = time.time()
+        line = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + '\n')
+
+    def meta(self, params):
+        self.record('meta', params={k: v for k, v in params.items() if k not in _SECRET_KEYS})
+
+    def snapshot(self, raw_rows):
+        self.record('snapshot', rows=raw_rows)
+
+    def snapshot_rows(self, rows):
+        """记录结构化行（截获的查询接口数据），还原为与页面表格相同的原始行，回放时同样可用"""
+        from strategies import raw_table_row
+        self.snapshot([raw_table_row(r) for r in rows])
+
+    def page(self, name, driver=None, **data):
+        """记录订单页状态（页面名称、地址、标题）"""
+        if driver is not None:
+            try:
+                data.setdefault('url', driver.current_url)
+                data.setdefault('title', driver.title)
+            except Exception:
+                pass
+        self.record('page', name=name, **data)
+
+    def mark(self, name):
+        """记录从上一个标记点到现在的耗时，用于顺序执行的各个步骤"""
+        now = time.perf_counter()
+        self.record('phase', name=name, ms=round((now - self._last_mark) * 1000, 2), ok=True)
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name):
+        """记录一个阶段的耗时"""
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record('phase', name=name, ms=round((time.perf_counter() - start) * 1000, 2), ok=ok)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class NullRecorder:
+    """未开启录制时使用，接口与 SessionRecorder 相同但不做任何事"""
+
+    def record(self, kind, **data):
+        pass
+
+    def meta(self, params):
+        pass
+
+    def snapshot(self, raw_rows):
+        pass
+
+    def snapshot_rows(self, rows):
+        pass
+
+    def page(self, name, driver=None, **data):
+        pass
+
+    def mark(self, name):
+        pass
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def close(self):
+        pass
+
+
+NULL_RECORDER = NullRecorder()
+
+
+def open_recorder(params):
+    """根据参数 record_trace 打开录制器，未配置时返回 NULL_RECORDER"""
+    path = (params.get('record_trace') or '').strip()
+    if not path:
+        return NULL_RECORDER
+    try:
+        path = path.replace('{time}', time.strftime('%Y%m%d_%H%M%S'))
+        recorder = SessionRecorder(path)
+        recorder.meta(params)
+        logger.info(f'✓ 已开启会话录制: {path}')
+        return recorder
+    except Exception as e:
+        logger.error(f'开启会话录制失败: {e}', exc_info=True)
+        return NULL_RECORDER
+
+
+def load_trace(path):
+    """读取轨迹文件，返回事件列表"""
+    events = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    return events
+
+
+# ---------------- 回放 ----------------
+
+class ReplayFinished(Exception):
+    """轨迹中的快照已全部回放完毕"""
+
+
+class _FakeElement:
+    """模拟 WebElement，只实现策略代码用到的接口"""
+
+    def __init__(self, driver, text='', row=None, role=None):
+        self._driver = driver
+        self.text = text
+        self._row = row
+        self._role = role
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        if self._role == 'query':
+            self._driver.advance()
+        elif self._role == 'book':
+            self._driver.on_book(self._row)
+
+    def find_elements(self, by, value):
+        row = self._row or {}
+        if '预订' in value or 'btn72' in value:
+            return [_FakeElement(self._driver, '预订', row, 'book')] if row.get('bookable') else []
+        cells = row.get('cells') or ['']
+        if 'start-t' in value or 'cdz' in value:
+            return [_FakeElement(self._driver, t) for t in cells[0].split()]
+        if 'td' in value:
+            return [_FakeElement(self._driver, t) for t in cells[0].split()]
+        return []
+
+    def find_element(self, by, value):
+        found = self.find_elements(by, value)
+        if not found:
+            from selenium.common.exceptions import NoSuchElementException
+            raise NoSuchElementException(value)
+        return found[0]
+
+
+class ReplayDriver:
+    """用录制的快照模拟 WebDriver：每点击一次查询按钮前进到下一张快照
+
+    speed 为回放倍速，1 表示按录制时的节奏，0 表示不等待、尽快回放
+    """
+
+    def __init__(self, events, speed=0):
+        self.snapshots = [e for e in events if e.get('kind') == 'snapshot']
+        self.speed = speed
+        self.index = 0
+        self.served_at = time.perf_counter()
+        self.decisions = []
+        self.current_url = 'replay://leftTicket'
+        self.title = 'replay'
+        self.window_handles = ['replay']
+
+    @property
+    def current(self):
+        if self.index >= len(self.snapshots):
+            return None
+        return self.snapshots[self.index]
+
+    def advance(self):
+        """前进到下一张快照，按倍速等待录制时的间隔"""
+        if self.index + 1 >= len(self.snapshots):
+            self.index = len(self.snapshots)
+            raise ReplayFinished('轨迹回放完毕')
+        gap = self.snapshots[self.index + 1]['t'] - self.snapshots[self.index]['t']
+        self.index += 1
+        if self.speed and gap > 0:
+            remaining = gap / self.speed - (time.perf_counter() - self.served_at)
+            if remaining > 0:
+                time.sleep(remaining)
+        self.served_at = time.perf_counter()
+
+    def on_book(self, row):
+        snap = self.current or {}
+        self.decisions.append({
+            'index': self.index,
+            'recorded_t': snap.get('t'),
+            'row': row,
+            'latency_ms': round((time.perf_counter() - self.served_at) * 1000, 2),
+        })
+
+    def _rows(self):
+        snap = self.current
+        return snap.get('rows', []) if snap else []
+
+    def execute_script(self, script, *args):
+        if 'queryLeftTable' in script:
+            return self._rows()
+        if 'click()' in script and args and isinstance(args[0], _FakeElement):
+            args[0].click()
+        return None
+
+    def find_elements(self, by, value):
+        if value == 'query_ticket':
+            return [_FakeElement(self, '查询', role='query')]
+        if value == 'queryLeftTable':
+            return [_FakeElement(self)] if self.current else []
+        rows = self._rows()
+        if 'queryLeftTable' in value:
+            train = None
+            if "text())='" in value:
+                train = value.split("text())='", 1)[1].split("'", 1)[0]
+            return [_FakeElement(self, ' '.join(r.get('cells') or []), r) for r in rows
+                    if train is None or (r.get('cells') or [''])[0].split()[:1] == [train]]
+        for r in rows:
+            if r.get('id') and r['id'] == value:
+                return [_FakeElement(self, ' '.join(r.get('cells') or []), r)]
+        return []
+
+    def find_element(self, by, value):
+        found = self.find_elements(by, value)
+        if not found:
+            from selenium.common.exceptions import NoSuchElementException
+            raise NoSuchElementException(value)
+        return found[0]
+
+    def refresh(self):
+        self.advance()
+
+
+def first_release_index(events, target=None):
+    """轨迹中第一张出现可预订行（指定车次时只看该车次）的快照序号"""
+    snaps = [e for e in events if e.get('kind') == 'snapshot']
+    for i, snap in enumerate(snaps):
+        for r in snap.get('rows', []):
+            if not r.get('bookable'):
+                continue
+            head = (r.get('cells') or [''])[0].split()
+            if target is None or head[:1] == [target]:
+                return i
+    return None
+
+
+def replay_trace(path, speed=0, params=None):
+    """把轨迹回放给实际的抢票策略，返回回放报告（回放不发出真实请求，不经过限流）"""
+    import booking_core
+    from rate_limiter import NO_LIMIT
+    events = load_trace(path)
+    meta = next((e for e in events if e.get('kind') == 'meta'), {})
+    params = dict(params or meta.get('params') or {})
+    for key in _SECRET_KEYS:
+        params.pop(key, None)
+    driver = ReplayDriver(events, speed=speed)
+    start = time.perf_counter()
+    ttn = (params.get('target_train_number') or '').strip().upper()
+    try:
+        if ttn:
+            result = booking_core.book_by_train_number(driver, ttn, max_attempts=0, refresh_interval=(0, 0),
+                                                       params=params, limiter=NO_LIMIT)
+        else:
+            tr = params.get('depart_time_range') or {'start': '00:00', 'end': '23:59'}
+            result = booking_core.book_by_time_range(driver, tr['start'], tr['end'],
+                                                     max_attempts=len(driver.snapshots) + 1,
+                                                     refresh_interval=(0, 0), params=params, limiter=NO_LIMIT)
+    except ReplayFinished:
+        result = '轨迹回放完毕，未做出预订决策'
+    elapsed = time.perf_counter() - start
+    release = first_release_index(events, ttn or None)
+    decision = driver.decisions[0] if driver.decisions else None
+    report = {
+        'trace': path,
+        'strategy': 'train_number' if ttn else 'time_range',
+        'snapshots': len(driver.snapshots),
+        'replayed': min(driver.index + 1, len(driver.snapshots)),
+        'result': result,
+        'elapsed_s': round(elapsed, 3),
+        'first_release_index': release,
+        'decision_index': decision['index'] if decision else None,
+        'decision_latency_ms': decision['latency_ms'] if decision else None,
+        'decision_train': ((decision['row'].get('cells') or [''])[0].split() or [None])[0] if decision else None,
+        'phases': [e for e in events if e.get('kind') == 'phase'],
+    }
+    if release is not None and decision:
+        report['snapshots_after_release'] = decision['index'] - release
+    return report
+
+
+def bench_strategy(path, params=None, repeat=100):
+    """不经过 ReplayDriver，直接把轨迹快照喂给策略对象，测量每次决定的耗时"""
+    from strategies import create_strategy, parse_table_row
+    events = load_trace(path)
+    meta = next((e for e in events if e.get('kind') == 'meta'), {})
+    params = dict(params or meta.get('params') or {})
+    snapshots = [[parse_table_row(r) for r in e.get('rows', [])]
+                 for e in events if e.get('kind') == 'snapshot']
+    strategy = create_strategy(params)
+    timings = []
+    first_book = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        state = strategy.new_state()
+        for i, rows in enumerate(snapshots):
+            t0 = time.perf_counter()
+            decision = strategy.step(rows, state)
+            timings.append(time.perf_counter() - t0)
+            if decision.action == 'book':
+                if first_book is None:
+                    first_book = (i, decision.train, decision.reason)
+                break
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    n = len(timings)
+    return {
+        'trace': path,
+        'strategy': strategy.describe(),
+        'snapshots': len(snapshots),
+        'repeat': repeat,
+        'steps': n,
+        'steps_per_second': round(n / elapsed, 1) if elapsed else None,
+        'p50_us': round(timings[n // 2] * 1e6, 2) if n else None,
+        'p99_us': round(timings[min(n - 1, int(n * 0.99))] * 1e6, 2) if n else None,
+        'first_book': first_book,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='12306 抢票助手会话轨迹回放')
+    parser.add_argument('command', choices=['replay', 'show', 'bench'])
+    parser.add_argument('trace')
+    parser.add_argument('--speed', type=float, default=0, help='回放倍速，0 表示尽快回放')
+    parser.add_argument('--repeat', type=int, default=100, help='bench 模式下重复回放次数')
+    args = parser.parse_args()
+    if args.command == 'show':
+        for ev in load_trace(args.trace):
+            if ev['kind'] == 'snapshot':
+                print(f"{ev['t']:.3f} snapshot {len(ev['rows'])} 行")
+            else:
+                print(f"{ev['t']:.3f} {ev['kind']} " + json.dumps({k: v for k, v in ev.items() if k not in ('t', 'kind')}, ensure_ascii=False))
+    elif args.command == 'bench':
+        print(json.dumps(bench_strategy(args.trace, repeat=args.repeat), ensure_ascii=False, indent=2))
+    else:
+        logging.getLogger().setLevel(logging.WARNING)
+        print(json.dumps(replay_trace(args.trace, speed=args.speed), ensure_ascii=False, indent=2))
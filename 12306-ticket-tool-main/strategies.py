@@ -0,0 +1,294 @@
+"""
+鲸介12306 抢票助手 - 抢票策略模块
+选车策略只处理结构化快照（read_table_snapshot / 回放轨迹解析出的行），不接触浏览器：
+给定本次刷新的所有行和任务状态，返回"预订某车次某席别"或"继续等待"的决定。
+浏览器操作（刷新、点击）由 booking_core.run_strategy 负责
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+
+自定义策略：继承 Strategy，实现 evaluate（单行判断，结果按行指纹缓存）和/或 decide，
+然后 register_strategy('名称', 类)，或在配置中写 "strategy": "模块名:类名"
+"""
+import re
+import importlib
+from collections import namedtuple
+
+from history_store import is_available_state
+from row_diff import RowDiffer
+
+# 查询结果表格中席别列的顺序（车次列之后，备注列之前）
+SEAT_COLUMNS = ['商务座', '优选一等座', '一等座', '二等座', '高级软卧', '软卧', '硬卧', '软座', '硬座', '无座', '其他']
+# GUI 中的席别名称与表格列名的对应关系
+SEAT_ALIASES = {'一等卧': '软卧', '二等卧': '硬卧', '特等座': '商务座'}
+# 查询接口中没有稳定字段的席别列：页面表格和截获的接口数据都不放入 seats，两种来源的行指纹保持一致
+PAGE_ONLY_SEATS = ('优选一等座',)
+# 页面表格与查询接口对同一状态的不同写法，统一为接口的写法
+PAGE_STATES = {'': '--', '候补': '无'}
+
+
+def parse_hhmm_to_minutes(hhmm):
+    """将 HH:MM 格式转换为分钟数"""
+    try:
+        h, m = map(int, hhmm.split(':'))
+        return h*60 + m
+    except Exception:
+        return None
+
+
+def time_in_range(t, start, end):
+    """判断时间是否在范围内"""
+    tm = parse_hhmm_to_minutes(t)
+    sm = parse_hhmm_to_minutes(start)
+    em = parse_hhmm_to_minutes(end)
+    if None in (tm, sm, em):
+        return False
+    return sm <= tm <= em
+
+
+def seat_column(seat_category):
+    """把界面上的席别名称转换为表格列名"""
+    return SEAT_ALIASES.get(seat_category, seat_category) if seat_category else None
+
+
+def parse_table_row(raw):
+    """把 JS 读取到的原始行数据解析为结构化记录"""
+    cells = raw.get('cells') or []
+    head = cells[0] if cells else ''
+    train = None
+    m = re.search(r'\b([GDKCTZXYFS]\d{1,5})\b', head.upper())
+    if m:
+        train = m.group(1)
+    depart = None
+    depart_min = None
+    m = re.search(r'(?:^|\s)([01]\d|2[0-3]):([0-5]\d)(?:\s|$)', head)
+    if m:
+        depart = f"{m.group(1)}:{m.group(2)}"
+        depart_min = int(m.group(1)) * 60 + int(m.group(2))
+    seats = {}
+    for name, state in zip(SEAT_COLUMNS, cells[1:1 + len(SEAT_COLUMNS)]):
+        if name in PAGE_ONLY_SEATS:
+            continue
+        state = state.split()[0] if state else ''
+        seats[name] = PAGE_STATES.get(state, state)
+    return {
+        'index': raw.get('index'),
+        'id': raw.get('id', ''),
+        'train': train,
+        'depart': depart,
+        'depart_min': depart_min,
+        'seats': seats,
+        'bookable': bool(raw.get('bookable')),
+    }
+
+
+def raw_table_row(row):
+    """parse_table_row 的逆操作：把结构化行（如截获的接口数据）还原为表格原始行，用于录制轨迹"""
+    seats = row.get('seats') or {}
+    head = ' '.join(v for v in (row.get('train'), row.get('depart')) if v)
+    return {
+        'index': row.get('index'),
+        'id': row.get('id', ''),
+        'cells': [head] + [seats.get(name, '--') for name in SEAT_COLUMNS],
+        'bookable': bool(row.get('bookable')),
+    }
+
+
+# 策略的决定：action 为 book（预订）或 wait（继续等待）
+Decision = namedtuple('Decision', ['action', 'train', 'seat', 'depart', 'row', 'reason'])
+
+
+def book_decision(row, seat=None, reason=''):
+    return Decision('book', row.get('train'), seat, row.get('depart'), row, reason)
+
+
+def wait_decision(reason=''):
+    return Decision('wait', None, None, None, None, reason)
+
+
+class StrategyState:
+    """单个任务的策略状态：行指纹比对、本轮事件、刷新次数和策略自定义数据"""
+
+    def __init__(self, strategy):
+        self.differ = RowDiffer(strategy.evaluate)
+        self.events = []
+        self.cycles = 0
+        self.data = {}
+
+    def observe(self, rows):
+        """比对本次快照，只对变化的行调用 evaluate"""
+        _, self.events = self.differ.diff(rows)
+        self.cycles += 1
+        return self.events
+
+    def matches(self, rows):
+        """evaluate 结果为真的行（按表格顺序）"""
+        return self.differ.matches(rows)
+
+
+class Strategy:
+    """策略基类"""
+    name = 'base'
+
+    def __init__(self, seat_category=None, strict_seat=False):
+        self.seat = seat_column(seat_category)
+        # strict_seat 为真时只预订所选席别有票的车次，否则只要有预订按钮即可
+        self.strict_seat = strict_seat
+
+    def new_state(self):
+        return StrategyState(self)
+
+    def seat_ok(self, row):
+        if not self.strict_seat or not self.seat:
+            return True
+        return is_available_state((row.get('seats') or {}).get(self.seat))
+
+    def evaluate(self, row):
+        """单行判断，结果按行指纹缓存；默认：可预订且席别满足要求"""
+        return bool(row.get('bookable')) and self.seat_ok(row)
+
+    def decide(self, rows, state):
+        """根据本次快照做出决定，默认选表格中第一个满足 evaluate 的行"""
+        candidates = state.matches(rows)
+        if candidates:
+            return book_decision(candidates[0], self.seat)
+        return wait_decision('无可预订车次')
+
+    def step(self, rows, state):
+        """处理一次刷新：先比对再决定"""
+        state.observe(rows)
+        return self.decide(rows, state)
+
+    def describe(self):
+        return self.name
+
+
+class TimeRangeStrategy(Strategy):
+    """时间范围策略：在出发时间范围内选最早的可预订车次"""
+    name = 'time_range'
+
+    def __init__(self, start_hhmm, end_hhmm, **kwargs):
+        super().__init__(**kwargs)
+        self.start_hhmm = start_hhmm
+        self.end_hhmm = end_hhmm
+        # 范围只解析一次，逐行比较分钟数
+        self.start_min = parse_hhmm_to_minutes(start_hhmm)
+        self.end_min = parse_hhmm_to_minutes(end_hhmm)
+
+    @staticmethod
+    def _depart_min(row):
+        dm = row.get('depart_min')
+        return dm if dm is not None else parse_hhmm_to_minutes(row.get('depart') or '')
+
+    def evaluate(self, row):
+        dm = self._depart_min(row)
+        if dm is None or self.start_min is None or self.end_min is None:
+            return False
+        return self.start_min <= dm <= self.end_min and super().evaluate(row)
+
+    def decide(self, rows, state):
+        candidates = state.matches(rows)
+        if candidates:
+            best = min(candidates, key=self._depart_min)
+            return book_decision(best, self.seat, f'出发时间 {best["depart"]} 在范围内')
+        found = sorted({r['depart'] for r in rows if r.get('depart')})
+        preview = ','.join(found[:6]) if found else '无'
+        return wait_decision(f'本次共扫描 {len(rows)} 行，解析到出发时刻: {preview}；未命中范围 {self.start_hhmm}-{self.end_hhmm}')
+
+    def describe(self):
+        return f'时间范围 [{self.start_hhmm} - {self.end_hhmm}]'
+
+
+class TrainNumberStrategy(Strategy):
+    """指定车次策略：目标车次出现预订按钮即预订"""
+    name = 'train_number'
+
+    def __init__(self, target, **kwargs):
+        super().__init__(**kwargs)
+        self.target = (target or '').strip().upper()
+
+    def evaluate(self, row):
+        return row.get('train') == self.target and super().evaluate(row)
+
+    def decide(self, rows, state):
+        if state.differ.result(self.target):
+            row = next((r for r in rows if r.get('train') == self.target), None)
+            if row is not None:
+                return book_decision(row, self.seat, f'目标车次 {self.target} 可预订')
+        if any(r.get('train') == self.target for r in rows):
+            return wait_decision(f'目标车次 {self.target} 暂无票或不可预订')
+        return wait_decision(f'未找到目标车次 {self.target}')
+
+    def describe(self):
+        return f'指定车次 [{self.target}]'
+
+
+class MultiTrainStrategy(Strategy):
+    """多车次策略：按给定顺序优先预订靠前的车次"""
+    name = 'train_list'
+
+    def __init__(self, targets, **kwargs):
+        super().__init__(**kwargs)
+        self.targets = [t.strip().upper() for t in targets if t and t.strip()]
+        self._rank = {t: i for i, t in enumerate(self.targets)}
+
+    def evaluate(self, row):
+        return row.get('train') in self._rank and super().evaluate(row)
+
+    def decide(self, rows, state):
+        candidates = state.matches(rows)
+        if candidates:
+            best = min(candidates, key=lambda r: self._rank[r['train']])
+            return book_decision(best, self.seat, f'候选车次 {best["train"]} 可预订')
+        return wait_decision(f'候选车次 {",".join(self.targets)} 均暂无票')
+
+    def describe(self):
+        return f'多车次 [{",".join(self.targets)}]'
+
+
+STRATEGIES = {
+    TimeRangeStrategy.name: TimeRangeStrategy,
+    TrainNumberStrategy.name: TrainNumberStrategy,
+    MultiTrainStrategy.name: MultiTrainStrategy,
+}
+
+
+def register_strategy(name, cls):
+    """注册自定义策略，之后可在配置中通过 "strategy": 名称 使用"""
+    STRATEGIES[name] = cls
+
+
+def _load_strategy_class(name):
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    if ':' in name:
+        module_name, _, attr = name.partition(':')
+        return getattr(importlib.import_module(module_name), attr)
+    raise ValueError(f'未知的抢票策略: {name}')
+
+
+def create_strategy(params):
+    """根据抢票参数创建策略
+
+    未指定 strategy 时沿用原有规则：填写了目标车次用指定车次策略，否则用时间范围策略
+    """
+    common = {
+        'seat_category': params.get('seat_category'),
+        'strict_seat': bool(params.get('strict_seat')),
+    }
+    name = (params.get('strategy') or '').strip()
+    ttn = (params.get('target_train_number') or '').strip().upper()
+    if not name:
+        name = TrainNumberStrategy.name if ttn else TimeRangeStrategy.name
+    cls = _load_strategy_class(name)
+    if cls is TrainNumberStrategy:
+        return cls(ttn, **common)
+    if cls is TimeRangeStrategy:
+        tr = params.get('depart_time_range') or {}
+        return cls(tr.get('start', '00:00'), tr.get('end', '23:59'), **common)
+    if cls is MultiTrainStrategy:
+        targets = params.get('target_train_numbers') or ttn.replace('，', ',').split(',')
+        return cls(targets, **common)
+    # 自定义策略：约定构造函数接收完整参数
+    return cls(params)
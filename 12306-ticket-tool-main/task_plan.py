@@ -0,0 +1,454 @@
+"""
+鲸介12306 抢票助手 - 任务配置编译模块
+在打开浏览器之前校验抢票参数（单个任务或包含多个任务的配置文件），
+并把时间范围、车次、乘车人等编译成只读的 TaskPlan，监控循环中只读取编译结果
+
+开发者：鲸介 (Whale_DIY)
+项目：Auto12306 智能抢票系统
+开源协议：MIT License
+
+校验配置文件：python task_plan.py config.json
+"""
+import re
+import json
+import hashlib
+import logging
+from datetime import datetime
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from strategies import (SEAT_COLUMNS, SEAT_ALIASES, PAGE_ONLY_SEATS, seat_column, parse_hhmm_to_minutes,
+                        create_strategy, _load_strategy_class)
+
+logger = logging.getLogger(__name__)
+
+SEAT_CHOICES = tuple(SEAT_COLUMNS) + tuple(SEAT_ALIASES)
+TRAIN_NUMBER_RE = re.compile(r'[GDKCTZXYFS]\d{1,5}')
+# 小时可以是一位数（如 8:00），编译时统一为 08:00
+HHMM_RE = re.compile(r'([01]?\d|2[0-3]):([0-5]\d)')
+
+
+class ConfigError(ValueError):
+    """配置校验失败，errors 为所有错误信息"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__('；'.join(self.errors))
+
+
+def _str(value):
+    return isinstance(value, str)
+
+
+def _bool(value):
+    return isinstance(value, bool)
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _bool_or_list(value):
+    return isinstance(value, (bool, list))
+
+
+def _bool_or_dict(value):
+    return isinstance(value, (bool, dict))
+
+
+def _optional_number(value):
+    return value is None or _number(value)
+
+
+def _check_date(value):
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return None
+    except (TypeError, ValueError):
+        return '格式应为 YYYY-MM-DD'
+
+
+def _check_datetime(value):
+    if not value:
+        return None
+    try:
+        datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+        return None
+    except (TypeError, ValueError):
+        return '格式应为 YYYY-MM-DD HH:MM:SS'
+
+
+def _check_choice(choices):
+    def check(value):
+        return None if value in choices else f'可选值: {", ".join(choices)}'
+    return check
+
+
+def _check_train(value):
+    if not value:
+        return None
+    return None if TRAIN_NUMBER_RE.fullmatch(value.strip().upper()) else '车次号格式错误（如 G1234）'
+
+
+def _check_train_list(value):
+    if not isinstance(value, list) or not all(_str(v) for v in value):
+        return '应为车次号列表'
+    bad = [v for v in value if not TRAIN_NUMBER_RE.fullmatch(v.strip().upper())]
+    return f'车次号格式错误: {", ".join(bad)}' if bad else None
+
+
+def normalize_hhmm(value):
+    """把 H:MM / HH:MM 统一为 HH:MM"""
+    h, m = value.split(':')
+    return f'{int(h):02d}:{m}'
+
+
+def _check_time_range(value):
+    if not isinstance(value, dict):
+        return '应为 {"start": "HH:MM", "end": "HH:MM"}'
+    start, end = value.get('start', '00:00'), value.get('end', '23:59')
+    if not (_str(start) and HHMM_RE.fullmatch(start)) or not (_str(end) and HHMM_RE.fullmatch(end)):
+        return '时间格式应为 HH:MM'
+    if parse_hhmm_to_minutes(start) > parse_hhmm_to_minutes(end):
+        return '开始时间不能晚于结束时间'
+    return None
+
+
+def _check_interval(value):
+    if not (isinstance(value, (list, tuple)) and len(value) == 2 and all(_number(v) for v in value)):
+        return '应为 [最小秒数, 最大秒数]'
+    if value[0] < 0 or value[0] > value[1]:
+        return '应满足 0 <= 最小值 <= 最大值'
+    return None
+
+
+def _check_positive(value):
+    return None if value > 0 else '应大于 0'
+
+
+def _check_non_negative(value):
+    return None if value is None or value >= 0 else '不能小于 0'
+
+
+def _check_strategy(value):
+    if not value:
+        return None
+    try:
+        _load_strategy_class(value)
+        return None
+    except Exception as e:
+        return f'无法加载策略 {e}'
+
+
+def _check_burst(value):
+    if not isinstance(value, dict):
+        return None
+    unknown = set(value) - {'start_ms', 'end_ms', 'step_ms', 'workers'}
+    if unknown:
+        return f'未知参数: {", ".join(sorted(unknown))}'
+    if not all(isinstance(v, int) and not isinstance(v, bool) for v in value.values()):
+        return 'start_ms、end_ms、step_ms、workers 应为整数'
+    if value.get('start_ms', -200) >= value.get('end_ms', 1000):
+        return 'start_ms 应小于 end_ms'
+    if value.get('step_ms', 50) <= 0 or not 1 <= value.get('workers', 4) <= 16:
+        return 'step_ms 应大于 0，workers 应在 1~16 之间'
+    return None
+
+
+def _check_error_policy(value):
+    if not isinstance(value, dict):
+        return None
+    unknown = set(value) - {'breaker_threshold', 'breaker_cooldown', 'breaker_max_cooldown', 'alert_interval'}
+    if unknown:
+        return f'未知参数: {", ".join(sorted(unknown))}'
+    bad = [k for k, v in value.items() if not _number(v) or v < 0]
+    if bad:
+        return f'{", ".join(sorted(bad))} 应为非负数'
+    return None
+
+
+def _check_rate_limit(value):
+    if not isinstance(value, dict):
+        return None
+    numbers = {'global_qps', 'account_qps', 'ip_qps', 'burst', 'reserve', 'max_wait'}
+    unknown = set(value) - numbers - {'account', 'ip'}
+    if unknown:
+        return f'未知参数: {", ".join(sorted(unknown))}'
+    bad = [k for k in numbers & set(value) if not _number(value[k])
+           or value[k] < 0 or (value[k] == 0 and k not in ('reserve', 'max_wait'))]
+    if bad:
+        return f'{", ".join(sorted(bad))} 取值无效（速率和突发量应大于 0）'
+    if not all(_str(value.get(k, '')) for k in ('account', 'ip')):
+        return 'account、ip 应为字符串'
+    if not 0 <= value.get('reserve', 0.3) < 1:
+        return 'reserve 应在 0~1 之间'
+    return None
+
+
+# 配置项: (类型检查, 是否必填, 默认值, 额外校验)
+SCHEMA = {
+    'from_station': (_str, True, '', None),
+    'to_station': (_str, True, '', None),
+    'travel_date': (_str, True, '', _check_date),
+    'ticket_type': (_str, False, 'adult', _check_choice(('adult', 'student'))),
+    'seat_category': (_str, False, '二等座', _check_choice(SEAT_CHOICES)),
+    'seat_position_preference': (_str, False, 'first', _check_choice(('first', 'window', 'aisle'))),
+    'booking_start_time': (_str, False, '', _check_datetime),
+    'passenger_name': (_str, False, '', None),
+    'dingtalk_token': (_str, False, '', None),
+    'dingtalk_secret': (_str, False, '', None),
+    'target_train_number': (_str, False, '', _check_train),
+    'target_train_numbers': (list, False, [], _check_train_list),
+    'depart_time_range': (dict, False, {'start': '00:00', 'end': '23:59'}, _check_time_range),
+    'strategy': (_str, False, '', _check_strategy),
+    'strict_seat': (_bool, False, False, None),
+    'refresh_interval': (list, False, [2, 4], _check_interval),
+    # 未设置时沿用各策略的默认值：时间范围 30 次，指定车次无限监控
+    'max_attempts': (_optional_number, False, None, _check_non_negative),
+    'notify_state_change': (_bool, False, False, None),
+    'history_db': (_str, False, '', None),
+    'coordinator': (_str, False, '', None),
+    'coordinator_lease_ttl': (_number, False, 300, _check_positive),
+    'node_id': (_str, False, '', None),
+    'selector_stats': (_str, False, '', None),
+    'record_trace': (_str, False, '', None),
+    'station_table': (_str, False, '', None),
+    'watchdog': (_bool, False, True, None),
+    'driver_command_timeout': (_number, False, 30, _check_positive),
+    'driver_max_failures': (_number, False, 3, _check_positive),
+    'session_keepalive': (_bool, False, True, None),
+    'session_check_interval': (_number, False, 120, _check_positive),
+    'browser_memory_limit_mb': (_number, False, 1500, _check_non_negative),
+    'resource_sample_interval': (_number, False, 60, _check_positive),
+    'network_capture': (_bool, False, False, None),
+    'block_resources': (_bool_or_list, False, False, None),
+    'prelaunch_browser': (_bool, False, True, None),
+    'sale_burst': (_bool_or_dict, False, False, _check_burst),
+    'rate_limit': (_bool_or_dict, False, True, _check_rate_limit),
+    'profile': (_str, False, '', _check_choice(('', 'sample', 'cprofile'))),
+    'profile_scope': (_str, False, 'run', _check_choice(('run', 'cycle'))),
+    'profile_dir': (_str, False, 'profiles', None),
+    'profile_top': (_number, False, 30, _check_positive),
+    'error_policy': (_bool_or_dict, False, True, _check_error_policy),
+    'order_engine': (_str, False, 'browser', _check_choice(('browser', 'http'))),
+    'order_max_failures': (_number, False, 3, _check_positive),
+    'order_track_timeout': (_number, False, 30, _check_positive),
+    'config_watch': (_str, False, '', None),
+    'config_watch_interval': (_number, False, 2, _check_positive),
+    'checkpoint_dir': (_str, False, 'checkpoints', None),
+    'checkpoint_interval': (_number, False, 10, _check_positive),
+    # 未设置时 Windows 使用 Edge，其他系统使用第一个已安装的 Chromium / Chrome / Edge
+    'browser': (_str, False, '', _check_choice(('', 'edge', 'chrome', 'chromium'))),
+    'headless': (_bool, False, False, None),
+    'browser_binary': (_str, False, '', None),
+    'driver_path': (_str, False, '', None),
+    'session_cookies': (_str, False, '', None),
+}
+
+
+def _type_ok(check, value):
+    if isinstance(check, type):
+        return isinstance(value, check)
+    return check(value)
+
+
+def split_names(value):
+    """乘车人姓名支持用逗号分隔多个"""
+    return tuple(n.strip() for n in re.split(r'[,，]', value or '') if n.strip())
+
+
+def load_station_table(path):
+    """加载车站电报码表：JSON 对象 {站名: 电报码}，或 12306 station_name.js 原文"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    text = text.strip()
+    if text.startswith('{'):
+        return json.loads(text)
+    table = {}
+    # station_name.js 格式：@bjb|北京北|VAP|beijingbei|bjb|0
+    for item in text.split('@')[1:]:
+        parts = item.split('|')
+        if len(parts) >= 3:
+            table[parts[1]] = parts[2]
+    return table
+
+
+@dataclass(frozen=True)
+class TaskPlan:
+    """编译后的抢票任务，创建后不可修改"""
+    from_station: str
+    to_station: str
+    travel_date: str
+    ticket_type: str
+    seat_category: str
+    seat_column: str
+    seat_position_preference: str
+    passenger_names: tuple
+    target_train_numbers: tuple
+    start_minute: int
+    end_minute: int
+    booking_start: object  # datetime 或 None
+    refresh_interval: tuple
+    max_attempts: object  # int 或 None
+    strategy: str
+    strict_seat: bool
+    from_code: str = ''
+    to_code: str = ''
+    params: object = field(default_factory=lambda: MappingProxyType({}), compare=False, repr=False)
+
+    @property
+    def target_train_number(self):
+        return self.target_train_numbers[0] if self.target_train_numbers else ''
+
+    @property
+    def route(self):
+        return f'{self.from_station}-{self.to_station}'
+
+    @property
+    def task_id(self):
+        """任务标识：线路、日期、乘车人、目标车次和时间范围决定"""
+        key = '|'.join([self.route, self.travel_date, ','.join(self.passenger_names),
+                        ','.join(self.target_train_numbers), str(self.start_minute), str(self.end_minute)])
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+        return f'{self.route}-{self.travel_date}-{digest}'
+
+    def create_strategy(self):
+        """按编译后的参数创建选车策略"""
+        return create_strategy(dict(self.params))
+
+    def to_params(self):
+        """转换回参数字典，供仍按 params 读取的代码使用（值已经过校验和规范化）"""
+        return dict(self.params)
+
+
+def compile_task(params, station_table=None):
+    """校验单个任务并编译为 TaskPlan，校验失败抛出 ConfigError"""
+    if not isinstance(params, dict):
+        raise ConfigError(['任务配置应为 JSON 对象'])
+    errors = []
+    values = {}
+    for key, (check, required, default, extra) in SCHEMA.items():
+        value = params.get(key, default)
+        if isinstance(value, str):
+            value = value.strip()
+        if required and not value:
+            errors.append(f'{key}: 必填')
+            continue
+        if not _type_ok(check, value):
+            errors.append(f'{key}: 类型错误')
+            continue
+        if extra is not None:
+            msg = extra(value)
+            if msg:
+                errors.append(f'{key}: {msg}')
+                continue
+        values[key] = value
+    unknown = sorted(k for k in params if k not in SCHEMA)
+    if unknown:
+        logger.warning(f'未识别的配置项（将原样保留）: {", ".join(unknown)}')
+    if values.get('strict_seat') and seat_column(values.get('seat_category')) in PAGE_ONLY_SEATS:
+        # 该席别不参与余票比对（查询接口没有稳定字段），严格匹配永远不会命中
+        errors.append(f'strict_seat: 席别 {values["seat_category"]} 没有可比对的余票状态，不能严格匹配，'
+                      f'请关闭 strict_seat 或改选其他席别')
+    if errors:
+        raise ConfigError(errors)
+
+    targets = [t.strip().upper() for t in values['target_train_numbers']]
+    ttn = values['target_train_number'].upper()
+    if ttn and ttn not in targets:
+        targets.insert(0, ttn)
+    strategy = values['strategy']
+    if not strategy:
+        # 与 create_strategy 的默认规则一致
+        strategy = 'train_number' if ttn else ('train_list' if targets else 'time_range')
+
+    from_code = to_code = ''
+    table_path = values['station_table']
+    if station_table is None and table_path:
+        try:
+            station_table = load_station_table(table_path)
+        except Exception as e:
+            raise ConfigError([f'station_table: 读取失败 {e}'])
+    if station_table is not None:
+        from_code = station_table.get(values['from_station'], '')
+        to_code = station_table.get(values['to_station'], '')
+        missing = [s for s, c in ((values['from_station'], from_code), (values['to_station'], to_code)) if not c]
+        if missing:
+            raise ConfigError([f'未知车站: {", ".join(missing)}'])
+
+    tr = values['depart_time_range']
+    normalized = dict(params)
+    normalized.update(values)
+    normalized['target_train_number'] = ttn
+    normalized['target_train_numbers'] = targets
+    if not values['strategy'] and strategy == 'train_list':
+        normalized['strategy'] = strategy
+    normalized['depart_time_range'] = {'start': normalize_hhmm(tr.get('start', '00:00')),
+                                       'end': normalize_hhmm(tr.get('end', '23:59'))}
+    bst = values['booking_start_time']
+    return TaskPlan(
+        from_station=values['from_station'],
+        to_station=values['to_station'],
+        travel_date=values['travel_date'],
+        ticket_type=values['ticket_type'],
+        seat_category=values['seat_category'],
+        seat_column=seat_column(values['seat_category']),
+        seat_position_preference=values['seat_position_preference'],
+        passenger_names=split_names(values['passenger_name']),
+        target_train_numbers=tuple(targets),
+        start_minute=parse_hhmm_to_minutes(normalized['depart_time_range']['start']),
+        end_minute=parse_hhmm_to_minutes(normalized['depart_time_range']['end']),
+        booking_start=datetime.strptime(bst, '%Y-%m-%d %H:%M:%S') if bst else None,
+        refresh_interval=(float(values['refresh_interval'][0]), float(values['refresh_interval'][1])),
+        max_attempts=None if values['max_attempts'] is None else int(values['max_attempts']),
+        strategy=strategy,
+        strict_seat=values['strict_seat'],
+        from_code=from_code,
+        to_code=to_code,
+        params=MappingProxyType(normalized),
+    )
+
+
+def read_tasks(path):
+    """读取配置文件中的任务参数（未校验）
+
+    文件内容可以是单个任务对象、任务列表，或 {"tasks": [...], 其他公共参数}；
+    公共参数会合并进每个任务
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and 'tasks' in data:
+        common = {k: v for k, v in data.items() if k != 'tasks'}
+        return [dict(common, **t) if isinstance(t, dict) else t for t in data['tasks']]
+    if isinstance(data, list):
+        return data
+    return [data]
+
+
+def load_tasks(path, station_table=None):
+    """读取配置文件并编译其中所有任务，任一任务校验失败时抛出 ConfigError，错误信息带任务序号"""
+    tasks = read_tasks(path)
+    plans = []
+    errors = []
+    for i, task in enumerate(tasks, 1):
+        try:
+            plans.append(compile_task(task, station_table))
+        except ConfigError as e:
+            errors.extend(f'任务{i} {msg}' for msg in e.errors)
+    if errors:
+        raise ConfigError(errors)
+    return plans
+
+
+if __name__ == '__main__':
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else 'config.json'
+    try:
+        for plan in load_tasks(path):
+            print(f'✓ {plan.task_id} 策略: {plan.strategy} 车次: {",".join(plan.target_train_numbers) or "-"} '
+                  f'时间: {plan.start_minute // 60:02d}:{plan.start_minute % 60:02d}-'
+                  f'{plan.end_minute // 60:02d}:{plan.end_minute % 60:02d}')
+    except ConfigError as e:
+        for msg in e.errors:
+            print(f'✗ {msg}')
+        sys.exit(1)
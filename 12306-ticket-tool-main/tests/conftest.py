@@ -0,0 +1,7 @@
+"""
+测试公共配置：模块按平铺方式放在上一级目录，直接 import 即可
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,125 @@
+"""
+监控循环：回收标签页或浏览器后网络截获和资源拦截跟随新的实例；第一次查询被限流时等待重试
+"""
+import pytest
+
+import booking_core
+from booking_core import run_strategy, _acquire_first_query
+from rate_limiter import NO_LIMIT, PRIORITY_SALE, RateLimited
+from strategies import TrainNumberStrategy
+
+
+class _Button:
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        pass
+
+
+class _Driver:
+    def __init__(self, name):
+        self.name = name
+        self.alive = True
+
+    def find_elements(self, by, value):
+        if not self.alive:
+            raise RuntimeError('invalid session id')
+        return [_Button()] if value == 'query_ticket' else []
+
+
+class _Capture:
+    """截获：只读取当前绑定的浏览器，已关闭的浏览器会抛出异常"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.attached = []
+
+    def attach(self, driver):
+        self.driver = driver
+        self.attached.append(driver.name)
+
+    def wait_rows(self, timeout):
+        if not self.driver.alive:
+            raise RuntimeError('invalid session id')
+        return [{'train': 'G1', 'depart': '08:00', 'seats': {'二等座': '无'}, 'bookable': False}]
+
+
+class _Blocker:
+    def __init__(self):
+        self.applied = []
+
+    def apply(self, driver):
+        self.applied.append(driver.name)
+
+    def refreshed(self):
+        pass
+
+
+class _RecyclingMonitor:
+    """第一轮之后重启浏览器（返回新的实例），旧实例随之关闭"""
+    tab_recycles = 0
+    browser_recycles = 0
+
+    def tick(self, driver, quiet=False):
+        if self.browser_recycles:
+            return driver
+        self.browser_recycles += 1
+        driver.alive = False
+        return _Driver('new')
+
+
+class _Errors:
+    def __init__(self):
+        self.errors = []
+
+    def on_error(self, exc, attempt=0):
+        self.errors.append(exc)
+        raise AssertionError(f'监控出错: {exc}')
+
+    def on_success(self):
+        pass
+
+    def maybe_alert(self, target=''):
+        pass
+
+    def breaker_wait(self):
+        return 0.0
+
+
+def test_capture_follows_recycled_browser():
+    old = _Driver('old')
+    capture, blocker = _Capture(old), _Blocker()
+    decision, reason = run_strategy(old, TrainNumberStrategy('G9'), max_attempts=3, refresh_interval=(0, 0),
+                                    monitor=_RecyclingMonitor(), capture=capture, blocker=blocker,
+                                    errors=_Errors(), limiter=NO_LIMIT.bind())
+    assert (decision, reason) == (None, 'max_attempts')
+    assert capture.attached == ['new'] and blocker.applied == ['new']
+
+
+class _Limiter:
+    """前 denials 次拒绝，之后放行"""
+
+    def __init__(self, denials):
+        self.denials = denials
+        self.calls = 0
+
+    def acquire(self, priority):
+        self.calls += 1
+        return self.calls > self.denials
+
+
+def test_first_query_waits_for_token(monkeypatch):
+    monkeypatch.setattr(booking_core, 'FIRST_QUERY_RETRY', 0)
+    limiter = _Limiter(denials=3)
+    _acquire_first_query(limiter, PRIORITY_SALE)
+    assert limiter.calls == 4
+
+
+def test_first_query_gives_up_after_max_wait(monkeypatch):
+    monkeypatch.setattr(booking_core, 'FIRST_QUERY_RETRY', 0)
+    with pytest.raises(RateLimited):
+        _acquire_first_query(_Limiter(denials=10 ** 9), PRIORITY_SALE, max_wait=0.05)
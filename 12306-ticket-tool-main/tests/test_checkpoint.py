@@ -0,0 +1,121 @@
+"""
+监控断点：原子写入、按任务标识恢复、过期和损坏的断点重新开始；恢复时先确认上次排队订单的结果
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import booking_core
+from booking_core import _resolve_pending_order
+from checkpoint import MonitorCheckpoint, open_checkpoint
+from mock_12306 import start_mock_server
+from order_tracker import OrderTracker
+
+TASK = '杭州-郑州-2026-02-12-abcdef12'
+
+
+def test_save_and_resume(tmp_path):
+    started = datetime(2026, 2, 1, 8, 0, 0)
+    ckpt = MonitorCheckpoint(str(tmp_path), TASK)
+    assert ckpt.resume() is None
+    assert ckpt.save(started_at=started, monitor_count=42, last_seen=[{'train': 'G1'}],
+                     order={'order_id': 'E123', 'status': 'queued'})
+    assert os.listdir(tmp_path) == [f'{TASK}.json']
+    again = MonitorCheckpoint(str(tmp_path), TASK)
+    state = again.resume()
+    assert state.started_at == started and state.monitor_count == 42
+    assert state.last_notification_time is None
+    assert state.order['order_id'] == 'E123'
+    assert again.take_seen() == [{'train': 'G1'}]
+    assert again.take_seen() is None
+    # 之后的写入保留恢复时读到的字段
+    again.save(monitor_count=43)
+    assert MonitorCheckpoint(str(tmp_path), TASK).resume().started_at == started
+
+
+def test_unusable_checkpoints_start_over(tmp_path):
+    ckpt = MonitorCheckpoint(str(tmp_path), TASK)
+    ckpt.save(started_at=datetime.now(), monitor_count=1)
+    assert MonitorCheckpoint(str(tmp_path), TASK[:-1] + '0').resume() is None
+    data = json.loads(open(ckpt.path, encoding='utf-8').read())
+    data['saved_at'] = (datetime.now() - timedelta(hours=25)).strftime('%Y-%m-%d %H:%M:%S')
+    with open(ckpt.path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    assert MonitorCheckpoint(str(tmp_path), TASK).resume() is None
+    with open(ckpt.path, 'w', encoding='utf-8') as f:
+        f.write('{"version": 1, "task_')
+    assert MonitorCheckpoint(str(tmp_path), TASK).resume() is None
+
+
+def test_due_and_retarget(tmp_path):
+    ckpt = MonitorCheckpoint(str(tmp_path), TASK, interval=60)
+    assert ckpt.due()
+    ckpt.save(monitor_count=1)
+    assert not ckpt.due()
+    old = ckpt.path
+    ckpt.retarget('杭州-郑州-2026-02-13-00000000')
+    assert not os.path.exists(old) and ckpt.due()
+    ckpt.save(monitor_count=2)
+    assert os.path.exists(ckpt.path)
+    ckpt.clear()
+    assert os.listdir(tmp_path) == []
+
+
+def test_open_checkpoint(tmp_path):
+    plan = SimpleNamespace(task_id=TASK)
+    assert open_checkpoint({'checkpoint_dir': ''}, plan) is None
+    ckpt = open_checkpoint({'checkpoint_dir': str(tmp_path), 'checkpoint_interval': 5}, plan)
+    assert ckpt.task_id == TASK and ckpt.interval == 5
+
+
+class _MockDriver:
+    """只提供 HTTP 会话需要的接口"""
+
+    def execute_script(self, script):
+        return 'Mozilla/5.0'
+
+    def get_cookies(self):
+        return [{'name': 'tk', 'value': 'mock', 'domain': '127.0.0.1'}]
+
+
+@pytest.fixture
+def pending(request, tmp_path, monkeypatch):
+    """模拟服务中有一个排队中的订单，断点里保存了它和订单页令牌"""
+    monkeypatch.setattr(booking_core, 'send_dingtalk_notification', lambda *args, **kwargs: False)
+    monkeypatch.setattr(booking_core, 'PENDING_ORDER_WAIT', 1)
+    server, base = start_mock_server(latency_ms=0, jitter_ms=0, order_outcome=request.param, queue_polls=0)
+    html = requests.post(f'{base}/otn/confirmPassenger/initDc', data={'_json_att': ''}).text
+    token = html.split("globalRepeatSubmitToken = '")[1].split("'")[0]
+    ckpt = MonitorCheckpoint(str(tmp_path), TASK)
+    order = {'status': 'queued', 'order_id': None, 'wait_time': 4, 'message': '仍在排队', 'token': token}
+    ckpt.save(started_at=datetime.now(), status='queued', order=order)
+    yield ckpt, order, OrderTracker(base_url=f'{base}/otn', request_timeout=2)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('pending', ['confirmed'], indirect=True)
+def test_confirmed_pending_order_ends_task(pending):
+    ckpt, order, tracker = pending
+    assert not _resolve_pending_order(_MockDriver(), {}, ckpt, order, tracker)
+    assert not os.path.exists(ckpt.path)
+
+
+@pytest.mark.parametrize('pending', ['failed'], indirect=True)
+def test_failed_pending_order_resumes_monitoring(pending):
+    ckpt, order, tracker = pending
+    assert _resolve_pending_order(_MockDriver(), {}, ckpt, order, tracker)
+    assert MonitorCheckpoint(ckpt.directory, TASK).resume().order is None
+
+
+@pytest.mark.parametrize('pending', ['queued'], indirect=True)
+def test_unresolved_pending_order_waits_for_user(pending):
+    ckpt, order, tracker = pending
+    assert not _resolve_pending_order(_MockDriver(), {}, ckpt, order, tracker)
+    # 没有令牌时无法查询，同样等待用户确认
+    assert not _resolve_pending_order(_MockDriver(), {}, ckpt, dict(order, token=None), tracker)
+    assert MonitorCheckpoint(ckpt.directory, TASK).resume().order == order
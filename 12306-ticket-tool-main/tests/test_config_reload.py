@@ -0,0 +1,63 @@
+"""
+配置热更新：提交的是完整任务配置，只切换可热更新的配置项，校验失败保留原配置，切换发生在 take() 时
+"""
+import json
+import os
+
+from config_reload import ConfigReloader
+from task_plan import compile_task
+
+BASE = {'from_station': '杭州', 'to_station': '郑州', 'travel_date': '2026-02-12', 'watchdog': True}
+
+
+def _bind(reloader=None):
+    plan = compile_task(BASE)
+    params = plan.to_params()
+    return (reloader or ConfigReloader()).bind(plan, params), params
+
+
+def test_switch_happens_on_take():
+    reloader, params = _bind()
+    applied = []
+    reloader.add_listener(applied.append)
+    assert reloader.submit(dict(BASE, target_train_number='g7',
+                                depart_time_range={'start': '08:00', 'end': '10:00'})) == []
+    assert params['target_train_number'] == ''
+    change = reloader.take()
+    assert change.keys == {'target_train_number', 'target_train_numbers', 'depart_time_range'}
+    assert params['target_train_number'] == 'G7' and change.plan.strategy == 'train_number'
+    assert applied == [change.plan] and reloader.plan is change.plan
+    assert reloader.version == 1 and reloader.take() is None
+
+
+def test_non_hot_keys_are_ignored():
+    reloader, params = _bind()
+    assert reloader.submit(dict(BASE, watchdog=False)) == []
+    assert reloader.take() is None and params['watchdog'] is True
+
+
+def test_invalid_config_keeps_current():
+    reloader, params = _bind()
+    errors = reloader.submit(dict(BASE, travel_date='2026-13-01', seat_category='一等座'))
+    assert errors == ['travel_date: 格式应为 YYYY-MM-DD']
+    assert reloader.take() is None and reloader.rejected == 1
+    assert params['seat_category'] == '二等座'
+    assert ConfigReloader().submit({}) == ['抢票任务尚未开始']
+
+
+def test_config_file_changes_are_submitted(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(BASE, ensure_ascii=False), encoding='utf-8')
+    reloader, params = _bind(ConfigReloader(str(path), interval=3600))
+    try:
+        reloader.check_file()
+        assert reloader.take() is None
+        path.write_text(json.dumps({'tasks': [dict(BASE, seat_category='一等座'), BASE]}, ensure_ascii=False),
+                        encoding='utf-8')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        reloader.check_file()
+        assert reloader.take().keys == {'seat_category'}
+        assert params['seat_category'] == '一等座'
+    finally:
+        reloader.close()
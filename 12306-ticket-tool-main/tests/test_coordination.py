@@ -0,0 +1,164 @@
+"""
+多节点协同：两个进程分别通过 SQLite 和 TCP 后端争抢租约、让行、恢复和停止；HTTP 下单改走浏览器时的租约
+"""
+import time
+import multiprocessing
+
+import pytest
+
+import booking_core
+from booking_core import _claim_and_click, _submit_over_http
+from coordination import CoordinatorServer, TaskCoordination, create_coordinator, lease_key
+from order_http import OrderFallback
+from strategies import book_decision
+
+PARAMS = {'from_station': '杭州', 'to_station': '郑州', 'travel_date': '2026-02-12', 'passenger_name': '张三'}
+CTX = multiprocessing.get_context('spawn')
+TIMEOUT = 20
+
+
+def _race(url, node, start_at, results):
+    coord = TaskCoordination(create_coordinator(url), PARAMS, node_id=node)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    results.put((node, coord.claim('G1')))
+    coord.close()
+
+
+def _booker(url, steps, acks):
+    """另一个节点：发现有票并取得租约 → 下单失败 → 再次下单并确认，每步等待测试进程确认"""
+    coord = TaskCoordination(create_coordinator(url), PARAMS, node_id='node-a')
+    coord.publish('seen', train='G1')
+    coord.claim('G1')
+    coord.publish('booked', train='G1')
+    acks.put('booked')
+    steps.get(timeout=TIMEOUT)
+    coord.release('failed', message='排队失败')
+    acks.put('failed')
+    steps.get(timeout=TIMEOUT)
+    coord.publish('ordered', status='confirmed')
+    acks.put('ordered')
+    coord.close()
+
+
+@pytest.fixture(params=['sqlite', 'tcp'])
+def url(request, tmp_path):
+    if request.param == 'sqlite':
+        yield f'sqlite:///{tmp_path / "coord.db"}'
+        return
+    server = CoordinatorServer('127.0.0.1', 0)
+    server.serve_in_background()
+    yield f'tcp://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_only_one_process_wins_the_lease(url):
+    # 先建表，避免两个进程同时初始化 SQLite 文件
+    create_coordinator(url).close()
+    results = CTX.Queue()
+    start_at = time.time() + 2
+    procs = [CTX.Process(target=_race, args=(url, f'node-{i}', start_at, results)) for i in range(2)]
+    for p in procs:
+        p.start()
+    outcomes = dict(results.get(timeout=TIMEOUT) for _ in procs)
+    for p in procs:
+        p.join(TIMEOUT)
+    assert sorted(outcomes.values()) == [False, True]
+
+
+def test_other_node_stands_down_resumes_and_stops(url):
+    create_coordinator(url).close()
+    local = TaskCoordination(create_coordinator(url), PARAMS, node_id='node-b')
+    steps, acks = CTX.Queue(), CTX.Queue()
+    proc = CTX.Process(target=_booker, args=(url, steps, acks))
+    proc.start()
+    try:
+        assert acks.get(timeout=TIMEOUT) == 'booked'
+        assert local.standing_down() == 'node-a'
+        assert not local.claim('G1')
+        assert local.booked_elsewhere() is None
+
+        steps.put('go')
+        assert acks.get(timeout=TIMEOUT) == 'failed'
+        assert local.standing_down() is None
+        assert local.booked_elsewhere() is None
+        assert local.claim('G1')
+        local.release()
+
+        steps.put('go')
+        assert acks.get(timeout=TIMEOUT) == 'ordered'
+        assert local.booked_elsewhere() == 'node-a'
+    finally:
+        proc.join(TIMEOUT)
+        local.close()
+    assert proc.exitcode == 0
+
+
+def test_events_before_start_are_ignored(url):
+    coord = create_coordinator(url)
+    coord.publish(lease_key(PARAMS), 'node-a', 'ordered', {})
+    time.sleep(0.01)
+    local = TaskCoordination(create_coordinator(url), PARAMS, node_id='node-b')
+    try:
+        assert local.booked_elsewhere() is None
+        assert local.standing_down() is None
+    finally:
+        local.close()
+        coord.close()
+
+
+def test_stale_seen_event_expires(url):
+    other = TaskCoordination(create_coordinator(url), PARAMS, node_id='node-a')
+    local = TaskCoordination(create_coordinator(url), PARAMS, node_id='node-b', seen_window=0.2)
+    try:
+        other.publish('seen', train='G1')
+        assert local.standing_down() == 'node-a'
+        time.sleep(0.3)
+        assert local.standing_down() is None
+    finally:
+        local.close()
+        other.close()
+
+
+def test_retarget_moves_lease_to_new_key(url):
+    local = TaskCoordination(create_coordinator(url), PARAMS, node_id='node-b')
+    other = TaskCoordination(create_coordinator(url), PARAMS, node_id='node-a')
+    try:
+        assert local.claim('G1')
+        local.retarget(dict(PARAMS, passenger_name='李四'))
+        assert local.key == lease_key(dict(PARAMS, passenger_name='李四'))
+        # 旧租约已释放，其他节点可以为原乘车人预订
+        assert other.claim('G1')
+        assert local.claim('G1')
+    finally:
+        other.close()
+        local.close()
+
+
+class _FallbackOrder:
+    result = None
+
+    def can_submit(self, decision):
+        return True
+
+    def submit(self, driver, decision):
+        raise OrderFallback('initDc 返回意外的页面')
+
+
+def test_http_fallback_releases_lease_until_click(url, monkeypatch):
+    local = TaskCoordination(create_coordinator(url), PARAMS, node_id='local')
+    other = TaskCoordination(create_coordinator(url), PARAMS, node_id='node-b')
+    try:
+        decision = book_decision({'train': 'G1', 'depart': '08:00'})
+        assert _submit_over_http(_FallbackOrder(), None, local, decision) == 'fallback'
+        # 页面上找不到该行时不再点击，其他节点不必等待租约过期
+        assert local.coordinator.holder(local.key) is None
+        assert other.claim('G1')
+        other.release()
+        monkeypatch.setattr(booking_core, 'click_book_in_row', lambda row, driver: True)
+        assert _claim_and_click(object(), None, local, 'G1')
+        assert local.coordinator.holder(local.key) == 'local'
+    finally:
+        local.close()
+        other.close()
@@ -0,0 +1,83 @@
+"""
+监控异常处理：异常分类、指数退避、熔断与试探恢复、汇总通知
+"""
+import time
+
+import pytest
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+
+from error_policy import ERROR_POLICIES, ErrorTracker, classify_error, open_error_tracker
+from rate_limiter import RateLimited
+
+
+@pytest.mark.parametrize('exc, kind', [
+    (StaleElementReferenceException('stale'), 'stale'),
+    (TimeoutException('wait'), 'timeout'),
+    (RateLimited('等待令牌超时'), 'throttled'),
+    (RuntimeError('查询接口返回异常'), 'throttled'),
+    (RequestsConnectionError('reset'), 'network'),
+    (RuntimeError('net::ERR_CONNECTION_RESET'), 'network'),
+    (RuntimeError('请先登录'), 'session'),
+    (ValueError('boom'), 'unknown'),
+])
+def test_classify(exc, kind):
+    assert classify_error(exc) == kind
+
+
+def test_backoff_grows_per_kind_and_resets_on_success():
+    tracker = ErrorTracker(breaker_threshold=0)
+    policy = ERROR_POLICIES['timeout']
+    delays = [tracker.on_error(TimeoutException('t')).delay for _ in range(6)]
+    for i, delay in enumerate(delays):
+        expected = min(policy.cap, policy.base * 2 ** i)
+        assert expected * 0.8 <= delay <= expected
+    stale = tracker.on_error(StaleElementReferenceException('s'))
+    assert (stale.kind, stale.delay, stale.refresh) == ('stale', 0.0, False)
+    tracker.on_success()
+    assert tracker.on_error(TimeoutException('t')).delay <= policy.base
+    assert tracker.totals['timeout'] == 7
+
+
+def test_breaker_trips_probes_and_closes():
+    tracker = ErrorTracker(breaker_threshold=3, breaker_cooldown=0.05, breaker_max_cooldown=1)
+    for _ in range(2):
+        tracker.on_error(ValueError('x'))
+    # 元素过期不计入熔断
+    tracker.on_error(StaleElementReferenceException('s'))
+    assert tracker.breaker == 'closed'
+    tracker.on_error(ValueError('x'))
+    assert tracker.breaker == 'open' and 0 < tracker.breaker_wait() <= 0.05
+    time.sleep(0.06)
+    assert tracker.breaker_wait() == 0 and tracker.breaker == 'half_open'
+    # 试探失败立即再次熔断，暂停时间加倍
+    tracker.on_error(ValueError('x'))
+    assert tracker.breaker == 'open' and tracker.trips == 2
+    assert 0.05 < tracker.breaker_wait() <= 0.1
+    time.sleep(0.11)
+    tracker.breaker_wait()
+    tracker.on_success()
+    assert tracker.breaker == 'closed' and tracker.consecutive == 0
+
+
+def test_alerts_are_batched():
+    sent = []
+    tracker = ErrorTracker(notify=lambda title, content: sent.append(content), breaker_threshold=0,
+                           alert_interval=3600)
+    tracker.maybe_alert('G1')
+    assert sent == []
+    tracker.on_error(TimeoutException('t'))
+    tracker.on_error(TimeoutException('t'))
+    tracker.maybe_alert('G1')
+    tracker.on_error(ValueError('boom'))
+    tracker.maybe_alert('G1')
+    assert len(sent) == 1 and '超时: 2次' in sent[0]
+    tracker.maybe_alert('G1', force=True)
+    assert len(sent) == 2 and '未知错误: 1次' in sent[1] and '超时' not in sent[1]
+
+
+def test_open_error_tracker():
+    assert open_error_tracker({}).breaker_threshold == 8
+    assert open_error_tracker({'error_policy': False}).breaker_threshold == 0
+    tracker = open_error_tracker({'error_policy': {'breaker_threshold': 2, 'alert_interval': 60}})
+    assert (tracker.breaker_threshold, tracker.alert_interval, tracker.breaker_cooldown) == (2, 60, 300)
@@ -0,0 +1,106 @@
+"""
+余票历史：写线程维护跳变事件，放票热点只查询事件表
+"""
+import sqlite3
+from datetime import datetime
+
+from history_store import AvailabilityHistory, is_available_state, transition_kind
+
+ROUTE = '杭州-郑州'
+DATE = '2026-02-12'
+
+
+def _ts(hhmm, day=1):
+    return datetime(2026, 1, day, int(hhmm[:2]), int(hhmm[3:])).timestamp()
+
+
+def _row(train, state):
+    return {'train': train, 'seats': {'二等座': state, '商务座': '--'}}
+
+
+def _record(history, *snapshots):
+    for ts, rows in snapshots:
+        history.record_snapshot(rows, ROUTE, DATE, ts=ts)
+    assert history.flush()
+
+
+def test_available_states():
+    assert is_available_state('有') and is_available_state('12')
+    assert not any(is_available_state(s) for s in ('无', '--', '', '候补', '*', None))
+    assert transition_kind('无', '有') == 'release'
+    assert transition_kind('5', '无') == 'sellout'
+    assert transition_kind('5', '有') is None
+
+
+def test_transitions_are_maintained_by_writer(tmp_path):
+    history = AvailabilityHistory(str(tmp_path / 'h.db'), flush_interval=0.05)
+    try:
+        _record(history,
+                (_ts('09:00'), [_row('G1', '无'), _row('G2', '有')]),
+                (_ts('09:01'), [_row('G1', '有'), _row('G2', '有')]),
+                (_ts('09:02'), [_row('G1', '无'), _row('G2', '无')]))
+        events = history.transitions(ROUTE)
+        assert [(e[1], e[3], e[4], e[5]) for e in events] == [
+            ('G1', '无', '有', 'release'), ('G1', '有', '无', 'sellout'), ('G2', '有', '无', 'sellout')]
+        assert history.transitions(ROUTE, train='G2', seat='二等座')[0][5] == 'sellout'
+        assert history.transitions(ROUTE, travel_date='2026-02-13') == []
+    finally:
+        history.close()
+
+
+def test_state_continues_across_reopen(tmp_path):
+    path = str(tmp_path / 'h.db')
+    history = AvailabilityHistory(path, flush_interval=0.05)
+    _record(history, (_ts('09:00'), [_row('G1', '无')]))
+    history.close()
+    history = AvailabilityHistory(path, flush_interval=0.05)
+    try:
+        _record(history, (_ts('09:05'), [_row('G1', '3')]))
+        assert [e[5] for e in history.transitions(ROUTE)] == ['release']
+    finally:
+        history.close()
+
+
+def test_hot_minutes_and_refresh_interval(tmp_path):
+    history = AvailabilityHistory(str(tmp_path / 'h.db'), flush_interval=0.05)
+    try:
+        snapshots = []
+        for day in (1, 2, 3):
+            snapshots += [(_ts('12:29', day), [_row('G1', '无')]), (_ts('12:30', day), [_row('G1', '有')])]
+        snapshots += [(_ts('15:59', 4), [_row('G1', '无')]), (_ts('16:00', 4), [_row('G1', '有')])]
+        _record(history, *snapshots)
+        assert history.minute_histogram(ROUTE) == {'12:30': 3, '16:00': 1}
+        assert history.hot_minutes(ROUTE, top=1) == ['12:30']
+        assert history.hot_minutes(ROUTE, travel_date=DATE) == ['12:30', '16:00']
+        assert history.suggest_refresh_interval(ROUTE, (2, 4), now=datetime(2026, 2, 1, 12, 31)) == (1, 2)
+        assert history.suggest_refresh_interval(ROUTE, (2, 4), now=datetime(2026, 2, 1, 14, 0)) == (3, 6)
+        assert history.suggest_refresh_interval('北京-上海', (2, 4)) == (2, 4)
+        assert '放票/回流次数: 4' in history.report(ROUTE)
+    finally:
+        history.close()
+
+
+def test_legacy_database_is_backfilled(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE availability (ts REAL NOT NULL, route TEXT NOT NULL, travel_date TEXT NOT NULL,'
+                 ' train TEXT NOT NULL, seat TEXT NOT NULL, state TEXT NOT NULL)')
+    conn.executemany('INSERT INTO availability VALUES (?, ?, ?, ?, ?, ?)', [
+        (_ts('08:00'), ROUTE, DATE, 'G1', '二等座', '无'),
+        (_ts('08:01'), ROUTE, DATE, 'G1', '二等座', '有'),
+    ])
+    conn.commit()
+    conn.close()
+    history = AvailabilityHistory(path, flush_interval=0.05)
+    try:
+        assert history.flush()
+        assert history.hot_minutes(ROUTE) == ['08:01']
+    finally:
+        history.close()
+    history = AvailabilityHistory(path, flush_interval=0.05)
+    try:
+        assert history.flush()
+        # 只补齐一次，不会重复
+        assert len(history.transitions(ROUTE)) == 1
+    finally:
+        history.close()
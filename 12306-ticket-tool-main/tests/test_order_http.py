@@ -0,0 +1,95 @@
+"""
+HTTP 下单：对本地模拟 12306 服务完整走一遍下单流程
+"""
+import pytest
+import requests
+
+from booking_core import _submit_over_http
+from left_ticket import query_left_ticket
+from mock_12306 import start_mock_server
+from order_http import HttpOrderPipeline, OrderFallback, OrderRejected
+from strategies import book_decision
+
+
+class _MockDriver:
+    """只提供 HTTP 会话需要的接口"""
+
+    def execute_script(self, script):
+        return 'Mozilla/5.0'
+
+    def get_cookies(self):
+        return [{'name': 'tk', 'value': 'mock', 'domain': '127.0.0.1'}]
+
+
+def _start(outcome):
+    server, base = start_mock_server(latency_ms=0, jitter_ms=0, release_prob=1.0, trains=3, seed=1,
+                                     order_outcome=outcome, queue_polls=1)
+    rows = query_left_ticket(requests.Session(), '2026-11-01', 'BJP', 'SHH', url=f'{base}/otn/leftTicket/queryG')
+    pipeline = HttpOrderPipeline('2026-11-01', '北京', '上海', passenger_names=('李四',), base_url=f'{base}/otn',
+                                 wait_timeout=5)
+    return server, base, rows, pipeline
+
+
+@pytest.fixture
+def mock_order(request):
+    server, base, rows, pipeline = _start(request.param)
+    yield base, rows, pipeline
+    pipeline.close()
+    server.shutdown()
+    server.server_close()
+
+
+def _steps(base):
+    return requests.get(f'{base}/mock/stats').json()['order_steps']
+
+
+@pytest.mark.parametrize('mock_order', ['confirmed'], indirect=True)
+def test_confirmed_order(mock_order):
+    base, rows, pipeline = mock_order
+    assert rows[0]['bookable'] and rows[0]['secret']
+    result = pipeline.submit(_MockDriver(), book_decision(rows[0], '二等座'))
+    assert result.status == 'confirmed'
+    assert result.order_id
+    assert pipeline.result == result
+    assert _steps(base) == ['submitOrderRequest', 'initDc', 'getPassengerDTOs', 'checkOrderInfo',
+                            'getQueueCount', 'confirmSingleForQueue']
+
+
+@pytest.mark.parametrize('mock_order', ['failed'], indirect=True)
+def test_failed_in_queue(mock_order):
+    _, rows, pipeline = mock_order
+    result = pipeline.submit(_MockDriver(), book_decision(rows[0], '二等座'))
+    assert result.status == 'failed'
+    assert '余票不足' in result.message
+    # 失败的结果不交给订单页流程
+    assert pipeline.result is None
+
+
+@pytest.mark.parametrize('mock_order', ['soldout'], indirect=True)
+def test_soldout_is_rejected_before_confirm(mock_order):
+    base, rows, pipeline = mock_order
+    with pytest.raises(OrderRejected):
+        pipeline.submit(_MockDriver(), book_decision(rows[0], '二等座'))
+    assert 'confirmSingleForQueue' not in _steps(base)
+    assert pipeline.fallbacks == 0
+
+
+@pytest.mark.parametrize('mock_order', ['confirmed'], indirect=True)
+def test_unexpected_response_falls_back_to_browser(mock_order):
+    base, rows, pipeline = mock_order
+    row = dict(rows[0], secret='EXPIRED')
+    with pytest.raises(OrderFallback):
+        pipeline.submit(_MockDriver(), book_decision(row, '二等座'))
+    assert pipeline.fallbacks == 1
+    assert _steps(base) == ['submitOrderRequest']
+    # 抢票流程据此改为点击预订按钮
+    assert _submit_over_http(pipeline, _MockDriver(), None, book_decision(row, '二等座')) == 'fallback'
+    # 页面表格读出的行没有 secretStr，直接走浏览器
+    assert _submit_over_http(pipeline, _MockDriver(), None, book_decision(dict(row, secret=''), '二等座')) == 'fallback'
+
+
+@pytest.mark.parametrize('mock_order', ['confirmed'], indirect=True)
+def test_submit_over_http_reports_submitted(mock_order):
+    _, rows, pipeline = mock_order
+    assert _submit_over_http(pipeline, _MockDriver(), None, book_decision(rows[0], '二等座')) == 'submitted'
+    assert pipeline.result.status == 'confirmed'
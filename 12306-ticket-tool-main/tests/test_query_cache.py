@@ -0,0 +1,97 @@
+"""
+查询结果共享缓存：TTL、single-flight、失败时等待者自行查询、条目数淘汰
+"""
+import time
+import threading
+
+from query_cache import QueryCache, query_key
+
+
+def _rows(n=1):
+    return [{'train': f'G{i}', 'seats': {'二等座': '有'}} for i in range(n)]
+
+
+def test_hit_and_expiry():
+    cache = QueryCache(ttl=0.05)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return _rows()
+
+    key = query_key('2026-02-12', 'HZH', 'ZZF')
+    assert cache.fetch(key, loader)[1] is True
+    rows, loaded = cache.fetch(key, loader)
+    assert loaded is False and rows == _rows()
+    time.sleep(0.06)
+    assert cache.get(key) is None
+    assert cache.fetch(key, loader)[1] is True
+    assert len(calls) == 2 and (cache.hits, cache.misses) == (1, 2)
+
+
+def test_zero_ttl_disables_cache():
+    cache = QueryCache(ttl=0)
+    cache.put('k', _rows())
+    assert cache.get('k') is None
+    assert cache.fetch('k', _rows) == (_rows(), True)
+
+
+def test_single_flight():
+    cache = QueryCache(ttl=5)
+    calls = []
+    started = threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return _rows(3)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.fetch('k', loader))) for _ in range(5)]
+    threads[0].start()
+    started.wait(1)
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join(2)
+    assert len(calls) == 1
+    assert sorted(loaded for _, loaded in results) == [False] * 4 + [True]
+    assert cache.waits == 4
+
+
+def test_waiter_loads_itself_when_leader_fails():
+    cache = QueryCache(ttl=5)
+    started = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError('网络异常')
+
+    def run():
+        try:
+            cache.fetch('k', failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait(1)
+    rows, loaded = cache.fetch('k', lambda: _rows(2))
+    leader.join(2)
+    assert loaded is True and rows == _rows(2) and len(errors) == 1
+
+
+def test_evicts_least_recently_used():
+    cache = QueryCache(ttl=5, max_entries=2)
+    cache.put('a', _rows())
+    cache.put('b', _rows())
+    cache.get('a')
+    cache.put('c', _rows())
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.evictions == 1
+    cache.clear()
+    assert cache.get('a') is None and cache._bytes == 0
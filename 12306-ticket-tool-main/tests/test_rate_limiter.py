@@ -0,0 +1,83 @@
+"""
+请求限流：三级令牌桶、优先级、账号/IP 绑定、进程内只设置一次限额，以及 rate_limit 配置校验
+"""
+import pytest
+
+import rate_limiter
+from task_plan import ConfigError, compile_task
+from rate_limiter import (NO_LIMIT, PRIORITY_BACKGROUND, PRIORITY_MONITOR, PRIORITY_SALE, RateLimiter,
+                          TokenBucket, open_rate_limiter)
+
+
+def _drain(limiter, priority=PRIORITY_MONITOR, **kwargs):
+    n = 0
+    while limiter.acquire(priority, timeout=0, **kwargs):
+        n += 1
+        assert n < 100
+    return n
+
+
+def test_bucket_wait():
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert bucket.wait_for(0) == 0
+    bucket.tokens = -1
+    assert bucket.wait_for(0) == pytest.approx(1.0)
+    assert TokenBucket(rate=0, capacity=1).wait_for(1) == float('inf')
+
+
+def test_priorities_share_buckets():
+    limiter = RateLimiter(global_qps=0.001, account_qps=0.001, ip_qps=0.001, burst=10, reserve=0.3)
+    # 后台查询不动用预留的 30%
+    assert _drain(limiter, PRIORITY_BACKGROUND) == 7
+    assert _drain(limiter, PRIORITY_MONITOR) == 3
+    # 开售瞬间可以透支一个桶容量
+    assert _drain(limiter, PRIORITY_SALE) == 10
+    assert limiter.acquired == 20 and limiter.rejected == 3
+
+
+def test_rejects_instead_of_waiting_past_deadline():
+    limiter = RateLimiter(global_qps=0.001, burst=1)
+    assert limiter.acquire()
+    assert not limiter.acquire(timeout=0.05)
+    limiter = RateLimiter(global_qps=50, account_qps=50, ip_qps=50, burst=1)
+    assert limiter.acquire()
+    assert limiter.acquire(timeout=1)
+    assert limiter.waited_s > 0
+
+
+def test_bound_accounts_have_separate_buckets():
+    limiter = RateLimiter(global_qps=1000, account_qps=0.001, ip_qps=1000, burst=2)
+    a, b = limiter.bind('a', '1.1.1.1'), limiter.bind('b', '1.1.1.1')
+    assert _drain(a) == 2
+    assert b.acquire(timeout=1) and b.acquire(timeout=1)
+    assert not a.acquire(timeout=1)
+    assert 'a' in a.report() and '1.1.1.1' in a.report()
+
+
+def test_disabled_limiter_always_passes():
+    assert NO_LIMIT.bind().acquire(PRIORITY_MONITOR, timeout=0)
+    assert NO_LIMIT.report() == '请求限流：未启用'
+
+
+def test_open_rate_limiter_configures_once(monkeypatch):
+    shared = RateLimiter()
+    monkeypatch.setattr(rate_limiter, 'RATE_LIMITER', shared)
+    first = open_rate_limiter({'rate_limit': {'global_qps': 0.001, 'burst': 2, 'account': 'u1'}}, ip='')
+    assert (first.limiter, first.account, first.ip) == (shared, 'u1', '')
+    assert shared.global_qps == 0.001
+    assert first.acquire(timeout=0)
+    second = open_rate_limiter({'rate_limit': {'global_qps': 5}}, account='u2', ip='2.2.2.2')
+    # 后启动的任务不会重置限额和已消耗的令牌
+    assert shared.global_qps == 0.001
+    assert (second.account, second.ip) == ('u2', '2.2.2.2')
+    assert second.acquire(timeout=0) and not second.acquire(timeout=0)
+    off = open_rate_limiter({'rate_limit': False})
+    assert off.limiter is NO_LIMIT and not off.enabled
+
+
+def test_rate_limit_config_validation():
+    base = {'from_station': '杭州', 'to_station': '郑州', 'travel_date': '2026-02-12'}
+    compile_task(dict(base, rate_limit={'global_qps': 3, 'reserve': 0, 'account': 'u1'}))
+    for bad in ({'reserve': 1}, {'global_qps': 0}, {'qps': 1}, {'ip': 1}):
+        with pytest.raises(ConfigError, match='rate_limit'):
+            compile_task(dict(base, rate_limit=bad))
@@ -0,0 +1,33 @@
+"""
+内存采样：读不到进程内存时报告未知，而不是 0MB
+"""
+import resource_monitor
+from resource_monitor import ResourceMonitor, total_rss_mb
+
+
+class _Driver:
+    class service:
+        class process:
+            pid = 100
+
+
+def test_total_rss_unknown_when_no_size_readable(monkeypatch):
+    monkeypatch.setattr(resource_monitor, 'process_rss_mb', lambda pid: None)
+    assert total_rss_mb([1, 2]) is None
+    assert total_rss_mb([]) is None
+
+
+def test_total_rss_sums_readable_sizes(monkeypatch):
+    monkeypatch.setattr(resource_monitor, 'process_rss_mb', {1: 100.0, 2: None, 3: 50.5}.get)
+    assert total_rss_mb([1, 2, 3]) == 150.5
+
+
+def test_sample_reports_unknown_and_skips_recycling(monkeypatch):
+    monkeypatch.setattr(resource_monitor, 'process_rss_mb', lambda pid: None)
+    monkeypatch.setattr(resource_monitor, 'child_pids', lambda pid: [101, 102])
+    monitor = ResourceMonitor(browser_limit_mb=1, interval=0)
+    driver = _Driver()
+    assert monitor.sample(driver)['browser_mb'] is None
+    assert '浏览器 未知' in monitor.report()
+    assert monitor.tick(driver, quiet=True) is driver
+    assert monitor.tab_recycles == 0
@@ -0,0 +1,74 @@
+"""
+增量比对：行指纹、状态变化事件、评估结果缓存和基线恢复
+"""
+from row_diff import RowDiffer, describe_events, row_fingerprint
+
+
+def _row(train, depart='08:00', bookable=False, **seats):
+    return {'train': train, 'depart': depart, 'depart_min': int(depart[:2]) * 60 + int(depart[3:]),
+            'id': f'ticket_{train}', 'seats': seats or {'二等座': '无'}, 'bookable': bookable}
+
+
+def test_seeded_baseline_evaluates_unchanged_rows_with_full_row():
+    # 精简快照中没有 depart_min，评估必须等到下一次比对拿到完整的行
+    old = RowDiffer(lambda row: row['depart_min'] >= 0)
+    old.diff([_row('G1', bookable=True, 二等座='有')])
+    differ = RowDiffer(lambda row: row['bookable'] and row['depart_min'] < 9 * 60)
+    differ.seed(old.snapshot())
+    rows = [_row('G1', bookable=True, 二等座='有')]
+    changed, events = differ.diff(rows)
+    assert changed == [] and events == []
+    assert differ.matches(rows) == rows
+
+
+def test_seeded_baseline_reports_changes_during_pause():
+    old = RowDiffer()
+    old.diff([_row('G1'), _row('G2')])
+    differ = RowDiffer()
+    differ.seed(old.snapshot())
+    _, events = differ.diff([_row('G1', bookable=True, 二等座='有')])
+    assert {(e.train, e.kind) for e in events} == {('G1', 'release'), ('G1', 'bookable'), ('G2', 'vanish')}
+    assert describe_events([e for e in events if e.seat]) == 'G1 二等座 无→有'
+
+
+def test_snapshot_keeps_fingerprint():
+    differ = RowDiffer()
+    row = _row('G1', bookable=True, 二等座='5')
+    differ.diff([row])
+    assert [row_fingerprint(r) for r in differ.snapshot()] == [row_fingerprint(row)]
+
+
+def test_evaluate_runs_only_for_changed_rows():
+    calls = []
+    differ = RowDiffer(lambda row: calls.append(row['train']) or row['bookable'])
+    differ.diff([_row('G1'), _row('G2')])
+    assert sorted(calls) == ['G1', 'G2']
+    calls.clear()
+    rows = [_row('G1'), _row('G2', bookable=True, 二等座='有')]
+    changed, _ = differ.diff(rows)
+    assert calls == ['G2'] and changed == [rows[1]]
+    assert differ.result('G1') is False and differ.result('G2') is True
+    assert differ.matches(rows) == [rows[1]]
+
+
+def test_events_and_listeners():
+    received = []
+    differ = RowDiffer()
+    differ.add_listener(received.append)
+    _, events = differ.diff([_row('G1', 二等座='有', 一等座='5'), _row('G2')])
+    assert events == [] and received == []
+    _, events = differ.diff([_row('G1', 二等座='无', 一等座='3'), _row('D9')])
+    kinds = {(e.train, e.seat, e.kind) for e in events}
+    assert kinds == {('G1', '二等座', 'sellout'), ('G1', '一等座', 'change'), ('D9', None, 'appear'),
+                     ('G2', None, 'vanish')}
+    assert received == [events]
+    assert differ.result('G2') is None
+
+
+def test_reset_drops_baseline():
+    differ = RowDiffer(lambda row: True)
+    differ.diff([_row('G1')])
+    differ.reset()
+    _, events = differ.diff([_row('G2')])
+    assert events == []
+    assert differ.result('G1') is None and differ.result('G2') is True
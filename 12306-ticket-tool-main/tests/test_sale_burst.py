@@ -0,0 +1,72 @@
+"""
+开售并发查询：命中后立即返回，命中的决定直接用于下单
+"""
+import time
+
+import pytest
+
+import sale_burst
+from booking_core import _book_burst_winner
+from mock_12306 import start_mock_server
+from order_http import HttpOrderPipeline
+from rate_limiter import NO_LIMIT
+from sale_burst import SaleBurst
+from strategies import TimeRangeStrategy
+
+
+class _MockDriver:
+    def execute_script(self, script):
+        return 'Mozilla/5.0'
+
+    def get_cookies(self):
+        return [{'name': 'tk', 'value': 'mock', 'domain': '127.0.0.1'}]
+
+
+@pytest.fixture
+def mock_server(request, monkeypatch):
+    server, base = start_mock_server(latency_ms=20, jitter_ms=0, release_prob=request.param, trains=3, seed=1,
+                                     queue_polls=0)
+    monkeypatch.setattr(sale_burst, 'page_query_url', lambda driver: f'{base}/otn/leftTicket/queryG')
+    yield base
+    server.shutdown()
+    server.server_close()
+
+
+def _burst(**options):
+    return SaleBurst(TimeRangeStrategy('00:00', '23:59'), '2026-11-01', 'BJP', 'SHH', limiter=NO_LIMIT.bind(),
+                     **options)
+
+
+@pytest.mark.parametrize('mock_server', [1.0], indirect=True)
+def test_returns_as_soon_as_a_query_wins(mock_server):
+    burst = _burst()
+    t0 = time.time() + 0.5
+    winner = burst.run(_MockDriver(), t0)
+    # 默认时间表到 T+1s，命中后不等时间表结束
+    assert winner is not None and time.time() < t0 + 0.3
+    shot, decision, rows = winner
+    assert shot.planned_ms == -200 and decision.action == 'book' and decision.row['secret']
+    assert len(burst.shots) <= 2
+
+
+@pytest.mark.parametrize('mock_server', [0.0], indirect=True)
+def test_without_winner_returns_when_schedule_ends(mock_server):
+    burst = _burst(start_ms=0, end_ms=200, step_ms=50, workers=2)
+    t0 = time.time() + 0.3
+    assert burst.run(_MockDriver(), t0) is None
+    assert time.time() < t0 + 1
+    assert sorted(s.planned_ms for s in burst.shots) == [0, 50, 100, 150, 200]
+    assert {s.result for s in burst.shots} == {'wait'}
+
+
+@pytest.mark.parametrize('mock_server', [1.0], indirect=True)
+def test_winner_is_ordered_over_http_without_page_query(mock_server):
+    winner = _burst().run(_MockDriver(), time.time() + 0.3)
+    pipeline = HttpOrderPipeline('2026-11-01', '北京', '上海', passenger_names=('张三',),
+                                 base_url=f'{mock_server}/otn', wait_timeout=5)
+    try:
+        decision, reason = _book_burst_winner(winner, _MockDriver(), pipeline, None, NO_LIMIT.bind())
+        assert reason == 'submitted' and decision is winner[1]
+        assert pipeline.result.status == 'confirmed'
+    finally:
+        pipeline.close()
@@ -0,0 +1,127 @@
+"""
+选择器注册表：命中统计、自动排序、空结果不计入失效，以及等待时先快速选择器后兜底
+"""
+import time
+
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+from selector_registry import SelectorRegistry
+
+
+class _El:
+    def __init__(self, text=''):
+        self.text = text
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+
+class _Root:
+    def __init__(self, found=None):
+        self.found = found or {}
+        self.lookups = []
+
+    def find_elements(self, by, value):
+        self.lookups.append(value)
+        return self.found.get(value, [])
+
+
+def _registry():
+    registry = SelectorRegistry()
+    registry.register('rows', [('css selector', '#old tr'), ('css selector', '#new tr')])
+    return registry
+
+
+def _counts(registry, name='rows'):
+    return {i['selector']: (i['hits'], i['misses']) for i in registry.stats()[name]}
+
+
+def test_empty_result_is_not_a_miss():
+    registry = _registry()
+    for _ in range(5):
+        assert registry.find_all(_Root(), 'rows') == []
+    assert _counts(registry) == {'css selector=#old tr': (0, 0), 'css selector=#new tr': (0, 0)}
+
+
+def test_working_selector_moves_to_front():
+    registry = _registry()
+    root = _Root({'#new tr': [_El(), _El()]})
+    assert len(registry.find_all(root, 'rows')) == 2
+    assert _counts(registry) == {'css selector=#new tr': (1, 0), 'css selector=#old tr': (0, 1)}
+    # 之后空表也不会把命中的选择器排到后面
+    registry.find_all(_Root(), 'rows')
+    root.lookups.clear()
+    registry.find_all(root, 'rows')
+    assert root.lookups == ['#new tr']
+
+
+def test_find_records_misses_and_text_filter():
+    registry = SelectorRegistry()
+    registry.register('button', [('xpath', '//a'), ('xpath', '//a[@id="{id}"]', '预订')])
+    root = _Root({'//a[@id="x"]': [_El('车次'), _El('预订')]})
+    assert registry.find(root, 'button', id='x').text == '预订'
+    assert registry.find(_Root(), 'button', id='x') is None
+    counts = _counts(registry, 'button')
+    assert counts['xpath=//a[@id="{id}"]'] == (1, 1)
+    assert counts['xpath=//a'] == (0, 2)
+
+
+def test_optional_find_does_not_count():
+    registry = _registry()
+    assert registry.find(_Root(), 'rows', optional=True) is None
+    assert _counts(registry) == {'css selector=#old tr': (0, 0), 'css selector=#new tr': (0, 0)}
+
+
+class _Loading(_Root):
+    """页面加载中：ready_after 秒后快速选择器的元素才出现，兜底 XPath 一直能匹配到别的元素"""
+
+    def __init__(self, found, ready, ready_after):
+        super().__init__(found)
+        self.ready = ready
+        self.ready_at = time.monotonic() + ready_after
+
+    def find_elements(self, by, value):
+        if value in self.ready and time.monotonic() < self.ready_at:
+            self.lookups.append(value)
+            return []
+        return super().find_elements(by, value)
+
+
+def _login_registry():
+    registry = SelectorRegistry()
+    registry.register('login_button', [('id', 'J-btn-login'), ('xpath', "//a[contains(text(),'登录')]")])
+    return registry
+
+
+def test_wait_prefers_fast_selector_while_page_loads():
+    registry = _login_registry()
+    button, other = _El('登录'), _El('登录帮助')
+    root = _Loading({'J-btn-login': [button], "//a[contains(text(),'登录')]": [other]}, {'J-btn-login'}, 0.15)
+    assert registry.wait(root, 'login_button', timeout=1, poll=0.02) is button
+    assert "//a[contains(text(),'登录')]" not in root.lookups
+    assert _counts(registry, 'login_button') == {'id=J-btn-login': (1, 0), "xpath=//a[contains(text(),'登录')]": (0, 0)}
+
+
+def test_fallback_hit_does_not_charge_fast_selector():
+    registry = _login_registry()
+    other = _El('登录')
+    root = _Root({"//a[contains(text(),'登录')]": [other]})
+    started = time.monotonic()
+    assert registry.wait(root, 'login_button', timeout=0.2, poll=0.02) is other
+    assert time.monotonic() - started >= 0.1
+    assert _counts(registry, 'login_button') == {"xpath=//a[contains(text(),'登录')]": (1, 0), 'id=J-btn-login': (0, 0)}
+    # 页面结构已变化（只有兜底有效）时不再先等快速选择器
+    started = time.monotonic()
+    assert registry.wait(root, 'login_button', timeout=0.2, poll=0.02) is other
+    assert time.monotonic() - started < 0.1
+
+
+def test_timeout_charges_every_selector():
+    registry = _login_registry()
+    with pytest.raises(TimeoutException):
+        registry.wait(_Root(), 'login_button', timeout=0.05, poll=0.01)
+    assert _counts(registry, 'login_button') == {'id=J-btn-login': (0, 1), "xpath=//a[contains(text(),'登录')]": (0, 1)}
@@ -0,0 +1,66 @@
+"""
+登录状态检测：只有明确未登录（接口返回未登录或重定向到登录页）才计入失效
+"""
+import requests
+
+from session_keeper import CHECK_USER_URL, LOGIN_PAGE_URL, SessionKeeper
+
+
+def _response(body, url=CHECK_USER_URL, status=200, redirected_from=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = body.encode('utf-8')
+    resp.url = url
+    if redirected_from:
+        prev = requests.Response()
+        prev.status_code = 302
+        prev.url = redirected_from
+        prev.headers['Location'] = url
+        resp.history = [prev]
+    return resp
+
+
+def _keeper(*responses):
+    keeper = SessionKeeper(fail_threshold=2)
+    queue = list(responses)
+    keeper._http.post = lambda *args, **kwargs: queue.pop(0)
+    return keeper
+
+
+def test_logged_in_flag():
+    keeper = _keeper(_response('{"data": {"flag": true}}'))
+    assert keeper.check() is True
+    assert keeper.state == 'valid'
+
+
+def test_two_logged_out_answers_expire_session():
+    keeper = _keeper(*[_response('{"data": {"flag": false}}')] * 2)
+    assert keeper.check() is False
+    assert not keeper.expired
+    assert keeper.check() is False
+    assert keeper.expired
+
+
+def test_non_json_pages_are_unknown():
+    pages = [_response('<html>系统维护中</html>'), _response('<html>访问过于频繁</html>', status=403),
+             _response('<html>error</html>', status=502)]
+    keeper = _keeper(*pages)
+    for _ in pages:
+        assert keeper.check() is None
+    assert keeper.state == 'unknown'
+    assert not keeper.expired
+
+
+def test_redirect_to_login_page_counts_as_logged_out():
+    redirect = _response('<html>login</html>', url=LOGIN_PAGE_URL, redirected_from=CHECK_USER_URL)
+    keeper = _keeper(redirect, redirect)
+    assert keeper.check() is False
+    assert keeper.check() is False
+    assert keeper.expired
+
+
+def test_redirect_elsewhere_is_unknown():
+    other = _response('<html>busy</html>', url='https://www.12306.cn/mormhweb/logFiles/error.html',
+                      redirected_from=CHECK_USER_URL)
+    keeper = _keeper(other)
+    assert keeper.check() is None
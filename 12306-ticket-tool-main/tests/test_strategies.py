@@ -0,0 +1,97 @@
+"""
+抢票策略：表格行解析、行还原，以及各策略只根据结构化快照做出的决定
+"""
+import pytest
+
+from row_diff import row_fingerprint
+from strategies import (SEAT_COLUMNS, STRATEGIES, MultiTrainStrategy, TimeRangeStrategy, TrainNumberStrategy,
+                        create_strategy, parse_table_row, raw_table_row, register_strategy)
+
+
+def _row(train, depart, bookable=True, **seats):
+    h, m = map(int, depart.split(':'))
+    return {'train': train, 'depart': depart, 'depart_min': h * 60 + m, 'id': f'ticket_{train}',
+            'seats': seats or {'二等座': '有'}, 'bookable': bookable}
+
+
+def _decide(strategy, rows):
+    return strategy.step(rows, strategy.new_state())
+
+
+def test_parse_table_row():
+    states = {'商务座': '--', '优选一等座': '有', '一等座': '5 ', '二等座': '候补', '无座': ''}
+    cells = ['G1234 杭州东 郑州东 08:15 12:20 04:05'] + [states.get(name, '无') for name in SEAT_COLUMNS]
+    row = parse_table_row({'index': 3, 'id': 'ticket_x', 'cells': cells, 'bookable': 1})
+    assert (row['train'], row['depart'], row['depart_min']) == ('G1234', '08:15', 495)
+    assert row['bookable'] is True and row['index'] == 3
+    # 页面独有的席别不计入，页面的写法统一为接口的写法
+    assert '优选一等座' not in row['seats']
+    assert row['seats']['一等座'] == '5'
+    assert row['seats']['二等座'] == '无'
+    assert row['seats']['无座'] == '--'
+
+
+def test_raw_table_row_round_trip():
+    row = _row('D230', '19:05', 一等座='有', 二等座='12', 无座='无')
+    parsed = parse_table_row(raw_table_row(row))
+    assert parsed['train'] == 'D230' and parsed['depart_min'] == row['depart_min']
+    assert parsed['seats']['二等座'] == '12'
+    assert parsed['seats']['商务座'] == '--'
+    again = parse_table_row(raw_table_row(parsed))
+    assert row_fingerprint(again) == row_fingerprint(parsed)
+
+
+def test_time_range_picks_earliest_in_range():
+    strategy = TimeRangeStrategy('08:00', '12:00')
+    rows = [_row('G3', '11:30'), _row('G1', '07:00'), _row('G2', '09:10'), _row('G4', '08:30', bookable=False)]
+    decision = _decide(strategy, rows)
+    assert decision.action == 'book' and decision.train == 'G2'
+    assert _decide(strategy, [_row('G1', '07:00')]).action == 'wait'
+
+
+def test_strict_seat_requires_available_seat():
+    rows = [_row('G1', '08:00', 二等座='无', 一等座='有'), _row('G2', '09:00', 二等座='3')]
+    loose = _decide(TimeRangeStrategy('00:00', '23:59', seat_category='二等座'), rows)
+    strict = _decide(TimeRangeStrategy('00:00', '23:59', seat_category='二等座', strict_seat=True), rows)
+    assert loose.train == 'G1' and strict.train == 'G2' and strict.seat == '二等座'
+
+
+def test_train_number_strategy():
+    strategy = TrainNumberStrategy(' g7 ')
+    state = strategy.new_state()
+    assert '未找到' in strategy.step([_row('G1', '08:00')], state).reason
+    assert '暂无票' in strategy.step([_row('G7', '08:00', bookable=False)], state).reason
+    decision = strategy.step([_row('G7', '08:00')], state)
+    assert decision.action == 'book' and decision.train == 'G7'
+
+
+def test_train_list_prefers_earlier_targets():
+    strategy = MultiTrainStrategy(['G9', ' g5', ''])
+    assert strategy.targets == ['G9', 'G5']
+    rows = [_row('G5', '07:00'), _row('G9', '10:00'), _row('G1', '06:00')]
+    assert _decide(strategy, rows).train == 'G9'
+    assert _decide(strategy, [_row('G5', '07:00'), _row('G9', '10:00', bookable=False)]).train == 'G5'
+
+
+def test_create_strategy_defaults_and_aliases():
+    strategy = create_strategy({'depart_time_range': {'start': '06:00', 'end': '09:00'}, 'seat_category': '一等卧'})
+    assert isinstance(strategy, TimeRangeStrategy) and strategy.seat == '软卧'
+    assert isinstance(create_strategy({'target_train_number': 'g1'}), TrainNumberStrategy)
+    multi = create_strategy({'strategy': 'train_list', 'target_train_number': 'G1，G2'})
+    assert multi.targets == ['G1', 'G2']
+    with pytest.raises(ValueError):
+        create_strategy({'strategy': 'nope'})
+
+
+def test_register_custom_strategy():
+    class Always(TimeRangeStrategy):
+        def __init__(self, params):
+            super().__init__('00:00', '23:59')
+            self.params = params
+
+    register_strategy('always', Always)
+    try:
+        strategy = create_strategy({'strategy': 'always', 'x': 1})
+        assert isinstance(strategy, Always) and strategy.params['x'] == 1
+    finally:
+        STRATEGIES.pop('always')
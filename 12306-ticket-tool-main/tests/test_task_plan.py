@@ -0,0 +1,94 @@
+"""
+任务配置编译：校验错误一次列出，编译结果规范化且不可修改
+"""
+import json
+import dataclasses
+
+import pytest
+
+from task_plan import ConfigError, compile_task, load_tasks, split_names
+
+BASE = {'from_station': '杭州', 'to_station': '郑州', 'travel_date': '2026-02-12'}
+
+
+def _task(**overrides):
+    return dict(BASE, **overrides)
+
+
+def test_defaults():
+    plan = compile_task(_task())
+    assert plan.strategy == 'time_range'
+    assert (plan.start_minute, plan.end_minute) == (0, 23 * 60 + 59)
+    assert plan.refresh_interval == (2.0, 4.0)
+    assert plan.max_attempts is None and plan.booking_start is None
+    assert plan.route == '杭州-郑州'
+
+
+def test_targets_and_strategy_choice():
+    plan = compile_task(_task(target_train_number=' g12 ', target_train_numbers=['d3']))
+    assert plan.target_train_numbers == ('G12', 'D3')
+    assert plan.strategy == 'train_number'
+    plan = compile_task(_task(target_train_numbers=['d3', 'g5']))
+    assert plan.strategy == 'train_list'
+    assert plan.create_strategy().targets == ['D3', 'G5']
+
+
+def test_all_errors_are_reported():
+    with pytest.raises(ConfigError) as info:
+        compile_task({'from_station': '杭州', 'travel_date': '2026/02/12', 'seat_category': '头等舱',
+                      'depart_time_range': {'start': '12:00', 'end': '08:00'}, 'refresh_interval': [5, 1]})
+    keys = sorted(msg.split(':')[0] for msg in info.value.errors)
+    assert keys == ['depart_time_range', 'refresh_interval', 'seat_category', 'to_station', 'travel_date']
+
+
+def test_plan_is_frozen_and_task_id_tracks_targets():
+    plan = compile_task(_task(passenger_name='张三，李四'))
+    assert plan.passenger_names == ('张三', '李四')
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        plan.travel_date = '2026-02-13'
+    with pytest.raises(TypeError):
+        plan.params['travel_date'] = '2026-02-13'
+    assert plan.task_id == compile_task(_task(passenger_name='张三,李四')).task_id
+    assert plan.task_id != compile_task(_task(passenger_name='张三,李四', target_train_number='G1')).task_id
+    assert plan.task_id.startswith('杭州-郑州-2026-02-12-')
+
+
+def test_station_table():
+    plan = compile_task(_task(), station_table={'杭州': 'HZH', '郑州': 'ZZF'})
+    assert (plan.from_code, plan.to_code) == ('HZH', 'ZZF')
+    with pytest.raises(ConfigError, match='未知车站: 郑州'):
+        compile_task(_task(), station_table={'杭州': 'HZH'})
+
+
+def test_load_tasks_merges_common_params(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'travel_date': '2026-02-12', 'tasks': [
+        {'from_station': '杭州', 'to_station': '郑州'},
+        {'from_station': '北京', 'to_station': '上海', 'travel_date': '2026-02-13'},
+    ]}, ensure_ascii=False), encoding='utf-8')
+    plans = load_tasks(str(path))
+    assert [(p.route, p.travel_date) for p in plans] == [('杭州-郑州', '2026-02-12'), ('北京-上海', '2026-02-13')]
+    path.write_text(json.dumps([BASE, {'from_station': '北京'}], ensure_ascii=False), encoding='utf-8')
+    with pytest.raises(ConfigError) as info:
+        load_tasks(str(path))
+    assert info.value.errors == ['任务2 to_station: 必填', '任务2 travel_date: 必填']
+
+
+def test_split_names():
+    assert split_names(' 张三, 李四，，王五 ') == ('张三', '李四', '王五')
+    assert split_names('') == ()
+
+
+def test_single_digit_hours_are_normalised():
+    plan = compile_task(_task(depart_time_range={'start': '8:05', 'end': '9:30'}))
+    assert (plan.start_minute, plan.end_minute) == (485, 570)
+    assert plan.params['depart_time_range'] == {'start': '08:05', 'end': '09:30'}
+    for bad in ('24:00', '8:5', '123:00', '08:60'):
+        with pytest.raises(ConfigError, match='depart_time_range'):
+            compile_task(_task(depart_time_range={'start': bad, 'end': '23:59'}))
+
+
+def test_page_only_seat_cannot_be_strict():
+    assert compile_task(_task(seat_category='优选一等座')).seat_column == '优选一等座'
+    with pytest.raises(ConfigError, match='strict_seat'):
+        compile_task(_task(seat_category='优选一等座', strict_seat=True))